@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -9,6 +10,9 @@ from app.models import Base
 
 config = context.config
 fileConfig(config.config_file_name)
+# В контейнерах адрес БД задаётся переменной окружения, alembic.ini — для локального запуска
+if os.getenv("DATABASE_URL"):
+    config.set_main_option("sqlalchemy.url", os.environ["DATABASE_URL"])
 target_metadata = Base.metadata
 
 # Interpret the config file for Python logging.
@@ -0,0 +1,40 @@
+"""Add denormalized likes/comments counters to posts
+
+Revision ID: 3c1f0b7a9e21
+Revises: 8d309ba7d5f4
+Create Date: 2025-10-24 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1f0b7a9e21'
+down_revision: Union[str, None] = '8d309ba7d5f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('likes_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('posts', sa.Column('comments_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Заполняем счётчики по уже существующим данным
+    op.execute("""
+        UPDATE posts p SET likes_count = l.cnt
+        FROM (SELECT post_id, count(*) AS cnt FROM likes GROUP BY post_id) l
+        WHERE l.post_id = p.id
+    """)
+    op.execute("""
+        UPDATE posts p SET comments_count = c.cnt
+        FROM (SELECT post_id, count(*) AS cnt FROM comments GROUP BY post_id) c
+        WHERE c.post_id = p.id
+    """)
+
+
+def downgrade():
+    op.drop_column('posts', 'comments_count')
+    op.drop_column('posts', 'likes_count')
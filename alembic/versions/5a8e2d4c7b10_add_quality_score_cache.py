@@ -0,0 +1,36 @@
+"""Add quality score cache table
+
+Revision ID: 5a8e2d4c7b10
+Revises: 3c1f0b7a9e21
+Create Date: 2025-10-25 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a8e2d4c7b10'
+down_revision: Union[str, None] = '3c1f0b7a9e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "quality_score_cache",
+        sa.Column("text_hash", sa.String(length=64), primary_key=True),
+        sa.Column("model", sa.String(length=255), primary_key=True),
+        sa.Column("prompt_version", sa.String(length=16), primary_key=True),
+        sa.Column("score", sa.Float(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+    )
+    # Для удаления устаревших записей по TTL
+    op.create_index("ix_quality_score_cache_created_at", "quality_score_cache", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_quality_score_cache_created_at", table_name="quality_score_cache")
+    op.drop_table("quality_score_cache")
@@ -0,0 +1,50 @@
+"""Add background scoring queue
+
+Revision ID: 7e4b9c2f1d36
+Revises: 5a8e2d4c7b10
+Create Date: 2025-10-26 14:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e4b9c2f1d36'
+down_revision: Union[str, None] = '5a8e2d4c7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('scoring_status', sa.String(length=16), nullable=False, server_default='pending'))
+    # Посты, созданные до очереди, уже оценены синхронно
+    op.execute("UPDATE posts SET scoring_status = 'done' WHERE quality_score IS NOT NULL")
+
+    op.create_table(
+        "scoring_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, unique=True),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default='queued'),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default='0'),
+        sa.Column("run_after", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("locked_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_scoring_jobs_status_run_after", "scoring_jobs", ["status", "run_after"])
+
+    # Посты без оценки ставим в очередь
+    op.execute("""
+        INSERT INTO scoring_jobs (post_id)
+        SELECT id FROM posts WHERE scoring_status = 'pending'
+    """)
+
+
+def downgrade():
+    op.drop_index("ix_scoring_jobs_status_run_after", table_name="scoring_jobs")
+    op.drop_table("scoring_jobs")
+    op.drop_column('posts', 'scoring_status')
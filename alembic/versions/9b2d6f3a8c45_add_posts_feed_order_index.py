@@ -0,0 +1,30 @@
+"""Add composite index for keyset feed pagination
+
+Revision ID: 9b2d6f3a8c45
+Revises: 7e4b9c2f1d36
+Create Date: 2025-10-28 11:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2d6f3a8c45'
+down_revision: Union[str, None] = '7e4b9c2f1d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Порядок ленты: ORDER BY created_at DESC, id DESC
+    op.create_index(
+        "ix_posts_created_at_id", "posts",
+        [sa.text("created_at DESC"), sa.text("id DESC")]
+    )
+
+
+def downgrade():
+    op.drop_index("ix_posts_created_at_id", table_name="posts")
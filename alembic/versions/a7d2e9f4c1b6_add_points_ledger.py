@@ -0,0 +1,50 @@
+"""Add points ledger and leaderboard
+
+Revision ID: a7d2e9f4c1b6
+Revises: f3c8a6d1b2e4
+Create Date: 2025-11-05 11:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d2e9f4c1b6'
+down_revision: Union[str, None] = 'f3c8a6d1b2e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "points_ledger",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=True),
+        sa.Column("delta", sa.Float(), nullable=False),
+        sa.Column("reason", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("applied_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_points_ledger_pending", "points_ledger", ["id"],
+                    postgresql_where=sa.text("applied_at IS NULL"))
+    op.create_index("ix_points_ledger_user_id", "points_ledger", ["user_id"])
+    op.create_table(
+        "leaderboard",
+        sa.Column("rank", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("total_points", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_total_points", "users", [sa.text("total_points DESC"), "id"])
+
+
+def downgrade():
+    op.drop_index("ix_users_total_points", table_name="users")
+    op.drop_table("leaderboard")
+    op.drop_index("ix_points_ledger_user_id", table_name="points_ledger")
+    op.drop_index("ix_points_ledger_pending", table_name="points_ledger")
+    op.drop_table("points_ledger")
@@ -0,0 +1,45 @@
+"""Add GIN and partial indexes for category and age-restricted feeds
+
+Revision ID: b4f7a1c9d2e8
+Revises: 9b2d6f3a8c45
+Create Date: 2025-10-29 09:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4f7a1c9d2e8'
+down_revision: Union[str, None] = '9b2d6f3a8c45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Возрастные группы с частичным индексом; для 18+ подходит ix_posts_created_at_id
+AGE_BRACKETS = (0, 6, 12, 16)
+
+
+def upgrade():
+    # categories @> '["..."]'
+    op.create_index(
+        "ix_posts_categories_gin", "posts", ["categories"],
+        postgresql_using="gin", postgresql_ops={"categories": "jsonb_path_ops"}
+    )
+    for age in AGE_BRACKETS:
+        op.create_index(
+            f"ix_posts_feed_age_{age}", "posts",
+            [sa.text("created_at DESC"), sa.text("id DESC")],
+            postgresql_where=sa.text(f"age_restriction <= {age}")
+        )
+    op.create_index("ix_likes_post_id", "likes", ["post_id"])
+    op.create_index("ix_comments_post_id_created_at", "comments", ["post_id", "created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_comments_post_id_created_at", table_name="comments")
+    op.drop_index("ix_likes_post_id", table_name="likes")
+    for age in AGE_BRACKETS:
+        op.drop_index(f"ix_posts_feed_age_{age}", table_name="posts")
+    op.drop_index("ix_posts_categories_gin", table_name="posts")
@@ -0,0 +1,38 @@
+"""Add full-text search vector to posts
+
+Revision ID: b9e4c2a7d5f1
+Revises: a7d2e9f4c1b6
+Create Date: 2025-11-06 14:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e4c2a7d5f1'
+down_revision: Union[str, None] = 'a7d2e9f4c1b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Совпадает с models.SEARCH_VECTOR_SQL на момент миграции
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'B')"
+)
+
+
+def upgrade():
+    # Хранимый генерируемый столбец: таблица переписывается один раз при миграции
+    op.add_column("posts", sa.Column(
+        "search_vector", postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR_SQL, persisted=True)
+    ))
+    op.create_index("ix_posts_search_vector", "posts", ["search_vector"], postgresql_using="gin")
+
+
+def downgrade():
+    op.drop_index("ix_posts_search_vector", table_name="posts")
+    op.drop_column("posts", "search_vector")
@@ -0,0 +1,42 @@
+"""Add MinHash signatures and LSH bands for near-duplicate posts
+
+Revision ID: c4f1a8b6e3d9
+Revises: b9e4c2a7d5f1
+Create Date: 2025-11-07 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f1a8b6e3d9'
+down_revision: Union[str, None] = 'b9e4c2a7d5f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Сигнатуры существующих постов: python -m app.near_duplicates --rebuild
+    op.create_table(
+        "post_signatures",
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("signature", sa.LargeBinary(), nullable=False),
+        sa.Column("duplicate_of", sa.Integer(), sa.ForeignKey("posts.id", ondelete="SET NULL"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_table(
+        "post_lsh_bands",
+        sa.Column("bucket", sa.BigInteger(), nullable=False),
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False),
+        sa.PrimaryKeyConstraint("bucket", "post_id"),
+    )
+    op.create_index("ix_post_lsh_bands_post_id", "post_lsh_bands", ["post_id"])
+
+
+def downgrade():
+    op.drop_index("ix_post_lsh_bands_post_id", table_name="post_lsh_bands")
+    op.drop_table("post_lsh_bands")
+    op.drop_table("post_signatures")
@@ -0,0 +1,36 @@
+"""Add precomputed personalized feed candidates
+
+Revision ID: c8e3f5a2b7d1
+Revises: b4f7a1c9d2e8
+Create Date: 2025-10-31 16:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e3f5a2b7d1'
+down_revision: Union[str, None] = 'b4f7a1c9d2e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "feed_candidates",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("post_ids", pg.ARRAY(sa.Integer()), nullable=False),
+        sa.Column("scores", pg.ARRAY(sa.Float()), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+    )
+    # Инкрементальное обновление ищет лайки новее последнего пересчёта
+    op.create_index("ix_likes_created_at", "likes", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_likes_created_at", table_name="likes")
+    op.drop_table("feed_candidates")
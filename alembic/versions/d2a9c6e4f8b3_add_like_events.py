@@ -0,0 +1,33 @@
+"""Add like events log for incremental similarity index updates
+
+Revision ID: d2a9c6e4f8b3
+Revises: c8e3f5a2b7d1
+Create Date: 2025-11-02 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a9c6e4f8b3'
+down_revision: Union[str, None] = 'c8e3f5a2b7d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_table(
+        "like_events",
+        sa.Column("id", sa.BigInteger(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("post_id", sa.Integer(), nullable=False),
+        sa.Column("delta", sa.SmallInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("like_events")
@@ -0,0 +1,31 @@
+"""Add comment thread indexes
+
+Revision ID: e5b1d7c3a9f2
+Revises: d2a9c6e4f8b3
+Create Date: 2025-11-03 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1d7c3a9f2'
+down_revision: Union[str, None] = 'd2a9c6e4f8b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_comments_roots", "comments", ["post_id", "created_at", "id"],
+        postgresql_where=sa.text("parent_id IS NULL")
+    )
+    op.create_index("ix_comments_parent_id_created_at", "comments", ["parent_id", "created_at", "id"])
+
+
+def downgrade():
+    op.drop_index("ix_comments_parent_id_created_at", table_name="comments")
+    op.drop_index("ix_comments_roots", table_name="comments")
@@ -0,0 +1,53 @@
+"""Add materialized age bracket feeds
+
+Revision ID: f3c8a6d1b2e4
+Revises: e5b1d7c3a9f2
+Create Date: 2025-11-04 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a6d1b2e4'
+down_revision: Union[str, None] = 'e5b1d7c3a9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Группы с материализованной лентой; для 18+ подходит ix_posts_created_at_id
+AGE_BRACKETS = (0, 6, 12, 16)
+
+
+def upgrade():
+    op.create_table(
+        "age_feed_entries",
+        sa.Column("bracket", sa.SmallInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("post_id", sa.Integer(), sa.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False),
+        sa.PrimaryKeyConstraint("bracket", "created_at", "post_id"),
+    )
+    op.create_index("ix_age_feed_entries_post_id", "age_feed_entries", ["post_id"])
+    op.execute(sa.text(f"""
+        INSERT INTO age_feed_entries (bracket, created_at, post_id)
+        SELECT b.bracket, p.created_at, p.id
+        FROM posts p
+        JOIN unnest(ARRAY{list(AGE_BRACKETS)}::smallint[]) AS b(bracket) ON p.age_restriction <= b.bracket
+        WHERE p.created_at IS NOT NULL
+    """))
+    # Частичные индексы ленты по возрасту больше не читаются
+    for age in AGE_BRACKETS:
+        op.drop_index(f"ix_posts_feed_age_{age}", table_name="posts")
+
+
+def downgrade():
+    for age in AGE_BRACKETS:
+        op.create_index(
+            f"ix_posts_feed_age_{age}", "posts",
+            [sa.text("created_at DESC"), sa.text("id DESC")],
+            postgresql_where=sa.text(f"age_restriction <= {age}")
+        )
+    op.drop_index("ix_age_feed_entries_post_id", table_name="age_feed_entries")
+    op.drop_table("age_feed_entries")
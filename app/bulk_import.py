@@ -0,0 +1,305 @@
+"""
+Массовый импорт постов (POST /posts/bulk).
+
+Тело запроса читается потоком — NDJSON (по объекту на строку) или JSON-массив —
+и обрабатывается пачками по BULK_BATCH_SIZE, поэтому в памяти одновременно
+находится не больше одной пачки. На пачку:
+    1. валидация PostCreate;
+    2. поиск почти-дубликатов (app/near_duplicates.py) среди сохранённых постов и
+       более ранних элементов той же пачки: по DEDUP_POLICY они отклоняются или
+       принимаются с оценкой оригинала без модерации;
+    3. проверка токсичности остальных батчами на потоке инференса (toxicity_batcher);
+    4. один INSERT ... ON CONFLICT (phone) для всех авторов пачки;
+    5. multi-row INSERT постов, строк лент возрастных групп, сигнатур и задач
+       оценки качества в одной транзакции.
+Оценку качества выполняет воркер очереди, как и для одиночных постов.
+
+Результат по каждому элементу отдаётся NDJSON-строкой сразу после коммита его
+пачки: {"index": i, "status": "created" | "rejected" | "invalid", ...}.
+"""
+import codecs
+import json
+import os
+from typing import AsyncIterator, Iterable, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models, schemas
+from app.crud import USER_PROFILE_FIELDS, _age_feed_insert_stmt, _format_author_name, _user_upsert_stmt
+from app.near_duplicates import (DEDUP_POLICY, batch_duplicates, find_duplicate, post_text, remember, signature,
+                                 signature_stmts)
+from app.response_cache import response_cache
+from app.toxic_analis import toxicity_batcher
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+BULK_MAX_ITEM_BYTES = int(os.getenv("BULK_MAX_ITEM_BYTES", str(1024 * 1024)))
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+class BulkFormatError(ValueError):
+    pass
+
+
+async def _iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        if len(buffer) > BULK_MAX_ITEM_BYTES:
+            raise BulkFormatError(f"Item exceeds {BULK_MAX_ITEM_BYTES} bytes")
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+async def _iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    """
+    Инкрементальный разбор JSON-массива: элементы декодируются по мере
+    поступления, весь массив в память не читается.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    pos = 0
+    started = False
+    finished = False
+    eof = False
+    chunks = chunks.__aiter__()
+    while not finished:
+        try:
+            # Многобайтовый символ на границе чанка дочитывается декодером
+            text = text[pos:] + decoder.decode(await chunks.__anext__())
+            pos = 0
+        except StopAsyncIteration:
+            text = text[pos:] + decoder.decode(b"", final=True)
+            pos = 0
+            eof = True
+
+        while True:
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(text):
+                break
+            if not started:
+                if text[pos] != "[":
+                    raise BulkFormatError("Expected a JSON array or NDJSON body")
+                started = True
+                pos += 1
+                continue
+            if text[pos] == ",":
+                pos += 1
+                continue
+            if text[pos] == "]":
+                finished = True
+                break
+            try:
+                item, end = _decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                if len(text) - pos > BULK_MAX_ITEM_BYTES:
+                    raise BulkFormatError(f"Item exceeds {BULK_MAX_ITEM_BYTES} bytes")
+                break
+            pos = end
+            yield item
+
+        if eof and not finished:
+            raise BulkFormatError("Unexpected end of JSON array")
+
+
+async def iter_items(chunks: AsyncIterator[bytes], content_type: str) -> AsyncIterator[object]:
+    """
+    Элементы тела запроса. JSON-массив определяется по первому непробельному
+    символу, если Content-Type не указывает на NDJSON явно.
+    """
+    chunks = chunks.__aiter__()
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+
+    async def replay():
+        yield head
+        async for chunk in chunks:
+            yield chunk
+
+    if NDJSON_MEDIA_TYPE not in content_type and head.lstrip().startswith(b"["):
+        source = _iter_json_array(replay())
+    else:
+        source = _iter_ndjson(replay())
+    async for item in source:
+        yield item
+
+
+async def _batched(items: AsyncIterator[object], size: int) -> AsyncIterator[List[Tuple[int, object]]]:
+    batch = []
+    index = 0
+    async for item in items:
+        batch.append((index, item))
+        index += 1
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _author_rows(posts: Iterable[schemas.PostCreate]) -> List[dict]:
+    """
+    Одна строка на телефон: ON CONFLICT не может обновить строку дважды за запрос.
+    Поля нескольких постов одного автора сливаются, последнее заданное значение побеждает.
+    """
+    rows = {}
+    for p in posts:
+        if not p.author_phone:
+            continue
+        row = rows.setdefault(p.author_phone, {"phone": p.author_phone, **{f: None for f in USER_PROFILE_FIELDS}})
+        for field, value in (("firstname", p.author_firstname), ("surname", p.author_surname),
+                             ("lastname", p.author_lastname), ("age", p.author_age)):
+            if value is not None and value != "":
+                row[field] = value
+    return list(rows.values())
+
+
+async def _import_batch(db: AsyncSession, batch: List[Tuple[int, object]]) -> List[dict]:
+    results = {}
+    valid = []
+    for index, raw in batch:
+        try:
+            valid.append((index, schemas.PostCreate.model_validate(raw)))
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "invalid",
+                              "error": e.errors(include_url=False, include_context=False)}
+
+    # Почти-дубликаты прошли модерацию в оригинале; с уже оценённым оригиналом — и оценку
+    sigs = {index: signature(post_text(p.title, p.description)) for index, p in valid}
+    duplicates = {}
+    for index, _ in valid:
+        match = await find_duplicate(db, sigs[index])
+        if match is not None:
+            duplicates[index] = match
+    # Копии внутри пачки ещё не в БД: сравниваются с более ранними элементами пачки
+    # и разделяют судьбу первого экземпляра
+    fresh = [index for index, _ in valid if index not in duplicates]
+    copies = {
+        index: fresh[first]
+        for index, first in zip(fresh, batch_duplicates([sigs[i] for i in fresh])) if first is not None
+    }
+    unique = []
+    accepted = []
+    for index, post_in in valid:
+        if index in duplicates:
+            if DEDUP_POLICY == "reject":
+                results[index] = {"index": index, "status": "rejected",
+                                  "error": f"Near-duplicate of post {duplicates[index].post_id}"}
+            else:
+                accepted.append((index, post_in))
+        elif index in copies:
+            if DEDUP_POLICY == "reject":
+                results[index] = {"index": index, "status": "rejected",
+                                  "error": f"Near-duplicate of item {copies[index]}"}
+        else:
+            unique.append((index, post_in))
+
+    verdicts = await toxicity_batcher.is_toxic_many([p.description for _, p in unique])
+    toxic_indexes = set()
+    for (index, post_in), toxic in zip(unique, verdicts):
+        if toxic:
+            toxic_indexes.add(index)
+            results[index] = {"index": index, "status": "rejected", "error": "Post contains toxic content"}
+        else:
+            accepted.append((index, post_in))
+    if DEDUP_POLICY != "reject":
+        for index, post_in in valid:
+            if index not in copies:
+                continue
+            if copies[index] in toxic_indexes:
+                results[index] = {"index": index, "status": "rejected", "error": "Post contains toxic content"}
+            else:
+                accepted.append((index, post_in))
+
+    if accepted:
+        authors = {}
+        author_rows = _author_rows(p for _, p in accepted)
+        if author_rows:
+            users = models.User.__table__
+            stmt = _user_upsert_stmt(author_rows).returning(
+                users.c.id, users.c.phone, users.c.firstname, users.c.surname, users.c.lastname)
+            authors = {u.phone: u for u in (await db.execute(stmt)).all()}
+
+        post_rows = []
+        reused = set()
+        for index, p in accepted:
+            author = authors.get(p.author_phone) if p.author_phone else None
+            match = duplicates.get(index)
+            if match is not None and match.scoring_status == "done":
+                reused.add(index)
+            post_rows.append({
+                "title": p.title,
+                "description": p.description,
+                "categories": p.categories,
+                "age_segment": p.age_segment,
+                "age_restriction": p.age_restriction,
+                "community_id": p.community_id,
+                "author_id": author.id if author else None,
+                "author_name": _format_author_name(author) if author else None,
+                "quality_score": match.quality_score if index in reused else None,
+                "points_awarded": 0.0 if index in reused else None,
+                "scoring_status": "done" if index in reused else "pending",
+            })
+        post_ids = (await db.execute(
+            insert(models.Post).returning(models.Post.id, sort_by_parameter_order=True), post_rows
+        )).scalars().all()
+        id_by_index = {index: pid for (index, _), pid in zip(accepted, post_ids)}
+        duplicate_of = {index: match.post_id for index, match in duplicates.items()}
+        duplicate_of.update((index, id_by_index[first]) for index, first in copies.items() if index in id_by_index)
+        await db.execute(_age_feed_insert_stmt(post_ids))
+        accepted_sigs = [sigs[index] for index, _ in accepted]
+        for stmt, rows in signature_stmts(post_ids, accepted_sigs, [duplicate_of.get(index) for index, _ in accepted]):
+            await db.execute(stmt, rows)
+        # Оценка качества выполняется воркером очереди (app/scoring_worker.py); копии
+        # из этой же пачки своей задачи не получают и берут оценку первого экземпляра
+        jobs = [{"post_id": pid} for index, pid in id_by_index.items() if index not in reused and index not in copies]
+        if jobs:
+            await db.execute(insert(models.ScoringJob), jobs)
+        for index, post_id in id_by_index.items():
+            results[index] = {"index": index, "status": "created", "id": post_id}
+            if index in duplicate_of:
+                results[index]["duplicate_of"] = duplicate_of[index]
+
+    await db.commit()
+    if accepted:
+        remember(post_ids, accepted_sigs)
+        await response_cache.invalidate(pages=True)
+    return [results[index] for index, _ in batch]
+
+
+async def import_posts(db: AsyncSession, chunks: AsyncIterator[bytes], content_type: str,
+                       batch_size: int = BULK_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """
+    NDJSON-строки с результатами по мере обработки пачек; последней строкой — сводка.
+    Пачка коммитится целиком: ошибка БД откатывает только её и прерывает импорт.
+    """
+    summary = {"created": 0, "rejected": 0, "invalid": 0}
+    try:
+        async for batch in _batched(iter_items(chunks, content_type), batch_size):
+            for result in await _import_batch(db, batch):
+                summary[result["status"]] += 1
+                yield (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+    except (BulkFormatError, json.JSONDecodeError) as e:
+        await db.rollback()
+        summary["error"] = f"Malformed body: {e}"
+    except SQLAlchemyError as e:
+        # Строки уже закоммиченных пачек отправлены; сводка говорит, где импорт остановился
+        await db.rollback()
+        summary["error"] = f"Database error, batch rolled back: {e.__class__.__name__}"
+    yield (json.dumps({"summary": summary}, ensure_ascii=False) + "\n").encode("utf-8")
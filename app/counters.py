@@ -0,0 +1,42 @@
+"""
+Сверка денормализованных счётчиков posts.likes_count / posts.comments_count
+с таблицами likes и comments.
+
+Запуск: python -m app.counters
+"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+RECONCILE_SQL = text("""
+    UPDATE posts p
+    SET likes_count = actual.likes_count,
+        comments_count = actual.comments_count
+    FROM (
+        SELECT p2.id,
+               (SELECT count(*) FROM likes l WHERE l.post_id = p2.id) AS likes_count,
+               (SELECT count(*) FROM comments c WHERE c.post_id = p2.id) AS comments_count
+        FROM posts p2
+    ) actual
+    WHERE actual.id = p.id
+      AND (p.likes_count <> actual.likes_count OR p.comments_count <> actual.comments_count)
+""")
+
+
+def reconcile_counters(db: Session) -> int:
+    """
+    Исправляет расхождения одним запросом. Возвращает число исправленных постов.
+    """
+    result = db.execute(RECONCILE_SQL)
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        fixed = reconcile_counters(db)
+        print(f"Reconciled counters for {fixed} posts")
+    finally:
+        db.close()
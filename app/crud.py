@@ -1,10 +1,20 @@
-from sqlalchemy.orm import Session
+import logging
+import os
+from datetime import datetime
+from sqlalchemy import (BigInteger, SmallInteger, cast, column, delete, exists, func, insert, literal_column,
+                        or_, select, text, tuple_, union_all, update, values)
+from sqlalchemy.dialects.postgresql import array, insert as pg_insert
+from sqlalchemy.orm import Session, aliased
 from app import models, schemas
+from app.near_duplicates import post_text, signature, signature_stmts
+from app.pagination import after_cursor, decode_cursor
+from app.response_cache import response_cache
 from app.toxic_analis import is_toxic_by_model
-from app.quality_rating import rate_text_quality, calculate_points
 from fastapi import HTTPException
 from typing import List, Optional
 
+logger = logging.getLogger(__name__)
+
 def _format_author_name(user: models.User) -> str:
     parts = [user.firstname, user.surname, user.lastname]
     parts = [p for p in parts if p]
@@ -12,43 +22,95 @@ def _format_author_name(user: models.User) -> str:
         return " ".join(parts)
     return user.phone
 
+def _counter_stmt(post_id: int, column, delta: int):
+    return (
+        update(models.Post)
+        .where(models.Post.id == post_id)
+        .values({column: column + delta})
+        .returning(column)
+        .execution_options(synchronize_session=False)
+    )
+
+def _bump_counter(db: Session, post_id: int, column, delta: int) -> int:
+    """
+    Атомарно изменяет счётчик поста в текущей транзакции и возвращает новое значение.
+    """
+    return db.execute(_counter_stmt(post_id, column, delta)).scalar_one()
+
+USER_PROFILE_FIELDS = ("firstname", "surname", "lastname", "age")
+
+def _user_upsert_stmt(rows: List[dict]):
+    """
+    INSERT ... ON CONFLICT (phone) DO UPDATE для одного или нескольких пользователей.
+    Заданные поля перезаписывают сохранённые, None оставляет как есть.
+    В rows не должно быть повторяющихся телефонов.
+    """
+    return _on_conflict_update_profile(pg_insert(models.User).values(rows))
+
+def _on_conflict_update_profile(stmt, where=None):
+    users = models.User.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=[users.c.phone],
+        set_={f: func.coalesce(stmt.excluded[f], users.c[f]) for f in USER_PROFILE_FIELDS},
+        where=where,
+    )
+
+def _profile_fields(firstname: Optional[str] = None, surname: Optional[str] = None,
+                    lastname: Optional[str] = None, age: Optional[int] = None) -> dict:
+    # Пустые строки, как и None, не перезаписывают сохранённые значения
+    return {"firstname": firstname or None, "surname": surname or None,
+            "lastname": lastname or None, "age": age}
+
+def _get_or_create_user_stmt(phone: str, fields: dict):
+    """
+    Пользователь по телефону за один запрос к БД:
+        WITH upsert AS (INSERT ... ON CONFLICT (phone) DO UPDATE ... WHERE <поле изменилось>
+                        RETURNING users.*)
+        SELECT * FROM upsert UNION ALL SELECT * FROM users WHERE phone = :phone AND NOT EXISTS (upsert)
+    UPDATE выполняется только если хотя бы одно заданное поле отличается, иначе
+    строка берётся второй веткой без записи.
+    """
+    users = models.User.__table__
+    stmt = pg_insert(models.User).values(phone=phone, **fields)
+    changed = [stmt.excluded[f].is_distinct_from(users.c[f]) for f, v in fields.items() if v is not None]
+    if changed:
+        stmt = _on_conflict_update_profile(stmt, where=or_(*changed))
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[users.c.phone])
+    upsert = stmt.returning(*users.c).cte("upsert")
+    existing = select(*users.c).where(users.c.phone == phone).where(~exists(select(upsert.c.id)))
+    return (
+        select(models.User)
+        .from_statement(union_all(select(*upsert.c), existing))
+        .execution_options(populate_existing=True)
+    )
+
 def get_user_or_create(db: Session, phone: str, firstname: Optional[str] = None,
                        surname: Optional[str] = None, lastname: Optional[str] = None,
                        age: Optional[int] = None) -> models.User:
     """
     Find user by phone, create if not exists. Update fields if provided and different.
+    Один INSERT ... ON CONFLICT без отдельного SELECT; параллельные первые запросы
+    с одним телефоном не падают на уникальном ограничении. Коммит — за вызывающим.
     """
-    user = db.query(models.User).filter(models.User.phone == phone).first()
-    if user:
-        updated = False
-        if firstname and user.firstname != firstname:
-            user.firstname = firstname
-            updated = True
-        if surname and user.surname != surname:
-            user.surname = surname
-            updated = True
-        if lastname and user.lastname != lastname:
-            user.lastname = lastname
-            updated = True
-        if age is not None and user.age != age:
-            user.age = age
-            updated = True
-        if updated:
-            db.commit()
-            db.refresh(user)
-        return user
-    new = models.User(phone=phone, firstname=firstname, surname=surname, lastname=lastname, age=age)
-    db.add(new)
-    db.commit()
-    db.refresh(new)
-    return new
+    stmt = _get_or_create_user_stmt(phone, _profile_fields(firstname, surname, lastname, age))
+    user = db.execute(stmt).scalars().first()
+    if user is None:
+        # Строку вставила параллельная транзакция после снимка этого запроса:
+        # новый запрос получит новый снимок
+        user = db.execute(stmt).scalars().one()
+    return user
 
-def create_post(db: Session, post_in: schemas.PostCreate):
-    
-    toxic = is_toxic_by_model(post_in.description)
-    print(f"Toxic check result: {toxic}")
-    if toxic:
-        raise HTTPException(status_code=400, detail="Post contains toxic content")
+def create_post(db: Session, post_in: schemas.PostCreate, moderated: bool = False):
+    """
+    moderated=True — текст уже проверен на токсичность вызывающей стороной
+    (например, через toxicity_batcher в async-обработчике).
+    """
+    if not moderated:
+        toxic = is_toxic_by_model(post_in.description)
+        logger.debug("toxic check result: %s", toxic)
+        if toxic:
+            raise HTTPException(status_code=400, detail="Post contains toxic content")
 
     author_id = None
     author_name = None
@@ -66,10 +128,6 @@ def create_post(db: Session, post_in: schemas.PostCreate):
         author_id = author_user.id
         author_name = _format_author_name(author_user)
 
-    combined_text = f"{post_in.title}\n{post_in.description}"
-    quality_score = rate_text_quality(combined_text)
-    points_awarded = calculate_points(quality_score)
-
     db_post = models.Post(
         title=post_in.title,
         description=post_in.description,
@@ -79,47 +137,136 @@ def create_post(db: Session, post_in: schemas.PostCreate):
         community_id=post_in.community_id,
         author_id=author_id,
         author_name=author_name,
-        quality_score=quality_score,
-        points_awarded=points_awarded
+        quality_score=None,
+        points_awarded=None,
+        scoring_status="pending"
     )
     db.add(db_post)
-    
-    if author_user:
-        author_user.total_points += points_awarded
+    db.flush()
+    db.execute(_age_feed_insert_stmt([db_post.id]))
+    for stmt, rows in signature_stmts([db_post.id], [signature(post_text(db_post.title, db_post.description))], [None]):
+        db.execute(stmt, rows)
+    # Оценка качества выполняется воркером очереди (app/scoring_worker.py)
+    db.add(models.ScoringJob(post_id=db_post.id))
     
     db.commit()
+    response_cache.invalidate_sync(pages=True)
     db.refresh(db_post)
     return db_post
 
 def get_post(db: Session, post_id: int):
     return db.query(models.Post).filter(models.Post.id == post_id).first()
 
-def list_posts(db: Session, category: str = None, skip: int = 0, limit: int = 50,
-               user_age: Optional[int] = None) -> List[models.Post]:
+def _age_bracket(user_age: int) -> Optional[int]:
     """
-    Список постов с фильтрацией по категории и возрастным ограничениям.
+    Наибольшее значение age_restriction, доступное пользователю; None — доступно всё.
+    """
+    allowed = [a for a in models.AGE_RESTRICTIONS if a <= user_age]
+    if len(allowed) == len(models.AGE_RESTRICTIONS):
+        return None
+    return allowed[-1] if allowed else models.AGE_RESTRICTIONS[0]
+
+def _age_feed_insert_stmt(post_ids: List[int]):
+    """
+    INSERT ... SELECT строк материализованных лент для постов post_ids:
+    по строке на каждую группу AGE_FEED_BRACKETS, в которую пост попадает.
+    Выполняется в транзакции записи поста, после flush.
     """
-    q = db.query(models.Post)
+    brackets = values(column("bracket", SmallInteger), name="brackets", literal_binds=True).data(
+        [(b,) for b in models.AGE_FEED_BRACKETS]
+    )
+    post = models.Post
+    return insert(models.AgeFeedEntry).from_select(
+        ["bracket", "created_at", "post_id"],
+        select(brackets.c.bracket, post.created_at, post.id)
+        .join(brackets, post.age_restriction <= brackets.c.bracket)
+        .where(post.id.in_(post_ids)),
+    )
+
+def _age_feed_delete_stmt(post_ids: List[int]):
+    return delete(models.AgeFeedEntry).where(models.AgeFeedEntry.post_id.in_(post_ids))
+
+def _list_posts_stmt(category: str = None, skip: int = 0, limit: int = 50,
+                     user_age: Optional[int] = None, cursor: Optional[str] = None):
+    bracket = _age_bracket(user_age) if user_age is not None else None
+    if bracket is None:
+        # 18+ или возраст неизвестен — вся лента, индекс ix_posts_created_at_id
+        q = select(models.Post)
+        created_at, post_id = models.Post.created_at, models.Post.id
+    else:
+        # Лента возрастной группы читается диапазоном первичного ключа age_feed_entries
+        feed = models.AgeFeedEntry
+        q = select(models.Post).join(feed, feed.post_id == models.Post.id).where(feed.bracket == bracket)
+        created_at, post_id = feed.created_at, feed.post_id
     
     if category:
-        q = q.filter(models.Post.categories.contains([category]))
+        q = q.where(models.Post.categories.contains([category]))
     
-    # фильтрация по возрасту пользователя
-    if user_age is not None:
-        q = q.filter(models.Post.age_restriction <= user_age)
+    if cursor:
+        q = q.where(after_cursor(cursor, created_at, post_id))
+    else:
+        q = q.offset(skip)
     
-    return q.order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
+    return q.order_by(created_at.desc(), post_id.desc()).limit(limit)
+
+def list_posts(db: Session, category: str = None, skip: int = 0, limit: int = 50,
+               user_age: Optional[int] = None, cursor: Optional[str] = None) -> List[models.Post]:
+    """
+    Список постов с фильтрацией по категории и возрастным ограничениям.
+    С cursor используется keyset-пагинация, skip игнорируется.
+    """
+    stmt = _list_posts_stmt(category, skip, limit, user_age, cursor)
+    return list(db.execute(stmt).scalars().all())
 
 def update_post(db: Session, post: models.Post, update: schemas.PostUpdate):
-    for field, val in update.dict(exclude_unset=True).items():
+    fields = update.dict(exclude_unset=True)
+    for field, val in fields.items():
         setattr(post, field, val)
+    if "age_restriction" in fields:
+        db.flush()
+        db.execute(_age_feed_delete_stmt([post.id]))
+        db.execute(_age_feed_insert_stmt([post.id]))
     db.commit()
+    response_cache.invalidate_sync([post.id], pages=True)
     db.refresh(post)
     return post
 
 def delete_post(db: Session, post: models.Post):
     db.delete(post)
     db.commit()
+    response_cache.invalidate_sync([post.id], pages=True)
+
+COMMENTS_MAX_DEPTH = int(os.getenv("COMMENTS_MAX_DEPTH", "3"))  # глубина по умолчанию
+COMMENTS_DEPTH_LIMIT = int(os.getenv("COMMENTS_DEPTH_LIMIT", "10"))  # максимум для ?depth=
+
+def _comment_thread_stmt(post_id: int, parent_id: Optional[int] = None, limit: int = 20,
+                         max_depth: int = COMMENTS_MAX_DEPTH, cursor: Optional[str] = None):
+    """
+    Страница ветки комментариев одним рекурсивным запросом: limit комментариев
+    уровня parent_id (корневых при None) после cursor в порядке (created_at, id)
+    и их ответы до глубины max_depth. Строки — (Comment, depth) в порядке обхода
+    дерева в глубину.
+    """
+    c = models.Comment
+    roots = select(c.id, func.row_number().over(order_by=(c.created_at, c.id)).label("ord")).where(c.post_id == post_id)
+    roots = roots.where(c.parent_id.is_(None) if parent_id is None else c.parent_id == parent_id)
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor)
+        roots = roots.where(tuple_(c.created_at, c.id) > tuple_(created_at, comment_id))
+    roots = roots.order_by(c.created_at, c.id).limit(limit).cte("roots")
+
+    thread = (
+        select(c.id, literal_column("0").label("depth"), array([roots.c.ord, cast(c.id, BigInteger)]).label("path"))
+        .join(roots, roots.c.id == c.id)
+        .cte("thread", recursive=True)
+    )
+    reply = aliased(c)
+    thread = thread.union_all(
+        select(reply.id, thread.c.depth + 1, func.array_append(thread.c.path, cast(reply.id, BigInteger)))
+        .join(thread, reply.parent_id == thread.c.id)
+        .where(thread.c.depth < max_depth)
+    )
+    return select(c, thread.c.depth).join(thread, thread.c.id == c.id).order_by(thread.c.path)
 
 def add_comment(db: Session, c: schemas.CommentCreate):
     post = get_post(db, c.post_id)
@@ -145,10 +292,78 @@ def add_comment(db: Session, c: schemas.CommentCreate):
         text=c.text
     )
     db.add(comment)
+    db.flush()
+    _bump_counter(db, post.id, models.Post.comments_count, 1)
     db.commit()
+    response_cache.invalidate_sync([post.id])
     db.refresh(comment)
     return comment
 
+# Переключение лайка одним запросом: удаление или вставка лайка, запись в
+# like_events, изменение posts.likes_count и новое значение счётчика.
+# :allow_remove / :allow_add задают режим: toggle (оба), like, unlike.
+# При гонке двух одновременных «поставить» вторая вставка упирается в
+# uix_user_post_like и ничего не меняет (removed = added = false).
+TOGGLE_LIKE_SQL = text("""
+    WITH post AS (
+        SELECT id, age_restriction, likes_count FROM posts WHERE id = :post_id
+    ),
+    allowed AS (
+        SELECT id FROM post
+        WHERE CAST(:user_age AS integer) IS NULL OR age_restriction <= CAST(:user_age AS integer)
+    ),
+    removed AS (
+        DELETE FROM likes
+        WHERE :allow_remove AND user_id = :user_id AND post_id IN (SELECT id FROM allowed)
+        RETURNING id
+    ),
+    added AS (
+        INSERT INTO likes (user_id, post_id, created_at)
+        SELECT :user_id, id, CAST(:now AS timestamp) FROM allowed
+        WHERE :allow_add AND NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT ON CONSTRAINT uix_user_post_like DO NOTHING
+        RETURNING id
+    ),
+    delta AS (
+        SELECT (SELECT count(*) FROM added) - (SELECT count(*) FROM removed) AS value
+    ),
+    event AS (
+        INSERT INTO like_events (user_id, post_id, delta, created_at)
+        SELECT :user_id, :post_id, value, CAST(:now AS timestamp) FROM delta WHERE value <> 0
+    ),
+    counter AS (
+        UPDATE posts SET likes_count = likes_count + (SELECT value FROM delta)
+        WHERE id = :post_id AND (SELECT value FROM delta) <> 0
+        RETURNING likes_count
+    )
+    SELECT
+        (SELECT age_restriction FROM post) AS age_restriction,
+        EXISTS (SELECT 1 FROM allowed) AS allowed,
+        (SELECT value FROM delta) AS delta,
+        COALESCE((SELECT likes_count FROM counter), (SELECT likes_count FROM post)) AS likes_count
+""")
+
+LIKE_MODES = {"toggle": (True, True), "like": (False, True), "unlike": (True, False)}
+
+def _toggle_like_params(post_id: int, user_id: int, user_age: Optional[int], mode: str = "toggle") -> dict:
+    allow_remove, allow_add = LIKE_MODES[mode]
+    return {"post_id": post_id, "user_id": user_id, "user_age": user_age,
+            "allow_remove": allow_remove, "allow_add": allow_add, "now": datetime.utcnow()}
+
+def _like_result(row) -> dict:
+    """
+    Результат TOGGLE_LIKE_SQL: {"action": "added"/"removed"/"unchanged", "likes_count": N}.
+    """
+    if row.age_restriction is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if not row.allowed:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Age restriction: post requires age {row.age_restriction}+"
+        )
+    action = {1: "added", -1: "removed"}.get(row.delta, "unchanged")
+    return {"action": action, "likes_count": row.likes_count}
+
 def toggle_like(db: Session, post: models.Post, phone: str,
                 firstname: Optional[str] = None, surname: Optional[str] = None, 
                 lastname: Optional[str] = None, age: Optional[int] = None):
@@ -156,27 +371,9 @@ def toggle_like(db: Session, post: models.Post, phone: str,
     Toggle like by user's phone. Return dict {"action": "added"/"removed", "likes_count": N}
     """
     user = get_user_or_create(db, phone, firstname, surname, lastname, age)
-    
-    if user.age is not None and post.age_restriction > user.age:
-        raise HTTPException(
-            status_code=403, 
-            detail=f"Age restriction: post requires age {post.age_restriction}+"
-        )
-    
-    existing = (
-        db.query(models.Like)
-        .filter(models.Like.post_id == post.id)
-        .filter(models.Like.user_id == user.id)
-        .first()
-    )
-    if existing:
-        db.delete(existing)
-        db.commit()
-        likes_count = db.query(models.Like).filter(models.Like.post_id == post.id).count()
-        return {"action": "removed", "likes_count": likes_count}
-    
-    like = models.Like(user_id=user.id, post_id=post.id)
-    db.add(like)
+    row = db.execute(TOGGLE_LIKE_SQL, _toggle_like_params(post.id, user.id, user.age)).one()
+    result = _like_result(row)
     db.commit()
-    likes_count = db.query(models.Like).filter(models.Like.post_id == post.id).count()
-    return {"action": "added", "likes_count": likes_count}
\ No newline at end of file
+    if result["action"] != "unchanged":
+        response_cache.invalidate_sync([post.id])
+    return result
@@ -0,0 +1,278 @@
+"""
+Async-версии функций app/crud.py для обработчиков API (AsyncSession + asyncpg).
+Синхронные версии в app/crud.py остаются для скриптов и воркеров.
+"""
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import models, schemas
+from app.crud import (COMMENTS_MAX_DEPTH, TOGGLE_LIKE_SQL, _age_feed_delete_stmt, _age_feed_insert_stmt,
+                      _comment_thread_stmt, _counter_stmt, _format_author_name, _get_or_create_user_stmt,
+                      _like_result, _list_posts_stmt, _profile_fields, _toggle_like_params)
+from app.near_duplicates import DuplicateMatch, post_text, remember, signature, signature_stmts
+from app.observability import stage
+from app.pagination import encode_cursor
+from app.response_cache import response_cache
+from app.scoring_worker import enqueue_stmts
+from app.toxic_analis import toxicity_batcher
+from app.user_cache import phone_user_cache
+from fastapi import HTTPException
+from typing import List, Optional, Tuple
+
+async def _bump_counter(db: AsyncSession, post_id: int, column, delta: int) -> int:
+    return (await db.execute(_counter_stmt(post_id, column, delta))).scalar_one()
+
+async def get_user_or_create(db: AsyncSession, phone: str, firstname: Optional[str] = None,
+                             surname: Optional[str] = None, lastname: Optional[str] = None,
+                             age: Optional[int] = None) -> models.User:
+    """
+    Find user by phone, create if not exists. Update fields if provided and different.
+    Один INSERT ... ON CONFLICT без отдельного SELECT (см. crud._get_or_create_user_stmt);
+    коммит — за вызывающим.
+    """
+    stmt = _get_or_create_user_stmt(phone, _profile_fields(firstname, surname, lastname, age))
+    user = (await db.execute(stmt)).scalars().first()
+    if user is None:
+        # Строку вставила параллельная транзакция после снимка этого запроса
+        user = (await db.execute(stmt)).scalars().one()
+    return user
+
+async def resolve_user(db: AsyncSession, phone: str, firstname: Optional[str] = None,
+                       surname: Optional[str] = None, lastname: Optional[str] = None,
+                       age: Optional[int] = None) -> Tuple[int, Optional[int]]:
+    """
+    (user_id, age) по телефону. Без полей профиля берётся из phone_user_cache,
+    иначе — upsert. Кэш пополняет вызывающий после коммита, чтобы в него не попал
+    id пользователя из откаченной транзакции.
+    """
+    fields = _profile_fields(firstname, surname, lastname, age)
+    if all(v is None for v in fields.values()):
+        cached = phone_user_cache.get(phone)
+        if cached is not None:
+            return cached
+    user = await get_user_or_create(db, phone, firstname, surname, lastname, age)
+    return user.id, user.age
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.get(models.User, user_id)
+
+async def get_leaderboard(db: AsyncSession, skip: int = 0, limit: int = 50) -> List[schemas.LeaderboardEntryOut]:
+    """
+    Страница предрассчитанного рейтинга (app/points.py) — диапазон по первичному ключу rank.
+    """
+    entry = models.LeaderboardEntry
+    rows = (await db.execute(
+        select(entry, models.User)
+        .join(models.User, models.User.id == entry.user_id)
+        .where(entry.rank > skip)
+        .order_by(entry.rank)
+        .limit(limit)
+    )).all()
+    # Без _format_author_name: в публичный рейтинг не должен попадать телефон
+    return [
+        schemas.LeaderboardEntryOut(rank=e.rank, user_id=e.user_id,
+                                    name=" ".join(p for p in (u.firstname, u.surname, u.lastname) if p) or None,
+                                    total_points=e.total_points, updated_at=e.updated_at)
+        for e, u in rows
+    ]
+
+async def create_post(db: AsyncSession, post_in: schemas.PostCreate, moderated: bool = False,
+                      duplicate: Optional[DuplicateMatch] = None, sig: Optional[np.ndarray] = None):
+    """
+    moderated=True — текст уже проверен на токсичность вызывающей стороной.
+    duplicate — найденный вызывающей стороной почти-дубликат (app/near_duplicates.py):
+    если оригинал уже оценён, его quality_score переиспользуется без задачи оценки
+    и без поинтов.
+    """
+    if not moderated:
+        with stage("create_post", "toxicity"):
+            toxic = await toxicity_batcher.is_toxic(post_in.description)
+        if toxic:
+            raise HTTPException(status_code=400, detail="Post contains toxic content")
+
+    author_id = None
+    author_name = None
+
+    if post_in.author_phone:
+        with stage("create_post", "user_upsert"):
+            author_user = await get_user_or_create(
+                db,
+                phone=post_in.author_phone,
+                firstname=post_in.author_firstname,
+                surname=post_in.author_surname,
+                lastname=post_in.author_lastname,
+                age=post_in.author_age
+            )
+        author_id = author_user.id
+        author_name = _format_author_name(author_user)
+
+    if sig is None:
+        sig = signature(post_text(post_in.title, post_in.description))
+    reuse = duplicate is not None and duplicate.scoring_status == "done"
+    db_post = models.Post(
+        title=post_in.title,
+        description=post_in.description,
+        categories=post_in.categories,
+        age_segment=post_in.age_segment,
+        age_restriction=post_in.age_restriction,
+        community_id=post_in.community_id,
+        author_id=author_id,
+        author_name=author_name,
+        quality_score=duplicate.quality_score if reuse else None,
+        points_awarded=0.0 if reuse else None,
+        scoring_status="done" if reuse else "pending"
+    )
+    db.add(db_post)
+    with stage("create_post", "insert"):
+        await db.flush()
+        await db.execute(_age_feed_insert_stmt([db_post.id]))
+        for stmt, rows in signature_stmts([db_post.id], [sig], [duplicate.post_id if duplicate else None]):
+            await db.execute(stmt, rows)
+    if not reuse:
+        # Оценка качества выполняется воркером очереди (app/scoring_worker.py)
+        db.add(models.ScoringJob(post_id=db_post.id))
+
+    with stage("create_post", "commit"):
+        await db.commit()
+    remember([db_post.id], [sig])
+    await response_cache.invalidate(pages=True)
+    await db.refresh(db_post)
+    return db_post
+
+async def get_post(db: AsyncSession, post_id: int) -> Optional[models.Post]:
+    return await db.get(models.Post, post_id)
+
+async def get_posts_by_ids(db: AsyncSession, post_ids: List[int]) -> List[models.Post]:
+    """
+    Посты в порядке post_ids (отсутствующие пропускаются).
+    """
+    if not post_ids:
+        return []
+    rows = (await db.execute(select(models.Post).where(models.Post.id.in_(post_ids)))).scalars().all()
+    by_id = {p.id: p for p in rows}
+    return [by_id[i] for i in post_ids if i in by_id]
+
+async def list_posts(db: AsyncSession, category: str = None, skip: int = 0, limit: int = 50,
+                     user_age: Optional[int] = None, cursor: Optional[str] = None) -> List[models.Post]:
+    """
+    Список постов с фильтрацией по категории и возрастным ограничениям.
+    С cursor используется keyset-пагинация, skip игнорируется.
+    """
+    stmt = _list_posts_stmt(category, skip, limit, user_age, cursor)
+    return list((await db.execute(stmt)).scalars().all())
+
+async def update_post(db: AsyncSession, post: models.Post, update: schemas.PostUpdate):
+    fields = update.dict(exclude_unset=True)
+    for field, val in fields.items():
+        setattr(post, field, val)
+    if "age_restriction" in fields:
+        await db.flush()
+        await db.execute(_age_feed_delete_stmt([post.id]))
+        await db.execute(_age_feed_insert_stmt([post.id]))
+    await db.commit()
+    await response_cache.invalidate([post.id], pages=True)
+    await db.refresh(post)
+    return post
+
+async def delete_post(db: AsyncSession, post: models.Post):
+    # Комментарии, лайки, задачи оценки и строки лент возрастных групп удаляются каскадом на уровне БД
+    # (ondelete="CASCADE" в миграциях); ORM-каскад потребовал бы ленивой загрузки.
+    await db.execute(delete(models.Post).where(models.Post.id == post.id))
+    await db.commit()
+    await response_cache.invalidate([post.id], pages=True)
+
+async def enqueue_scoring(db: AsyncSession, post: models.Post):
+    for stmt in enqueue_stmts(post.id):
+        await db.execute(stmt)
+    await db.commit()
+    await response_cache.invalidate([post.id])
+    await db.refresh(post)
+
+async def list_comments(db: AsyncSession, post_id: int, parent_id: Optional[int] = None, limit: int = 20,
+                        max_depth: int = COMMENTS_MAX_DEPTH,
+                        cursor: Optional[str] = None) -> Tuple[List[schemas.CommentOut], Optional[str]]:
+    """
+    Страница ветки комментариев (см. crud._comment_thread_stmt) и курсор следующей
+    страницы по последнему комментарию уровня parent_id.
+    """
+    rows = (await db.execute(_comment_thread_stmt(post_id, parent_id, limit, max_depth, cursor))).all()
+    roots = [comment for comment, depth in rows if depth == 0]
+    next_page = encode_cursor(roots[-1].created_at, roots[-1].id) if len(roots) == limit else None
+    comments = [schemas.CommentOut.model_validate(comment).model_copy(update={"depth": depth})
+                for comment, depth in rows]
+    return comments, next_page
+
+async def add_comment(db: AsyncSession, c: schemas.CommentCreate):
+    post = await get_post(db, c.post_id)
+    if not post:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    user = await get_user_or_create(
+        db, c.author_phone, c.author_firstname,
+        c.author_surname, c.author_lastname, c.author_age
+    )
+
+    if user.age is not None and post.age_restriction > user.age:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Age restriction: post requires age {post.age_restriction}+"
+        )
+
+    comment = models.Comment(
+        post_id=c.post_id,
+        parent_id=c.parent_id,
+        author_id=user.id,
+        author_name=_format_author_name(user),
+        text=c.text
+    )
+    db.add(comment)
+    await db.flush()
+    await _bump_counter(db, post.id, models.Post.comments_count, 1)
+    await db.commit()
+    await response_cache.invalidate([post.id])
+    await db.refresh(comment)
+    return comment
+
+async def toggle_like(db: AsyncSession, post_id: int, phone: str,
+                      firstname: Optional[str] = None, surname: Optional[str] = None,
+                      lastname: Optional[str] = None, age: Optional[int] = None, mode: str = "toggle"):
+    """
+    Toggle like by user's phone. Return dict {"action": "added"/"removed", "likes_count": N}
+    Существование поста, возраст, лайк, журнал и счётчик — один запрос TOGGLE_LIKE_SQL;
+    пользователь при попадании в phone_user_cache обращений к БД не требует.
+    """
+    user_id, user_age = await resolve_user(db, phone, firstname, surname, lastname, age)
+    row = (await db.execute(TOGGLE_LIKE_SQL, _toggle_like_params(post_id, user_id, user_age, mode))).one()
+    result = _like_result(row)
+    await db.commit()
+    phone_user_cache.put(phone, user_id, user_age)
+    if result["action"] != "unchanged":
+        await response_cache.invalidate([post_id])
+    return result
+
+async def toggle_likes_batch(db: AsyncSession, items: List[schemas.LikeBatchItem]) -> List[dict]:
+    """
+    Очередь лайков из офлайн-режима клиента: каждый телефон разрешается один раз,
+    все переключения выполняются в одной транзакции в порядке items. Ошибки
+    (нет поста, возрастное ограничение) возвращаются по элементу и не прерывают батч.
+    """
+    users = {}
+    for item in items:
+        if item.phone not in users:
+            users[item.phone] = await resolve_user(db, item.phone)
+
+    results = []
+    for item in items:
+        user_id, user_age = users[item.phone]
+        row = (await db.execute(
+            TOGGLE_LIKE_SQL, _toggle_like_params(item.post_id, user_id, user_age, item.action)
+        )).one()
+        try:
+            results.append({"post_id": item.post_id, **_like_result(row)})
+        except HTTPException as e:
+            results.append({"post_id": item.post_id, "action": "error", "error": e.detail})
+    await db.commit()
+    for phone, (user_id, user_age) in users.items():
+        phone_user_cache.put(phone, user_id, user_age)
+    await response_cache.invalidate({r["post_id"] for r in results if r["action"] in ("added", "removed")})
+    return results
@@ -0,0 +1,81 @@
+import os
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app import models, schemas
+from app.response_cache import response_cache
+
+COMMENTS_PREVIEW_SIZE = int(os.getenv("COMMENTS_PREVIEW_SIZE", "3"))
+
+
+async def _comment_previews(db: AsyncSession, post_ids: List[int]) -> Dict[int, List[models.Comment]]:
+    """
+    Последние COMMENTS_PREVIEW_SIZE корневых комментариев каждого поста страницы
+    одним запросом: LATERAL-подзапрос на пост читает ix_comments_roots с конца.
+    """
+    if COMMENTS_PREVIEW_SIZE <= 0:
+        return {}
+    page = select(models.Post.id).where(models.Post.id.in_(post_ids)).subquery("page")
+    latest = (
+        select(models.Comment)
+        .where(models.Comment.post_id == page.c.id, models.Comment.parent_id.is_(None))
+        .order_by(models.Comment.created_at.desc(), models.Comment.id.desc())
+        .limit(COMMENTS_PREVIEW_SIZE)
+        .lateral("latest")
+    )
+    comment = aliased(models.Comment, latest)
+    comments = (await db.execute(
+        select(comment).select_from(page).join(latest, true())
+        .order_by(comment.created_at, comment.id)
+    )).scalars().all()
+    grouped = defaultdict(list)
+    for c in comments:
+        grouped[c.post_id].append(c)
+    return grouped
+
+
+def _to_post_out(p: models.Post, preview: List[models.Comment]) -> schemas.PostOut:
+    return schemas.PostOut(
+        id=p.id, title=p.title, description=p.description, categories=p.categories,
+        age_segment=p.age_segment, age_restriction=p.age_restriction,
+        community_id=p.community_id, quality_score=p.quality_score,
+        points_awarded=p.points_awarded, scoring_status=p.scoring_status,
+        created_at=p.created_at,
+        author_id=p.author_id, author_name=p.author_name, likes_count=p.likes_count,
+        comments_count=p.comments_count,
+        comments_preview=[schemas.CommentOut.model_validate(c) for c in preview]
+    )
+
+
+async def load_post_outs(db: AsyncSession, posts: List[models.Post]) -> List[schemas.PostOut]:
+    """
+    Собирает страницу PostOut за фиксированное число запросов, независимо от
+    размера страницы и числа комментариев: счётчики берутся из posts, превью
+    комментариев — одной выборкой.
+    """
+    if not posts:
+        return []
+    post_ids = [p.id for p in posts]
+    previews = await _comment_previews(db, post_ids)
+    return [_to_post_out(p, previews.get(p.id, [])) for p in posts]
+
+
+async def load_post_out(db: AsyncSession, post: models.Post) -> schemas.PostOut:
+    return (await load_post_outs(db, [post]))[0]
+
+
+async def store_post_bodies(db: AsyncSession, posts: List[models.Post]) -> Dict[int, bytes]:
+    """
+    Сериализованные PostOut для постов; результат кладётся в response_cache.
+    """
+    bodies = {out.id: out.model_dump_json().encode() for out in await load_post_outs(db, posts)}
+    await response_cache.put_posts(bodies)
+    return bodies
+
+
+def json_array(bodies: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(bodies) + b"]"
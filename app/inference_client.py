@@ -0,0 +1,283 @@
+"""
+Устойчивая обёртка вызовов внешнего инференса (оценка качества через Gemma).
+
+    ограничение параллелизма — не больше INFERENCE_MAX_CONCURRENCY ожидаемых
+        попыток одновременно на процесс; без свободного слота вызов ждёт не
+        дольше своего дедлайна;
+    дедлайн — INFERENCE_DEADLINE_SECONDS на весь вызов вместе с повторами;
+        каждая попытка получает таймаут timeout= до дедлайна вызова, а не от
+        своего начала; попытка, брошенная после ответа другой или по дедлайну,
+        сразу отдаёт слот и дорабатывает в фоне не дольше дедлайна (потоков
+        max_concurrency × max_attempts — столько запросов видит сервер в худшем случае);
+    хеджирование и повторы — если попытка не ответила за
+        INFERENCE_HEDGE_AFTER_SECONDS, параллельно запускается ещё одна (при
+        свободном слоте), при ошибке попытки — сразу следующая; всего не больше
+        INFERENCE_MAX_ATTEMPTS, побеждает первый успешный ответ;
+    предохранитель (circuit breaker) — после INFERENCE_BREAKER_FAILURES
+        неудачных вызовов подряд вызовы INFERENCE_BREAKER_RESET_SECONDS сразу
+        завершаются CircuitOpenError, затем один пробный вызов решает, закрыть
+        его или открыть снова. Воркер оценки на CircuitOpenError откладывает
+        задачу до retry_after, не расходуя попытки (app/scoring_worker.py).
+
+Статистика — ResilientInferenceClient.stats().
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+INFERENCE_MAX_CONCURRENCY = int(os.getenv("INFERENCE_MAX_CONCURRENCY", "8"))
+INFERENCE_DEADLINE_SECONDS = float(os.getenv("INFERENCE_DEADLINE_SECONDS", "20"))
+INFERENCE_HEDGE_AFTER_SECONDS = float(os.getenv("INFERENCE_HEDGE_AFTER_SECONDS", "5"))  # 0 — без хеджирования
+INFERENCE_MAX_ATTEMPTS = int(os.getenv("INFERENCE_MAX_ATTEMPTS", "3"))
+INFERENCE_BREAKER_FAILURES = int(os.getenv("INFERENCE_BREAKER_FAILURES", "5"))
+INFERENCE_BREAKER_RESET_SECONDS = float(os.getenv("INFERENCE_BREAKER_RESET_SECONDS", "30"))
+
+
+class InferenceError(Exception):
+    """
+    Вызов инференса не удался в пределах дедлайна.
+    """
+
+
+class InferenceTimeout(InferenceError):
+    pass
+
+
+class CircuitOpenError(InferenceError):
+    """
+    Предохранитель открыт: вызов не выполнялся. retry_after — через сколько
+    секунд имеет смысл повторить.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Inference circuit open, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = INFERENCE_BREAKER_FAILURES,
+                 reset_seconds: float = INFERENCE_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"  # closed, open, half_open
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(remaining)
+                self.state = "half_open"
+            # half_open: пропускается один пробный вызов, остальные ждут его результата
+            if self._probe_in_flight:
+                raise CircuitOpenError(1.0)
+            self._probe_in_flight = True
+
+    def on_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class _Attempt:
+    __slots__ = ("deadline", "released")
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.released = False
+
+
+class ResilientInferenceClient:
+    """
+    call(*args, timeout=..., **kwargs) — одна попытка; timeout — секунды до
+    дедлайна вызова, дольше попытка работать не должна.
+    """
+
+    def __init__(self, call: Callable, max_concurrency: int = INFERENCE_MAX_CONCURRENCY,
+                 deadline_seconds: float = INFERENCE_DEADLINE_SECONDS,
+                 hedge_after_seconds: float = INFERENCE_HEDGE_AFTER_SECONDS,
+                 max_attempts: int = INFERENCE_MAX_ATTEMPTS,
+                 breaker: CircuitBreaker = None):
+        self._call = call
+        self.max_concurrency = max_concurrency
+        self.deadline_seconds = deadline_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.max_attempts = max_attempts
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        # Брошенные попытки не держат слот, но занимают поток до ответа или таймаута
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * max_attempts,
+                                            thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0          # предохранитель открыт
+        self.saturated = 0         # нет свободного слота до дедлайна
+        self.attempts = 0
+        self.attempt_errors = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.abandoned = 0         # попытки, брошенные до завершения
+
+    def __call__(self, *args, **kwargs):
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.rejected += 1
+            raise
+        started = time.monotonic()
+        self.calls += 1
+        try:
+            result = self._attempts(started + self.deadline_seconds, args, kwargs)
+        except Exception:
+            self.failures += 1
+            self.breaker.on_failure()
+            raise
+        self.successes += 1
+        self.breaker.on_success()
+        with self._lock:
+            self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _release(self, attempt: _Attempt) -> bool:
+        """
+        Отдаёт слот попытки ровно один раз: по её завершении или когда вызов её бросил.
+        """
+        with self._lock:
+            if attempt.released:
+                return False
+            attempt.released = True
+            self.in_flight -= 1
+        self._slots.release()
+        return True
+
+    def _run(self, attempt: _Attempt, args, kwargs):
+        if attempt.released:
+            return None  # вызов завершился, пока попытка ждала поток
+        try:
+            timeout = attempt.deadline - time.monotonic()
+            if timeout <= 0:
+                raise InferenceTimeout("Deadline passed before the attempt started")
+            return self._call(*args, timeout=timeout, **kwargs)
+        finally:
+            self._release(attempt)
+
+    def _attempts(self, deadline: float, args, kwargs):
+        pending = {}  # future -> (попытка, True, если хеджирующая)
+        try:
+            return self._wait_attempts(deadline, args, kwargs, pending)
+        finally:
+            for attempt, _ in pending.values():
+                if self._release(attempt):
+                    self.abandoned += 1
+
+    def _wait_attempts(self, deadline: float, args, kwargs, pending: dict):
+        last_error = None
+        launched = 0
+
+        def launch(hedge: bool) -> bool:
+            nonlocal launched
+            # Хеджирующей попытке слот нужен сразу, повтор и первая попытка ждут его до дедлайна
+            if hedge:
+                acquired = self._slots.acquire(blocking=False)
+            else:
+                acquired = self._slots.acquire(timeout=max(deadline - time.monotonic(), 0))
+            if not acquired:
+                if not hedge:
+                    self.saturated += 1
+                return False
+            launched += 1
+            self.attempts += 1
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            attempt = _Attempt(deadline)
+            pending[self._executor.submit(self._run, attempt, args, kwargs)] = (attempt, hedge)
+            return True
+
+        if not launch(hedge=False):
+            raise InferenceTimeout("No free inference slot before deadline")
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                raise InferenceTimeout(f"Inference deadline {self.deadline_seconds}s exceeded") from last_error
+            can_hedge = self.hedge_after_seconds > 0 and launched < self.max_attempts
+            done, _ = wait(list(pending), timeout=min(remaining, self.hedge_after_seconds) if can_hedge else remaining,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                _, hedge = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    self.attempt_errors += 1
+                    continue
+                if hedge:
+                    self.hedge_wins += 1
+                return result
+
+            if done and not pending:
+                # Все запущенные попытки завершились ошибкой: сразу следующая, пока есть попытки
+                if launched >= self.max_attempts:
+                    raise InferenceError(f"Inference failed after {launched} attempts: {last_error}") from last_error
+                if not launch(hedge=False):
+                    raise InferenceTimeout("No free inference slot before deadline") from last_error
+            elif not done and can_hedge and time.monotonic() < deadline and launch(hedge=True):
+                # Попытка не ответила за hedge_after: дублирующая при свободном слоте
+                # (ожидание, истёкшее по дедлайну, дубль не запускает)
+                self.hedges += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        def percentile(q):
+            return latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0.0
+        return {
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "consecutive_failures": self.breaker.failures,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_concurrency": self.max_concurrency,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "saturated": self.saturated,
+            "attempts": self.attempts,
+            "attempt_errors": self.attempt_errors,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "abandoned": self.abandoned,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p99_ms": percentile(0.99),
+        }
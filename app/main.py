@@ -1,15 +1,125 @@
 # app/main.py
-from fastapi import FastAPI
-from app.database import engine, Base
-from app.routes import posts, users
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 
-Base.metadata.create_all(bind=engine)
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from prometheus_client import REGISTRY
+from sqlalchemy import text
 
-app = FastAPI(title="RecSys API", version="1.0.0")
+from app import toxic_analis
+from app.database import DB_MAX_OVERFLOW, DB_POOL_SIZE, AsyncSessionLocal, async_engine
+from app.near_duplicates import DEDUP_POLICY, load_index, near_duplicate_index
+from app.observability import MetricsMiddleware, PoolCollector, configure_logging, metrics_payload, register_stats
+from app.routes import feed, likes, posts, users
+from app.toxic_analis import toxicity_batcher
+from app.response_cache import response_cache
+from app.score_cache import score_cache
+from app.user_cache import phone_user_cache
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Прогрев модели токсичности в фоне после старта; 0 — загрузка при первом запросе
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "1") == "1"
+
+
+async def _warm_up():
+    try:
+        await toxicity_batcher.warm_up()
+    except Exception:
+        logger.exception("toxicity model warm-up failed")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Схема БД создаётся миграциями (alembic upgrade head), а не при импорте приложения
+    warm_up = asyncio.create_task(_warm_up()) if WARMUP_ON_STARTUP else None
+    # Индекс почти-дубликатов грузится в фоне; до готовности поиск идёт по post_lsh_bands
+    dedup_index = asyncio.create_task(load_index(AsyncSessionLocal)) if DEDUP_POLICY != "off" else None
+    yield
+    for task in (warm_up, dedup_index):
+        if task is not None and not task.done():
+            task.cancel()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="RecSys API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+REGISTRY.register(PoolCollector({"async": async_engine.sync_engine}, DB_POOL_SIZE + DB_MAX_OVERFLOW))
+register_stats("toxicity", toxicity_batcher.stats)
+register_stats("quality_cache", score_cache.stats)
+register_stats("user_cache", phone_user_cache.stats)
+register_stats("response_cache", response_cache.stats)
+register_stats("near_duplicates", near_duplicate_index.stats)
 
 app.include_router(posts.router)
 app.include_router(users.router)
+app.include_router(feed.router)
+app.include_router(likes.router)
 
 @app.get("/")
 def root():
     return {"status": "ok"}
+
+@app.get("/health/live")
+def liveness():
+    """
+    Процесс жив и обслуживает запросы; модели и БД не проверяются.
+    """
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Готовность принимать трафик: БД доступна и модель токсичности загружена.
+    """
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception as e:
+        database = f"error: {type(e).__name__}"
+
+    checks = {
+        "database": database,
+        "toxicity_model": toxic_analis.model_state,
+    }
+    ready = database == "ok" and toxic_analis.model_state == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/metrics/toxicity")
+def toxicity_metrics():
+    return toxicity_batcher.stats()
+
+
+@app.get("/metrics/quality-cache")
+def quality_cache_metrics():
+    return score_cache.stats()
+
+
+@app.get("/metrics/user-cache")
+def user_cache_metrics():
+    return phone_user_cache.stats()
+
+
+@app.get("/metrics/response-cache")
+def response_cache_metrics():
+    return response_cache.stats()
+
+
+@app.get("/metrics/near-duplicates")
+def near_duplicates_metrics():
+    return near_duplicate_index.stats()
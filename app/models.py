@@ -1,11 +1,22 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Text, ForeignKey, UniqueConstraint, Float
+    Column, Computed, Integer, BigInteger, SmallInteger, String, DateTime, Text, ForeignKey, UniqueConstraint,
+    Float, Index, LargeBinary
 )
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from datetime import datetime
 from app.database import Base
 
+# Допустимые значения Post.age_restriction
+AGE_RESTRICTIONS = (0, 6, 12, 16, 18)
+# Поисковый вектор поста (app/search.py): заголовок весомее описания
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian'::regconfig, coalesce(description, '')), 'B')"
+)
+# Возрастные группы с материализованной лентой (AgeFeedEntry); 18+ — вся таблица posts
+AGE_FEED_BRACKETS = AGE_RESTRICTIONS[:-1]
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -20,6 +31,11 @@ class User(Base):
     likes = relationship("Like", back_populates="user", cascade="all, delete-orphan")
     comments = relationship("Comment", back_populates="author")
 
+    __table_args__ = (
+        # Пересборка таблицы рейтинга (app/points.py): top-N без сортировки всех пользователей
+        Index("ix_users_total_points", total_points.desc(), id),
+    )
+
 class Post(Base):
     __tablename__ = "posts"
     id = Column(Integer, primary_key=True, index=True)
@@ -31,13 +47,42 @@ class Post(Base):
     community_id = Column(Integer, nullable=True)
     quality_score = Column(Float, nullable=True)
     points_awarded = Column(Float, nullable=True)
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+    scoring_status = Column(String, nullable=False, default="pending", server_default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     author_name = Column(String, nullable=True)
+    # Вычисляется БД при записи; не загружается вместе с постом
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
 
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     likes = relationship("Like", back_populates="post", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_posts_created_at_id", created_at.desc(), id.desc()),
+        Index("ix_posts_categories_gin", categories, postgresql_using="gin",
+              postgresql_ops={"categories": "jsonb_path_ops"}),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+class AgeFeedEntry(Base):
+    """
+    Материализованная лента возрастной группы: пост входит во все группы
+    bracket из AGE_FEED_BRACKETS, для которых age_restriction <= bracket.
+    Страница группы — диапазон первичного ключа, без фильтрации строк posts.
+    Синхронизируется в той же транзакции, что и запись поста (crud._age_feed_*);
+    при удалении поста строки удаляются каскадом.
+    """
+    __tablename__ = "age_feed_entries"
+    bracket = Column(SmallInteger, primary_key=True)
+    created_at = Column(DateTime, primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_age_feed_entries_post_id", "post_id"),
+    )
+
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
@@ -52,6 +97,14 @@ class Comment(Base):
     author = relationship("User", back_populates="comments")
     replies = relationship("Comment", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at", "id"),
+        # Корневые комментарии поста (страницы ветки и превью в ленте)
+        Index("ix_comments_roots", "post_id", "created_at", "id", postgresql_where=parent_id.is_(None)),
+        # Ответы на комментарий (рекурсивный обход ветки и страницы ответов)
+        Index("ix_comments_parent_id_created_at", "parent_id", "created_at", "id"),
+    )
+
 class Like(Base):
     __tablename__ = "likes"
     id = Column(Integer, primary_key=True)
@@ -64,4 +117,104 @@ class Like(Base):
 
     __table_args__ = (
         UniqueConstraint("user_id", "post_id", name="uix_user_post_like"),
-    )
\ No newline at end of file
+        Index("ix_likes_post_id", "post_id"),
+        Index("ix_likes_created_at", "created_at"),
+    )
+
+class LikeEvent(Base):
+    """
+    Журнал изменений лайков для инкрементального обновления индекса похожих постов.
+    """
+    __tablename__ = "like_events"
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    post_id = Column(Integer, nullable=False)
+    delta = Column(SmallInteger, nullable=False)  # +1 лайк, -1 снятие лайка
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PointsLedger(Base):
+    """
+    Журнал начислений поинтов. Пишется в транзакции начисления вместо
+    UPDATE users.total_points; app/points.py пачками сворачивает
+    неучтённые записи (applied_at IS NULL) в User.total_points.
+    """
+    __tablename__ = "points_ledger"
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = Column(Integer, nullable=True)
+    delta = Column(Float, nullable=False)
+    reason = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    applied_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_points_ledger_pending", "id", postgresql_where=applied_at.is_(None)),
+        Index("ix_points_ledger_user_id", "user_id"),
+    )
+
+class LeaderboardEntry(Base):
+    """
+    Предрассчитанный рейтинг пользователей по total_points (app/points.py).
+    """
+    __tablename__ = "leaderboard"
+    rank = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    total_points = Column(Float, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class PostSignature(Base):
+    """
+    MinHash-сигнатура поста для поиска почти-дубликатов (app/near_duplicates.py).
+    duplicate_of — оригинал, чей результат модерации и оценки переиспользован.
+    """
+    __tablename__ = "post_signatures"
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    duplicate_of = Column(Integer, ForeignKey("posts.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class PostLshBand(Base):
+    """
+    Ключи LSH-полос сигнатур: кандидаты в дубликаты — посты с общим bucket.
+    """
+    __tablename__ = "post_lsh_bands"
+    bucket = Column(BigInteger, primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_post_lsh_bands_post_id", "post_id"),
+    )
+
+class ScoringJob(Base):
+    __tablename__ = "scoring_jobs"
+    id = Column(Integer, primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), nullable=False, unique=True)
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_scoring_jobs_status_run_after", "status", "run_after"),
+    )
+
+class FeedCandidates(Base):
+    """
+    Предрассчитанные кандидаты персональной ленты (app/recommender.py).
+    """
+    __tablename__ = "feed_candidates"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_ids = Column(ARRAY(Integer), nullable=False)
+    scores = Column(ARRAY(Float), nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class QualityScoreCache(Base):
+    __tablename__ = "quality_score_cache"
+    text_hash = Column(String(64), primary_key=True)
+    model = Column(String, primary_key=True)
+    prompt_version = Column(String(16), primary_key=True)
+    score = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
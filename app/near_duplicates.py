@@ -0,0 +1,445 @@
+"""
+Поиск почти-дубликатов постов (MinHash + LSH) до модерации и оценки качества.
+
+Текст поста (заголовок + описание) разбивается на словесные шинглы по
+DEDUP_SHINGLE_SIZE слов после нормализации; MinHash-сигнатура из
+DEDUP_NUM_PERM 32-битных минимумов оценивает коэффициент Жаккара между
+множествами шинглов долей совпавших позиций. Сигнатура делится на
+DEDUP_BANDS полос по DEDUP_ROWS строк; ключ полосы — 64-битный хэш её строк.
+Посты с общим ключом хотя бы одной полосы — кандидаты; почти-дубликат —
+кандидат с оценкой сходства >= DEDUP_THRESHOLD.
+
+Хранение:
+    post_signatures  — сигнатура поста (DEDUP_NUM_PERM * 4 байта) и duplicate_of;
+    post_lsh_bands   — ключи полос (bucket, post_id), индекс LSH в БД.
+Обе таблицы пишутся в транзакции создания поста. В памяти процесса API
+индекс — отсортированный массив ключей полос с id постов (np.searchsorted
+по всем полосам сразу) и небольшой словарь ещё не слитых новых постов.
+Он загружается в фоне при старте и догружает посты других процессов каждые
+DEDUP_REFRESH_SECONDS; пока он не готов, кандидаты ищутся по post_lsh_bands.
+
+Что делать с дубликатом, задаёт DEDUP_POLICY:
+    reuse  — не проверять токсичность и не оценивать заново: пост получает
+             quality_score оригинала и не получает поинтов (по умолчанию);
+    reject — отклонить пост (409);
+    off    — не искать дубликаты (сигнатуры всё равно сохраняются).
+
+Пороги подобраны на синтетическом корпусе: python -m benchmarks.near_duplicates --tune
+
+Пересчёт сигнатур и полос (после смены параметров или для старых постов):
+    python -m app.near_duplicates --rebuild
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import models
+from app.score_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEDUP_POLICY = os.getenv("DEDUP_POLICY", "reuse")
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", "2"))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", "64"))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", "16"))
+DEDUP_ROWS = DEDUP_NUM_PERM // DEDUP_BANDS
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.7"))
+DEDUP_REFRESH_SECONDS = float(os.getenv("DEDUP_REFRESH_SECONDS", "2"))
+DEDUP_MERGE_SIZE = int(os.getenv("DEDUP_MERGE_SIZE", "20000"))  # новых ключей до слияния в массив
+DEDUP_LOAD_CHUNK = int(os.getenv("DEDUP_LOAD_CHUNK", "50000"))
+# Посты с id ниже водяного знака, закоммиченные позже соседей, догружаются в этом окне
+DEDUP_REFRESH_OVERLAP = int(os.getenv("DEDUP_REFRESH_OVERLAP", "1000"))
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_WORD_RE = re.compile(r"\w+")
+
+
+def _permutations(num_perm: int):
+    # Фиксированное зерно: сигнатуры должны совпадать во всех процессах и между перезапусками
+    rng = np.random.RandomState(1)
+    a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def _band_mixers(rows: int, bands: int):
+    rng = np.random.RandomState(2)
+    mix = rng.randint(1, 1 << 62, size=rows, dtype=np.uint64) | np.uint64(1)
+    salt = rng.randint(1, 1 << 62, size=bands, dtype=np.uint64)
+    return mix, salt
+
+
+_PERMUTATIONS = {}
+_MIXERS = {}
+
+
+def post_text(title: str, description: str) -> str:
+    return f"{title}\n{description}"
+
+
+def shingles(text: str, size: int = DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    words = _WORD_RE.findall(normalize_text(text).lower())
+    if len(words) <= size:
+        grams = {" ".join(words)}
+    else:
+        grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+        dtype=np.uint64, count=len(grams),
+    )
+
+
+def signature(text: str, num_perm: int = DEDUP_NUM_PERM, shingle_size: int = DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    """
+    MinHash-сигнатура текста: num_perm значений uint32.
+    """
+    if num_perm not in _PERMUTATIONS:
+        _PERMUTATIONS[num_perm] = _permutations(num_perm)
+    a, b = _PERMUTATIONS[num_perm]
+    hashes = shingles(text, shingle_size)
+    # Переполнение uint64 в a * h допустимо: нужна лишь фиксированная перестановка
+    with np.errstate(over="ignore"):
+        values = (np.outer(a, hashes) + b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return values.min(axis=1).astype(np.uint32)
+
+
+def band_keys(signatures: np.ndarray, bands: int = DEDUP_BANDS) -> np.ndarray:
+    """
+    Ключи полос: (..., num_perm) uint32 -> (..., bands) int64. Номер полосы входит
+    в ключ, поэтому все полосы лежат в одном пространстве ключей.
+    """
+    rows = signatures.shape[-1] // bands
+    if (rows, bands) not in _MIXERS:
+        _MIXERS[rows, bands] = _band_mixers(rows, bands)
+    mix, salt = _MIXERS[rows, bands]
+    grouped = signatures.reshape(*signatures.shape[:-1], bands, rows).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        keys = (grouped * mix).sum(axis=-1, dtype=np.uint64) ^ salt
+    return keys.view(np.int64)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Оценка коэффициента Жаккара по двум сигнатурам.
+    """
+    return float(np.count_nonzero(a == b)) / len(a)
+
+
+def to_bytes(sig: np.ndarray) -> bytes:
+    return sig.astype("<u4").tobytes()
+
+
+def from_bytes(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype="<u4")
+
+
+@dataclass
+class DuplicateMatch:
+    post_id: int            # оригинал, с которого копируется результат
+    similarity: float
+    quality_score: Optional[float]
+    scoring_status: str
+
+
+class LshIndex:
+    """
+    LSH-индекс в памяти: отсортированные ключи полос (_keys) с id постов (_ids)
+    и словарь новых ключей (_recent), который сливается в массивы, когда
+    вырастает до DEDUP_MERGE_SIZE.
+    """
+
+    def __init__(self):
+        self._keys = np.empty(0, dtype=np.int64)
+        self._ids = np.empty(0, dtype=np.int32)
+        self._recent: Dict[int, List[int]] = {}
+        self._recent_size = 0
+        self._recent_ids: Set[int] = set()  # id в окне DEDUP_REFRESH_OVERLAP от водяного знака
+        self._lock = threading.Lock()
+        self.state = "empty"  # empty, loading, ready, failed
+        self.watermark = 0
+        self.posts = 0
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+        self.lookup_max_seconds = 0.0
+        self.duplicates = 0
+
+    def add_many(self, post_ids: Sequence[int], keys: np.ndarray):
+        """
+        keys: (len(post_ids), bands). Уже добавленные посты из окна пропускаются.
+        """
+        with self._lock:
+            for post_id, row in zip(post_ids, keys):
+                if post_id in self._recent_ids:
+                    continue
+                if post_id > self.watermark - DEDUP_REFRESH_OVERLAP:
+                    self._recent_ids.add(post_id)
+                for key in row.tolist():
+                    self._recent.setdefault(key, []).append(post_id)
+                self._recent_size += len(row)
+                self.posts += 1
+            if self._recent_size >= DEDUP_MERGE_SIZE:
+                self._merge()
+
+    def _merge(self):
+        if not self._recent:
+            return
+        pairs = [(k, i) for k, ids in self._recent.items() for i in ids]
+        keys = np.concatenate([self._keys, np.fromiter((k for k, _ in pairs), dtype=np.int64, count=len(pairs))])
+        ids = np.concatenate([self._ids, np.fromiter((i for _, i in pairs), dtype=np.int32, count=len(pairs))])
+        order = np.argsort(keys, kind="stable")
+        self._keys, self._ids = keys[order], ids[order]
+        self._recent = {}
+        self._recent_size = 0
+
+    def load_bulk(self, post_ids: np.ndarray, keys: np.ndarray):
+        """
+        Массовая загрузка (старт процесса): без словаря, сразу в массивы.
+        """
+        with self._lock:
+            flat_ids = np.repeat(post_ids.astype(np.int32), keys.shape[1])
+            all_keys = np.concatenate([self._keys, keys.reshape(-1)])
+            all_ids = np.concatenate([self._ids, flat_ids])
+            order = np.argsort(all_keys, kind="stable")
+            self._keys, self._ids = all_keys[order], all_ids[order]
+            self.posts += len(post_ids)
+            if len(post_ids):
+                self.watermark = max(self.watermark, int(post_ids.max()))
+                # Верх загрузки попадёт в окно следующей догрузки; повторно не добавлять
+                self._recent_ids.update(post_ids[post_ids > self.watermark - DEDUP_REFRESH_OVERLAP].tolist())
+
+    def advance(self, watermark: int):
+        with self._lock:
+            self.watermark = max(self.watermark, watermark)
+            floor = self.watermark - DEDUP_REFRESH_OVERLAP
+            self._recent_ids = {i for i in self._recent_ids if i > floor}
+
+    def candidates(self, keys: np.ndarray) -> Set[int]:
+        started = time.perf_counter()
+        with self._lock:
+            left = np.searchsorted(self._keys, keys, side="left")
+            right = np.searchsorted(self._keys, keys, side="right")
+            found = set()
+            for lo, hi in zip(left.tolist(), right.tolist()):
+                if hi > lo:
+                    found.update(self._ids[lo:hi].tolist())
+            for key in keys.tolist():
+                found.update(self._recent.get(key, ()))
+        elapsed = time.perf_counter() - started
+        self.lookups += 1
+        self.lookup_seconds += elapsed
+        self.lookup_max_seconds = max(self.lookup_max_seconds, elapsed)
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "policy": DEDUP_POLICY,
+            "posts": self.posts,
+            "watermark": self.watermark,
+            "index_bytes": int(self._keys.nbytes + self._ids.nbytes),
+            "pending_keys": self._recent_size,
+            "lookups": self.lookups,
+            "lookup_avg_ms": self.lookup_seconds / self.lookups * 1000 if self.lookups else 0.0,
+            "lookup_max_ms": self.lookup_max_seconds * 1000,
+            "duplicates": self.duplicates,
+        }
+
+
+near_duplicate_index = LshIndex()
+
+
+# --- запросы к БД, общие для sync и async ---
+
+def signature_stmts(post_ids: Sequence[int], signatures: Sequence[np.ndarray],
+                    duplicate_of: Sequence[Optional[int]]) -> list:
+    """
+    INSERT сигнатур и ключей полос для новых постов; выполняются в транзакции поста.
+    """
+    keys = band_keys(np.stack(signatures))
+    return [
+        (insert(models.PostSignature), [
+            {"post_id": pid, "signature": to_bytes(sig), "duplicate_of": dup}
+            for pid, sig, dup in zip(post_ids, signatures, duplicate_of)
+        ]),
+        (insert(models.PostLshBand), [
+            {"bucket": key, "post_id": pid}
+            for pid, row in zip(post_ids, keys) for key in set(row.tolist())
+        ]),
+    ]
+
+
+def _matches_stmt(candidate_ids: Iterable[int]):
+    sig = models.PostSignature
+    original = func.coalesce(sig.duplicate_of, sig.post_id)
+    return (
+        select(sig.post_id, sig.signature, original.label("original_id"),
+               models.Post.quality_score, models.Post.scoring_status)
+        .join(models.Post, models.Post.id == original)
+        .where(sig.post_id.in_(list(candidate_ids)))
+    )
+
+
+def _best_match(sig: np.ndarray, rows) -> Optional[DuplicateMatch]:
+    best = None
+    for row in rows:
+        score = similarity(sig, from_bytes(row.signature))
+        if score >= DEDUP_THRESHOLD and (best is None or score > best.similarity):
+            best = DuplicateMatch(row.original_id, score, row.quality_score, row.scoring_status)
+    return best
+
+
+def batch_duplicates(signatures: Sequence[np.ndarray]) -> List[Optional[int]]:
+    """
+    Почти-дубликаты внутри пачки ещё не сохранённых постов: для каждой сигнатуры —
+    позиция более раннего первого экземпляра со сходством >= DEDUP_THRESHOLD или None.
+    """
+    if DEDUP_POLICY == "off" or not len(signatures):
+        return [None] * len(signatures)
+    sigs = np.stack(signatures)
+    originals: List[int] = []
+    result = []
+    for i, sig in enumerate(sigs):
+        match = None
+        if originals:
+            scores = np.count_nonzero(sigs[originals] == sig, axis=1) / sigs.shape[1]
+            best = int(np.argmax(scores))
+            if scores[best] >= DEDUP_THRESHOLD:
+                match = originals[best]
+        if match is None:
+            originals.append(i)
+        result.append(match)
+    return result
+
+
+async def find_duplicate(db: AsyncSession, sig: np.ndarray) -> Optional[DuplicateMatch]:
+    """
+    Почти-дубликат для сигнатуры или None. Кандидаты — из индекса в памяти,
+    пока он не загружен — из post_lsh_bands; сходство проверяется по
+    сохранённым сигнатурам кандидатов.
+    """
+    if DEDUP_POLICY == "off":
+        return None
+    keys = band_keys(sig)
+    if near_duplicate_index.state == "ready":
+        candidate_ids = near_duplicate_index.candidates(keys)
+    else:
+        candidate_ids = set((await db.execute(
+            select(models.PostLshBand.post_id).where(models.PostLshBand.bucket.in_(keys.tolist()))
+        )).scalars().all())
+    if not candidate_ids:
+        return None
+    match = _best_match(sig, (await db.execute(_matches_stmt(candidate_ids))).all())
+    if match is not None:
+        near_duplicate_index.duplicates += 1
+    return match
+
+
+def remember(post_ids: Sequence[int], signatures: Sequence[np.ndarray]):
+    """
+    Добавляет закоммиченные посты этого процесса в индекс в памяти.
+    """
+    if post_ids:
+        near_duplicate_index.add_many(post_ids, band_keys(np.stack(signatures)))
+
+
+async def load_index(session_factory, refresh_seconds: float = DEDUP_REFRESH_SECONDS):
+    """
+    Фоновая задача процесса API: загрузка индекса из post_signatures и
+    периодическая догрузка постов, созданных другими процессами.
+    """
+    index = near_duplicate_index
+    index.state = "loading"
+    try:
+        await _load_after(session_factory, 0, bulk=True)
+        index.state = "ready"
+    except Exception:
+        index.state = "failed"
+        logger.exception("near-duplicate index load failed")
+        return
+    while True:
+        await asyncio.sleep(refresh_seconds)
+        try:
+            await _load_after(session_factory, max(index.watermark - DEDUP_REFRESH_OVERLAP, 0), bulk=False)
+        except Exception:
+            logger.exception("near-duplicate index refresh failed")
+
+
+async def _load_after(session_factory, after_id: int, bulk: bool):
+    sig = models.PostSignature
+    async with session_factory() as db:
+        while True:
+            rows = (await db.execute(
+                select(sig.post_id, sig.signature).where(sig.post_id > after_id)
+                .order_by(sig.post_id).limit(DEDUP_LOAD_CHUNK)
+            )).all()
+            if not rows:
+                return
+            post_ids = np.fromiter((r.post_id for r in rows), dtype=np.int64, count=len(rows))
+            keys = band_keys(np.stack([from_bytes(r.signature) for r in rows]))
+            if bulk:
+                near_duplicate_index.load_bulk(post_ids, keys)
+            else:
+                near_duplicate_index.add_many(post_ids.tolist(), keys)
+            near_duplicate_index.advance(int(post_ids[-1]))
+            after_id = int(post_ids[-1])
+            if len(rows) < DEDUP_LOAD_CHUNK:
+                return
+
+
+def rebuild(db: Session, batch_size: int = 5000) -> int:
+    """
+    Пересчитывает сигнатуры и полосы всех постов (duplicate_of сохраняется).
+    """
+    db.execute(delete(models.PostLshBand))
+    duplicates = dict(db.execute(
+        select(models.PostSignature.post_id, models.PostSignature.duplicate_of)
+        .where(models.PostSignature.duplicate_of.is_not(None))
+    ).all())
+    db.execute(delete(models.PostSignature))
+    total = 0
+    after_id = 0
+    while True:
+        posts = db.execute(
+            select(models.Post.id, models.Post.title, models.Post.description)
+            .where(models.Post.id > after_id).order_by(models.Post.id).limit(batch_size)
+        ).all()
+        if not posts:
+            break
+        sigs = [signature(post_text(p.title, p.description)) for p in posts]
+        for stmt, rows in signature_stmts([p.id for p in posts], sigs, [duplicates.get(p.id) for p in posts]):
+            db.execute(stmt, rows)
+        total += len(posts)
+        after_id = posts[-1].id
+    db.commit()
+    return total
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Near-duplicate signatures maintenance")
+    parser.add_argument("--rebuild", action="store_true", help="пересчитать сигнатуры и полосы всех постов")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            print(f"Rebuilt signatures for {rebuild(db)} posts in {time.perf_counter() - started:.1f}s")
+        finally:
+            db.close()
+    else:
+        parser.print_help()
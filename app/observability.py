@@ -0,0 +1,228 @@
+"""
+Метрики Prometheus (GET /metrics) и настройка логирования.
+
+    recsys_http_request_duration_seconds{method, route, status} — время ответа
+        по шаблону маршрута (/posts/{post_id}), вместе с потоковой выдачей тела;
+    recsys_stage_duration_seconds{operation, stage} — этапы create_post
+        (near_duplicate, toxicity, user_upsert, insert, commit) и воркера оценки
+        (quality_llm, commit);
+    recsys_db_queries_per_request / recsys_db_time_per_request_seconds{route} —
+        число и суммарное время SQL-запросов за HTTP-запрос, recsys_db_query_duration_seconds —
+        время каждого запроса (события before/after_cursor_execute движков);
+    recsys_db_pool_*{engine} — заполненность пулов соединений на момент сбора;
+    recsys_<name>_<поле> — числовые поля stats() компонентов (те же данные,
+        что /metrics/<name> в JSON).
+
+Логи: LOG_LEVEL (по умолчанию INFO) и LOG_FORMAT json|text. В json каждая
+запись — одна строка с полями ts, level, logger, message и extra=; сообщения
+ниже уровня не форматируются.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "recsys_http_request_duration_seconds", "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "recsys_stage_duration_seconds", "Duration of pipeline stages",
+    ["operation", "stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_QUERY_SECONDS = Histogram(
+    "recsys_db_query_duration_seconds", "SQL statement execution time",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "recsys_db_queries_per_request", "SQL statements executed per HTTP request",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "recsys_db_time_per_request_seconds", "Total SQL time per HTTP request",
+    ["route"],
+)
+
+# [число запросов, секунды] текущего HTTP-запроса; список изменяется на месте,
+# поэтому видим и из потоков, и из greenlet-ов asyncpg, унаследовавших контекст
+_db_usage: contextvars.ContextVar = contextvars.ContextVar("db_usage", default=None)
+
+
+def stage(operation: str, stage_name: str):
+    """
+    with stage("create_post", "commit"): ... — время этапа в recsys_stage_duration_seconds.
+    """
+    return STAGE_SECONDS.labels(operation, stage_name).time()
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware (не BaseHTTPMiddleware, чтобы не буферизовать потоковые ответы):
+    время до последнего фрагмента тела и SQL-запросы за время запроса.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        usage = [0, 0.0]
+        token = _db_usage.set(usage)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _db_usage.reset(token)
+            # Шаблон маршрута роутер кладёт в scope при сопоставлении; без него —
+            # одна метка, чтобы произвольные пути не раздували число рядов
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status[0])).observe(
+                time.perf_counter() - started)
+            DB_QUERIES_PER_REQUEST.labels(route).observe(usage[0])
+            DB_TIME_PER_REQUEST.labels(route).observe(usage[1])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_SECONDS.observe(elapsed)
+    usage = _db_usage.get()
+    if usage is not None:
+        usage[0] += 1
+        usage[1] += elapsed
+
+
+def _handle_error(exception_context):
+    # Запрос с ошибкой не доходит до after_cursor_execute
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(sync_engine):
+    """
+    Подписывает движок (для async — async_engine.sync_engine) на учёт SQL-запросов.
+    """
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class PoolCollector:
+    """
+    Заполненность пулов соединений: занятые, свободные, сверх pool_size и доля
+    занятых от pool_size + max_overflow (1.0 — новые запросы ждут соединения).
+    """
+
+    def __init__(self, engines: Dict[str, object], capacity: int):
+        self.engines = engines
+        self.capacity = capacity
+
+    def collect(self):
+        metrics = {
+            "checked_out": GaugeMetricFamily("recsys_db_pool_checked_out", "Connections in use", labels=["engine"]),
+            "checked_in": GaugeMetricFamily("recsys_db_pool_checked_in", "Idle pooled connections",
+                                            labels=["engine"]),
+            "overflow": GaugeMetricFamily("recsys_db_pool_overflow", "Connections beyond pool_size",
+                                          labels=["engine"]),
+            "saturation": GaugeMetricFamily("recsys_db_pool_saturation",
+                                            "checked_out / (pool_size + max_overflow)", labels=["engine"]),
+        }
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            checked_out = pool.checkedout()
+            metrics["checked_out"].add_metric([name], checked_out)
+            metrics["checked_in"].add_metric([name], pool.checkedin())
+            metrics["overflow"].add_metric([name], max(pool.overflow(), 0))
+            metrics["saturation"].add_metric([name], checked_out / self.capacity if self.capacity else 0.0)
+        yield from metrics.values()
+
+
+class StatsCollector:
+    """
+    Числовые поля stats() компонента как gauge recsys_<name>_<поле>.
+    """
+
+    def __init__(self, name: str, stats: Callable[[], dict]):
+        self.name = name
+        self.stats = stats
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = re.sub(r"[^a-zA-Z0-9_]", "_", f"recsys_{self.name}_{key}")
+            yield GaugeMetricFamily(metric, f"{self.name} stats: {key}", value=value)
+
+
+def register_stats(name: str, stats: Callable[[], dict]):
+    REGISTRY.register(StatsCollector(name, stats))
+
+
+def metrics_payload():
+    """
+    (тело, Content-Type) ответа /metrics.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """
+    Один обработчик в stderr на корневом логгере; повторный вызов его заменяет.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if getattr(existing, "_recsys", False):
+            root.removeHandler(existing)
+    handler._recsys = True
+    root.addHandler(handler)
+    root.setLevel(level)
@@ -0,0 +1,54 @@
+"""
+Курсорная (keyset) пагинация ленты по (created_at, id).
+
+Курсор непрозрачен для клиента: base64url от JSON [created_at, id]
+последнего поста страницы.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+from app import models
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Порядок ленты; совпадает с индексом ix_posts_created_at_id
+FEED_ORDER = (models.Post.created_at.desc(), models.Post.id.desc())
+
+
+def encode_cursor(created_at: datetime, post_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), post_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, post_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(cursor: str, created_at_column=models.Post.created_at, id_column=models.Post.id):
+    """
+    Условие «строго после курсора» в порядке FEED_ORDER. Столбцы можно
+    подменить, если лента читается из другой таблицы (age_feed_entries).
+    """
+    created_at, post_id = decode_cursor(cursor)
+    return tuple_(created_at_column, id_column) < tuple_(created_at, post_id)
+
+
+def next_cursor(posts: list, limit: int) -> Optional[str]:
+    """
+    Курсор следующей страницы или None, если страница последняя.
+    """
+    if not posts or len(posts) < limit:
+        return None
+    last = posts[-1]
+    return encode_cursor(last.created_at, last.id)
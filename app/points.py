@@ -0,0 +1,124 @@
+"""
+Начисление поинтов через журнал points_ledger.
+
+Начисление — это INSERT в points_ledger в транзакции, где оно происходит
+(воркер оценки качества), без UPDATE строки users: параллельные начисления
+одному автору не ждут друг друга на блокировке строки и не теряются.
+Агрегатор периодически забирает неучтённые записи пачками
+(FOR UPDATE SKIP LOCKED), одним запросом прибавляет суммы к
+User.total_points и помечает записи applied_at. Записи, закоммиченные во
+время свёртки, попадут в следующую пачку.
+
+После свёртки пересобирается таблица leaderboard (top LEADERBOARD_SIZE
+по total_points), из которой отдаётся GET /users/leaderboard.
+
+Запуск:
+    python -m app.points             # одна свёртка и пересборка рейтинга
+    python -m app.points --loop 30   # каждые 30 секунд
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.observability import configure_logging
+
+POINTS_ROLLUP_BATCH = int(os.getenv("POINTS_ROLLUP_BATCH", "10000"))
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_SQL = text("""
+    WITH batch AS (
+        UPDATE points_ledger SET applied_at = now()
+        WHERE id IN (
+            SELECT id FROM points_ledger
+            WHERE applied_at IS NULL
+            ORDER BY id
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING user_id, delta
+    ),
+    sums AS (
+        SELECT user_id, sum(delta) AS delta FROM batch GROUP BY user_id
+    ),
+    updated AS (
+        UPDATE users SET total_points = coalesce(users.total_points, 0) + sums.delta
+        FROM sums WHERE users.id = sums.user_id
+        RETURNING users.id
+    )
+    SELECT (SELECT count(*) FROM batch) AS entries, (SELECT count(*) FROM updated) AS users
+""")
+
+LEADERBOARD_SQL = text("""
+    INSERT INTO leaderboard (rank, user_id, total_points, updated_at)
+    SELECT row_number() OVER (ORDER BY total_points DESC, id), id, total_points, now()
+    FROM (
+        SELECT id, total_points FROM users
+        WHERE total_points > 0
+        ORDER BY total_points DESC, id
+        LIMIT :size
+    ) AS top
+""")
+
+
+def ledger_stmt(user_id: int, delta: float, reason: str, post_id: Optional[int] = None):
+    """
+    Запись начисления; выполняется в транзакции вызывающей стороны.
+    """
+    return insert(models.PointsLedger).values(user_id=user_id, post_id=post_id, delta=delta, reason=reason)
+
+
+def rollup(db: Session, batch_size: int = POINTS_ROLLUP_BATCH) -> int:
+    """
+    Сворачивает все неучтённые записи журнала; пачка — одна транзакция.
+    Возвращает число учтённых записей.
+    """
+    applied = 0
+    while True:
+        row = db.execute(ROLLUP_SQL, {"limit": batch_size}).one()
+        db.commit()
+        applied += row.entries
+        if row.entries < batch_size:
+            return applied
+
+
+def refresh_leaderboard(db: Session, size: int = LEADERBOARD_SIZE):
+    """
+    Пересобирает рейтинг в одной транзакции: читатели видят старый или новый целиком.
+    """
+    db.execute(text("DELETE FROM leaderboard"))
+    db.execute(LEADERBOARD_SQL, {"size": size})
+    db.commit()
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Roll up points ledger and refresh leaderboard")
+    parser.add_argument("--loop", type=float, default=0, help="повторять каждые N секунд")
+    args = parser.parse_args()
+
+    first = True
+    while True:
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            applied = rollup(db)
+            # Рейтинг меняется только вместе с total_points
+            if applied or first:
+                refresh_leaderboard(db)
+            logger.info("applied ledger entries",
+                        extra={"applied": applied, "seconds": round(time.perf_counter() - started, 3)})
+        finally:
+            db.close()
+        first = False
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -0,0 +1,105 @@
+"""
+Потоковая выдача ленты в NDJSON (GET /posts/?format=ndjson).
+
+Строки читаются серверным курсором порциями по POSTS_STREAM_CHUNK (yield_per)
+и сразу кодируются orjson без ORM-объектов и PostOut, поэтому память не
+растёт с limit. fields= ограничивает и столбцы в SELECT, и ключи в выдаче:
+без description запрос не читает TOAST с текстами.
+
+Каждая строка ответа — пост; если есть следующая страница, последней строкой
+идёт {"next_cursor": "..."} (заголовок нельзя выставить до конца потока).
+"""
+import os
+from operator import attrgetter
+from typing import AsyncIterator, Callable, List, Optional
+
+import orjson
+from fastapi import HTTPException
+
+from app import models, schemas
+from app.crud import _list_posts_stmt
+from app.database import AsyncSessionLocal
+from app.feed import _comment_previews
+from app.pagination import encode_cursor
+
+POSTS_STREAM_CHUNK = int(os.getenv("POSTS_STREAM_CHUNK", "500"))
+
+# Поля PostOut, которые хранятся в posts; comments_preview собирается отдельным запросом
+COLUMN_FIELDS = tuple(f for f in schemas.PostOut.model_fields if f != "comments_preview")
+STREAM_FIELDS = COLUMN_FIELDS + ("comments_preview",)
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """
+    Список полей из ?fields=a,b,c в порядке PostOut; пусто — все поля.
+    """
+    if not fields:
+        return list(STREAM_FIELDS)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(STREAM_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [f for f in STREAM_FIELDS if f in requested]
+
+
+def _row_encoder(fields: List[str]) -> Callable:
+    """
+    Кодировщик строки результата, собранный один раз на запрос: геттеры полей
+    заранее привязаны, на строку — один dict и один вызов orjson.
+    """
+    getters = [(f, attrgetter(f)) for f in fields if f in COLUMN_FIELDS]
+
+    def encode(row, preview=None) -> bytes:
+        item = {name: get(row) for name, get in getters}
+        if preview is not None:
+            item["comments_preview"] = preview
+        return orjson.dumps(item, option=orjson.OPT_APPEND_NEWLINE)
+
+    return encode
+
+
+def _preview_dicts(comments: List[models.Comment]) -> List[dict]:
+    return [
+        {"id": c.id, "post_id": c.post_id, "parent_id": c.parent_id, "author_id": c.author_id,
+         "author_name": c.author_name, "text": c.text, "created_at": c.created_at, "depth": 0}
+        for c in comments
+    ]
+
+
+def stream_statement(category: Optional[str] = None, skip: int = 0, limit: int = 50,
+                     user_age: Optional[int] = None, cursor: Optional[str] = None,
+                     fields: Optional[List[str]] = None):
+    """
+    SELECT только нужных столбцов для stream_posts. Строится в обработчике до
+    StreamingResponse: неверный cursor должен дать 400, а не пустой поток с 200.
+    """
+    fields = fields or list(STREAM_FIELDS)
+    # created_at и id нужны для курсора, даже если клиент их не запросил
+    columns = {f for f in fields if f in COLUMN_FIELDS} | {"id", "created_at"}
+    return _list_posts_stmt(category, skip, limit, user_age, cursor).with_only_columns(
+        *[getattr(models.Post, f) for f in COLUMN_FIELDS if f in columns]
+    )
+
+
+async def stream_posts(stmt, limit: int, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    """
+    NDJSON-строки результата stream_statement с теми же fields.
+    """
+    fields = fields or list(STREAM_FIELDS)
+    encode = _row_encoder(fields)
+    with_preview = "comments_preview" in fields
+
+    sent = 0
+    last = None
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt.execution_options(yield_per=POSTS_STREAM_CHUNK))
+        async for rows in result.partitions():
+            previews = await _comment_previews(db, [r.id for r in rows]) if with_preview else {}
+            yield b"".join(
+                encode(r, _preview_dicts(previews.get(r.id, [])) if with_preview else None) for r in rows
+            )
+            sent += len(rows)
+            last = rows[-1]
+    if last is not None and sent >= limit:
+        yield orjson.dumps({"next_cursor": encode_cursor(last.created_at, last.id)},
+                           option=orjson.OPT_APPEND_NEWLINE)
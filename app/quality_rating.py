@@ -1,49 +1,89 @@
+import hashlib
 import os
 import re
+
 from huggingface_hub import InferenceClient
 
+from app.inference_client import INFERENCE_DEADLINE_SECONDS, CircuitOpenError, ResilientInferenceClient
+
 MODEL = "google/gemma-3-12b-it"
 HF_TOKEN = os.getenv("HF_TOKEN", "")
+# URL совместимого с OpenAI сервера вместо Inference API (например, benchmarks/fake_inference_server.py)
+QUALITY_ENDPOINT_URL = os.getenv("QUALITY_ENDPOINT_URL", "")
+
+
+def get_client(timeout: float = INFERENCE_DEADLINE_SECONDS):
+    """
+    Клиент Hugging Face с HTTP-таймаутом попытки: ResilientInferenceClient
+    передаёт время до дедлайна вызова, чтобы брошенные попытки не работали
+    дольше него. Создание клиента дешёвое — HTTP-сессия у huggingface_hub общая.
+    Модуль импортируется при старте, а не в первом вызове: иначе импорт (~0.25 с,
+    под блокировкой импорта для всех потоков) съедает дедлайн первых оценок.
+    """
+    if QUALITY_ENDPOINT_URL:
+        return InferenceClient(base_url=QUALITY_ENDPOINT_URL, token=HF_TOKEN, timeout=timeout)
+    return InferenceClient(model=MODEL, token=HF_TOKEN, timeout=timeout)
+
+
+def _chat_completion(messages: list, timeout: float = INFERENCE_DEADLINE_SECONDS):
+    return get_client(timeout).chat_completion(
+        model=MODEL,
+        messages=messages,
+        temperature=0,
+        max_tokens=128
+    )
+
+
+# Параллелизм, дедлайн, хеджированные повторы и предохранитель (app/inference_client.py)
+inference_client = ResilientInferenceClient(_chat_completion)
+
+SYSTEM_PROMPT = (
+    "Ты эксперт по анализу и оценке текстов кандидатов в сфере IT-рекрутинга. "
+    "Твоя задача — оценить ценность текста кандидата по шкале от 0 до 100.\n\n"
+    "Критерии оценки:\n"
+    "— 100 — текст высокого качества: кандидат упоминает конкретные проекты, победы в олимпиадах, участие в хакатонах, опыт в разработке или аналитике, владение технологиями.\n"
+    "— 50 — текст среднего качества: есть интерес к IT, базовые знания или намерение развиваться, но без конкретных достижений.\n"
+    "— 0 — текст низкого качества: общие или пустые фразы, отсутствие упоминания опыта, навыков или проектов.\n\n"
+    "Дополнительно:\n"
+    "— Игнорируй орфографию и стиль — оценивай только содержательность.\n"
+    "— Не объясняй ответ, не добавляй текст — выведи только одно число в диапазоне от 0 до 100."
+)
+
+# Версия промпта входит в ключ кэша оценок: любое изменение текста промпта
+# автоматически делает старые записи недействительными.
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+
+class QualityScoringError(Exception):
+    """
+    Оценка качества не получена: ошибка API или ответ без числа.
+    """
 
-client = InferenceClient(model=MODEL, token=HF_TOKEN)
 
 def rate_text_quality(text: str) -> float:
     """
     Использует Gemma 3 (через chat_completion API Hugging Face)
     для оценки качества текста по шкале 0–100.
+    При ошибке бросает QualityScoringError — повтор делает очередь оценки;
+    при открытом предохранителе — CircuitOpenError без обращения к API.
     """
-    system_prompt = (
-        "Ты эксперт по анализу и оценке текстов кандидатов в сфере IT-рекрутинга. "
-        "Твоя задача — оценить ценность текста кандидата по шкале от 0 до 100.\n\n"
-        "Критерии оценки:\n"
-        "— 100 — текст высокого качества: кандидат упоминает конкретные проекты, победы в олимпиадах, участие в хакатонах, опыт в разработке или аналитике, владение технологиями.\n"
-        "— 50 — текст среднего качества: есть интерес к IT, базовые знания или намерение развиваться, но без конкретных достижений.\n"
-        "— 0 — текст низкого качества: общие или пустые фразы, отсутствие упоминания опыта, навыков или проектов.\n\n"
-        "Дополнительно:\n"
-        "— Игнорируй орфографию и стиль — оценивай только содержательность.\n"
-        "— Не объясняй ответ, не добавляй текст — выведи только одно число в диапазоне от 0 до 100."
-    )
-
     user_prompt = f'Текст кандидата:\n"{text}"'
 
     try:
-        response = client.chat_completion(
-            model=MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            temperature=0,
-            max_tokens=128
-        )
-
-        content = response.choices[0].message["content"]
-        match = re.search(r"\d+(\.\d+)?", content)
-        return float(match.group()) if match else 0.0
-
+        response = inference_client([
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt},
+        ])
+    except CircuitOpenError:
+        raise
     except Exception as e:
-        print(f"⚠️ Ошибка API оценки качества: {e}")
-        return 0.0
+        raise QualityScoringError(f"Ошибка API оценки качества: {e}") from e
+
+    content = response.choices[0].message.content
+    match = re.search(r"\d+(\.\d+)?", content)
+    if not match:
+        raise QualityScoringError(f"Не удалось разобрать оценку из ответа: {content!r}")
+    return float(match.group())
 
 
 def calculate_points(quality_score: float) -> float:
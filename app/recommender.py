@@ -0,0 +1,205 @@
+"""
+Рекомендательная модель персональной ленты.
+
+Кандидаты для каждого пользователя считаются офлайн и хранятся в таблице
+feed_candidates; запрос GET /feed/{user_id} делает одну выборку кандидатов
+и лёгкое переранжирование по свежести и возрасту.
+
+Базовая оценка поста для пользователя:
+    W_CF * сумма весов соседей лайкнутых постов из индекса похожих постов
+           (app/similarity_index.py), нормированная на максимум
+  + W_CATEGORY * совпадение с категориями лайкнутых постов
+  + W_QUALITY * quality_score / 100
+
+Пересчёт:
+    python -m app.recommender            # только пользователи с новыми лайками
+    python -m app.recommender --full     # все пользователи
+    python -m app.recommender --loop 300 # инкрементально каждые 300 секунд
+"""
+import argparse
+import heapq
+import logging
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select, union
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.observability import configure_logging
+from app.similarity_index import SimilarityIndex, similarity_index
+
+W_CF = float(os.getenv("RECSYS_W_CF", "0.6"))
+W_CATEGORY = float(os.getenv("RECSYS_W_CATEGORY", "0.25"))
+W_QUALITY = float(os.getenv("RECSYS_W_QUALITY", "0.15"))
+W_RECENCY = float(os.getenv("RECSYS_W_RECENCY", "0.3"))
+RECENCY_HALF_LIFE_HOURS = float(os.getenv("RECSYS_RECENCY_HALF_LIFE_HOURS", "72"))
+CANDIDATES_PER_USER = int(os.getenv("RECSYS_CANDIDATES_PER_USER", "300"))
+USER_CHUNK_SIZE = int(os.getenv("RECSYS_USER_CHUNK_SIZE", "256"))
+
+logger = logging.getLogger(__name__)
+
+
+def score_users(db: Session, user_ids: Sequence[int], index: SimilarityIndex = similarity_index,
+                top_n: int = CANDIDATES_PER_USER) -> Dict[int, tuple]:
+    """
+    Кандидаты (post_ids, scores) для пользователей. Соседи лайкнутых постов
+    берутся из индекса похожих постов, поэтому матрица user×post не строится.
+    """
+    liked_by_user = defaultdict(set)
+    for user_id, post_id in db.execute(
+        select(models.Like.user_id, models.Like.post_id).where(models.Like.user_id.in_(user_ids))
+    ):
+        liked_by_user[user_id].add(post_id)
+
+    all_liked = {p for posts in liked_by_user.values() for p in posts}
+    neighbors = index.neighbors(sorted(all_liked))
+
+    cf_by_user = {}
+    for user_id, liked in liked_by_user.items():
+        cf = defaultdict(float)
+        for post_id in liked:
+            for other, weight in neighbors.get(post_id, []):
+                if other not in liked:
+                    cf[other] += weight
+        cf_by_user[user_id] = cf
+
+    candidate_ids = {p for cf in cf_by_user.values() for p in cf}
+    meta = {
+        r.id: r for r in db.execute(
+            select(models.Post.id, models.Post.categories, models.Post.quality_score)
+            .where(models.Post.id.in_(candidate_ids | all_liked))
+        )
+    }
+
+    result = {}
+    for user_id, cf in cf_by_user.items():
+        if not cf:
+            continue
+        # Профиль категорий пользователя по лайкнутым постам
+        profile = Counter(c for p in liked_by_user[user_id] if p in meta for c in meta[p].categories or [])
+        profile_norm = math.sqrt(sum(v * v for v in profile.values())) or 1.0
+        cf_max = max(cf.values()) or 1.0
+
+        scored = []
+        for post_id, cf_score in cf.items():
+            post = meta.get(post_id)
+            if post is None:
+                continue
+            cats = post.categories or []
+            category = sum(profile[c] for c in cats) / (profile_norm * math.sqrt(len(cats))) if cats else 0.0
+            quality = (post.quality_score or 0.0) / 100.0
+            scored.append((W_CF * cf_score / cf_max + W_CATEGORY * category + W_QUALITY * quality, post_id))
+        top = heapq.nlargest(top_n, scored)
+        result[user_id] = ([p for _, p in top], [s for s, _ in top])
+    return result
+
+
+def _dirty_user_ids(db: Session) -> List[int]:
+    """
+    Пользователи, у которых лайки менялись после последнего пересчёта
+    (или у которых ещё нет кандидатов).
+    """
+    last_refresh = func.coalesce(models.FeedCandidates.updated_at, datetime.min)
+    liked = (
+        select(models.Like.user_id)
+        .outerjoin(models.FeedCandidates, models.FeedCandidates.user_id == models.Like.user_id)
+        .where(models.Like.created_at > last_refresh)
+    )
+    unliked = (
+        select(models.LikeEvent.user_id)
+        .outerjoin(models.FeedCandidates, models.FeedCandidates.user_id == models.LikeEvent.user_id)
+        .where(models.LikeEvent.created_at > last_refresh)
+    )
+    return [uid for (uid,) in db.execute(union(liked, unliked))]
+
+
+def refresh_candidates(db: Session, full: bool = False, index: SimilarityIndex = similarity_index) -> int:
+    """
+    Пересчитывает кандидатов: всех пользователей (full) или только изменившихся.
+    Возвращает число обновлённых пользователей.
+    """
+    if not index.reload():
+        raise RuntimeError("Similarity index is not built yet: run python -m app.similarity_index --rebuild")
+    # Время пересчёта — по часам БД до чтения лайков: лайк, закоммиченный во время
+    # пересчёта, окажется новее updated_at и попадёт в следующий
+    now = db.execute(select(func.timezone("UTC", func.now()))).scalar()
+    if full:
+        user_ids = [uid for (uid,) in db.execute(union(
+            select(models.Like.user_id), select(models.FeedCandidates.user_id)))]
+    else:
+        user_ids = _dirty_user_ids(db)
+
+    updated = 0
+    for start in range(0, len(user_ids), USER_CHUNK_SIZE):
+        chunk = user_ids[start:start + USER_CHUNK_SIZE]
+        candidates = score_users(db, chunk, index)
+        # Пользователь без кандидатов (снял все лайки или у его постов нет соседей)
+        # получает пустую строку: иначе /feed отдаёт старых кандидатов, а его события
+        # like_events остаются «непересчитанными» и не удаляются
+        rows = []
+        for uid in chunk:
+            post_ids, scores = candidates.get(uid, ([], []))
+            rows.append({"user_id": uid, "post_ids": post_ids, "scores": scores, "updated_at": now})
+        stmt = insert(models.FeedCandidates).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"post_ids": stmt.excluded.post_ids, "scores": stmt.excluded.scores,
+                  "updated_at": stmt.excluded.updated_at},
+        )
+        db.execute(stmt)
+        db.commit()
+        updated += len(chunk)
+    return updated
+
+
+def rerank(candidates: Optional[models.FeedCandidates], posts: Dict[int, models.Post],
+           user_age: Optional[int], now: Optional[datetime] = None) -> List[models.Post]:
+    """
+    Лёгкое переранжирование кандидатов при запросе: бонус за свежесть и
+    отсечение постов, недоступных по возрасту.
+    """
+    if candidates is None:
+        return []
+    now = now or datetime.utcnow()
+    ranked = []
+    for post_id, base in zip(candidates.post_ids, candidates.scores):
+        post = posts.get(post_id)
+        if post is None:
+            continue
+        if user_age is not None and post.age_restriction > user_age:
+            continue
+        age_hours = max((now - post.created_at).total_seconds() / 3600.0, 0.0)
+        recency = math.pow(0.5, age_hours / RECENCY_HALF_LIFE_HOURS)
+        ranked.append((base + W_RECENCY * recency, post))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return [post for _, post in ranked]
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Refresh personalized feed candidates")
+    parser.add_argument("--full", action="store_true", help="пересчитать всех пользователей")
+    parser.add_argument("--loop", type=float, default=0,
+                        help="повторять инкрементальный пересчёт каждые N секунд")
+    args = parser.parse_args()
+
+    while True:
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            updated = refresh_candidates(db, full=args.full)
+            logger.info("refreshed feed candidates",
+                        extra={"users": updated, "seconds": round(time.perf_counter() - started, 3)})
+        finally:
+            db.close()
+        if not args.loop:
+            break
+        args.full = False
+        time.sleep(args.loop)
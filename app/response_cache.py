@@ -0,0 +1,265 @@
+"""
+Кэш сериализованных ответов GET /posts/{id} и GET /posts.
+
+Хранятся два вида записей:
+    post:{id}            — готовый JSON PostOut;
+    page:{gen}:{params}  — id постов страницы и курсор следующей страницы.
+Страница собирается из тел постов, поэтому лайк или комментарий сбрасывает
+только запись своего поста, а не все страницы ленты. Создание, изменение и
+удаление поста увеличивают поколение страниц gen — старые страницы больше не
+читаются и вытесняются по TTL/LRU.
+
+Бэкенды: LRU в памяти процесса (по умолчанию) или Redis, общий для всех
+воркеров uvicorn и фоновых процессов (RESPONSE_CACHE_BACKEND=redis, REDIS_URL).
+С кэшем в памяти изменения из других процессов (воркер оценки качества)
+становятся видны не позже чем через RESPONSE_CACHE_TTL_SECONDS.
+
+ETag ответа — хэш тела; при совпадении с If-None-Match возвращается 304.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+KEY_PREFIX = "rc:"
+PAGE_GENERATION_KEY = KEY_PREFIX + "page-gen"
+
+
+class MemoryBackend:
+    """
+    LRU с TTL в памяти процесса; операции синхронные и потокобезопасные.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._lru.get(key)
+                if entry is None or entry[1] < now:
+                    if entry is not None:
+                        del self._lru[key]
+                    values.append(None)
+                    continue
+                self._lru.move_to_end(key)
+                values.append(entry[0])
+        return values
+
+    def set_many(self, items: Dict[str, bytes], ttl: int):
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            for key, value in items.items():
+                self._lru[key] = (value, expires_at)
+                self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def delete(self, keys: Sequence[str]):
+        with self._lock:
+            for key in keys:
+                self._lru.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+
+class RedisBackend:
+    """
+    Redis, общий для процессов. Клиенты создаются лениво: async — для API,
+    sync — для скриптов и воркеров.
+    """
+
+    def __init__(self, url: str = REDIS_URL):
+        self.url = url
+        self._async_client = None
+        self._sync_client = None
+
+    @property
+    def aio(self):
+        if self._async_client is None:
+            import redis.asyncio
+            self._async_client = redis.asyncio.Redis.from_url(self.url)
+        return self._async_client
+
+    @property
+    def sync(self):
+        if self._sync_client is None:
+            import redis
+            self._sync_client = redis.Redis.from_url(self.url)
+        return self._sync_client
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Слабое сравнение: W/"x" совпадает с "x"
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def json_response(request: Request, body: bytes, headers: Optional[dict] = None) -> Response:
+    """
+    Ответ с готовым JSON-телом, ETag и 304 при совпадении If-None-Match.
+    """
+    etag = etag_for(body)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    def __init__(self, backend: str = RESPONSE_CACHE_BACKEND, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS):
+        if backend not in ("memory", "redis"):
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND={backend!r}, expected memory or redis")
+        self.backend_name = backend
+        self.backend = MemoryBackend() if backend == "memory" else RedisBackend()
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _post_key(post_id: int) -> str:
+        return f"{KEY_PREFIX}post:{post_id}"
+
+    # --- низкоуровневые операции над бэкендом ---
+
+    async def _get_many(self, keys: Sequence[str]) -> List[Optional[bytes]]:
+        if not keys:
+            return []
+        if isinstance(self.backend, MemoryBackend):
+            return self.backend.get_many(keys)
+        return await self.backend.aio.mget(keys)
+
+    async def _set_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        if isinstance(self.backend, MemoryBackend):
+            self.backend.set_many(items, self.ttl_seconds)
+            return
+        async with self.backend.aio.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(key, value, ex=self.ttl_seconds)
+            await pipe.execute()
+
+    async def _page_generation(self) -> int:
+        if isinstance(self.backend, MemoryBackend):
+            return self.backend.get_counter(PAGE_GENERATION_KEY)
+        return int(await self.backend.aio.get(PAGE_GENERATION_KEY) or 0)
+
+    # --- посты ---
+
+    async def get_posts(self, post_ids: Sequence[int]) -> Dict[int, bytes]:
+        values = await self._get_many([self._post_key(i) for i in post_ids])
+        found = {i: v for i, v in zip(post_ids, values) if v is not None}
+        self.hits += len(found)
+        self.misses += len(post_ids) - len(found)
+        return found
+
+    async def get_post(self, post_id: int) -> Optional[bytes]:
+        return (await self.get_posts([post_id])).get(post_id)
+
+    async def put_posts(self, bodies: Dict[int, bytes]):
+        await self._set_many({self._post_key(i): body for i, body in bodies.items()})
+
+    # --- страницы ленты ---
+
+    async def page_key(self, params: dict) -> str:
+        """
+        Ключ страницы в текущем поколении. Берётся до запроса к БД: если пост
+        изменится во время запроса, страница ляжет под устаревшим поколением.
+        """
+        generation = await self._page_generation()
+        return f"{KEY_PREFIX}page:{generation}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    async def get_page(self, key: str) -> Optional[Tuple[List[int], Optional[str]]]:
+        (value,) = await self._get_many([key])
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        post_ids, next_page = json.loads(value)
+        return post_ids, next_page
+
+    async def put_page(self, key: str, post_ids: List[int], next_page: Optional[str]):
+        await self._set_many({key: json.dumps([post_ids, next_page]).encode()})
+
+    # --- инвалидация ---
+
+    async def invalidate(self, post_ids: Iterable[int] = (), pages: bool = False):
+        """
+        Сбрасывает записи постов и, если pages, все страницы ленты.
+        """
+        if isinstance(self.backend, MemoryBackend):
+            self.invalidate_sync(post_ids, pages)
+            return
+        keys = [self._post_key(i) for i in post_ids]
+        self.invalidations += 1
+        async with self.backend.aio.pipeline(transaction=False) as pipe:
+            if keys:
+                pipe.delete(*keys)
+            if pages:
+                pipe.incr(PAGE_GENERATION_KEY)
+            await pipe.execute()
+
+    def invalidate_sync(self, post_ids: Iterable[int] = (), pages: bool = False):
+        """
+        То же для синхронного кода (скрипты, воркер оценки качества).
+        """
+        keys = [self._post_key(i) for i in post_ids]
+        self.invalidations += 1
+        if isinstance(self.backend, MemoryBackend):
+            self.backend.delete(keys)
+            if pages:
+                self.backend.incr(PAGE_GENERATION_KEY)
+            return
+        pipe = self.backend.sync.pipeline(transaction=False)
+        if keys:
+            pipe.delete(*keys)
+        if pages:
+            pipe.incr(PAGE_GENERATION_KEY)
+        pipe.execute()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        stats = {
+            "backend": self.backend_name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+        if isinstance(self.backend, MemoryBackend):
+            stats["entries"] = len(self.backend._lru)
+        return stats
+
+
+response_cache = ResponseCache()
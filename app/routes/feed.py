@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from app import schemas, models, crud_async as crud
+from app.database import get_async_db
+from app.feed import load_post_outs
+from app.recommender import rerank
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+@router.get("/{user_id}", response_model=List[schemas.PostOut])
+async def personalized_feed(user_id: int, skip: int = 0, limit: int = Query(50, le=200),
+                            db: AsyncSession = Depends(get_async_db)):
+    """
+    Персональная лента: предрассчитанные кандидаты (app/recommender.py),
+    переранжированные по свежести и отфильтрованные по возрасту.
+    Пользователи без лайков получают обычную ленту для своего возраста.
+    """
+    row = (await db.execute(
+        select(models.User.age, models.FeedCandidates)
+        .outerjoin(models.FeedCandidates, models.FeedCandidates.user_id == models.User.id)
+        .where(models.User.id == user_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    user_age, candidates = row
+
+    if candidates is None:
+        posts = await crud.list_posts(db, skip=skip, limit=limit, user_age=user_age)
+        return await load_post_outs(db, posts)
+
+    # Для переранжирования хватает лёгких колонок; полные посты грузим только для страницы
+    meta = (await db.execute(
+        select(models.Post.id, models.Post.created_at, models.Post.age_restriction)
+        .where(models.Post.id.in_(candidates.post_ids))
+    )).all()
+    ranked = rerank(candidates, {m.id: m for m in meta}, user_age)[skip:skip + limit]
+    posts = await crud.get_posts_by_ids(db, [m.id for m in ranked])
+    return await load_post_outs(db, posts)
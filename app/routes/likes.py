@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from app import schemas, crud_async as crud
+from app.database import get_async_db
+
+router = APIRouter(prefix="/likes", tags=["likes"])
+
+@router.post("/batch", response_model=List[schemas.LikeResult])
+async def like_batch(batch: schemas.LikeBatchIn, db: AsyncSession = Depends(get_async_db)):
+    """
+    Применяет очередь лайков клиента одной транзакцией. action: toggle (по умолчанию),
+    like или unlike — для офлайн-очереди надёжнее передавать желаемое состояние.
+    """
+    return await crud.toggle_likes_batch(db, batch.items)
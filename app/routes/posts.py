@@ -1,100 +1,191 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app import schemas, crud, models
-from app.database import get_db
+from app import schemas, crud_async as crud
+from app.bulk_import import NDJSON_MEDIA_TYPE, import_posts
+from app.crud import COMMENTS_DEPTH_LIMIT, COMMENTS_MAX_DEPTH, _age_bracket
+from app.database import AsyncSessionLocal, get_async_db
+from app.feed import json_array, load_post_out, store_post_bodies
+from app.near_duplicates import DEDUP_POLICY, find_duplicate, post_text, signature
+from app.observability import stage
+from app.pagination import NEXT_CURSOR_HEADER, next_cursor
+from app.post_stream import parse_fields, stream_posts, stream_statement
+from app.response_cache import json_response, response_cache
+from app.search import search_posts
+from app.toxic_analis import toxicity_batcher
 
 router = APIRouter(prefix="/posts", tags=["posts"])
 
 @router.post("/", response_model=schemas.PostOut)
-def create_post(post_in: schemas.PostCreate, db: Session = Depends(get_db)):
-    post = crud.create_post(db, post_in)
-    likes_count = db.query(models.Like).filter(models.Like.post_id == post.id).count()
-    return schemas.PostOut(
-        id=post.id,
-        title=post.title,
-        description=post.description,
-        categories=post.categories,
-        age_segment=post.age_segment,
-        community_id=post.community_id,
-        created_at=post.created_at,
-        author_id=post.author_id,
-        author_name=post.author_name,
-        likes_count=likes_count,
-        comments=[]
-    )
+async def create_post(post_in: schemas.PostCreate, db: AsyncSession = Depends(get_async_db)):
+    # Почти-дубликат уже прошёл модерацию в оригинале (app/near_duplicates.py)
+    with stage("create_post", "near_duplicate"):
+        sig = signature(post_text(post_in.title, post_in.description))
+        duplicate = await find_duplicate(db, sig)
+    if duplicate is not None and DEDUP_POLICY == "reject":
+        raise HTTPException(status_code=409, detail=f"Near-duplicate of post {duplicate.post_id}")
+    if duplicate is None:
+        with stage("create_post", "toxicity"):
+            toxic = await toxicity_batcher.is_toxic(post_in.description)
+        if toxic:
+            raise HTTPException(status_code=400, detail="Post contains toxic content")
+    post = await crud.create_post(db, post_in, moderated=True, duplicate=duplicate, sig=sig)
+    return await load_post_out(db, post)
+
+@router.post("/bulk", openapi_extra={"requestBody": {"required": True, "content": {
+    NDJSON_MEDIA_TYPE: {"schema": schemas.PostCreate.model_json_schema()},
+    "application/json": {"schema": {"type": "array", "items": schemas.PostCreate.model_json_schema()}},
+}}})
+async def bulk_create_posts(request: Request):
+    """
+    Массовый импорт: NDJSON или JSON-массив PostCreate. Ответ — NDJSON с результатом
+    по каждому элементу в порядке поступления и итоговой строкой {"summary": ...}.
+    """
+    async def results():
+        # Сессия живёт столько же, сколько поток ответа, поэтому не через Depends
+        async with AsyncSessionLocal() as db:
+            async for line in import_posts(db, request.stream(), request.headers.get("content-type", "")):
+                yield line
+
+    return StreamingResponse(results(), media_type=NDJSON_MEDIA_TYPE)
 
 @router.get("/", response_model=List[schemas.PostOut])
-def list_posts(category: Optional[str] = Query(None), skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
-    posts = crud.list_posts(db, category, skip, limit)
-    out = []
-    for p in posts:
-        likes_count = db.query(models.Like).filter(models.Like.post_id == p.id).count()
-        comments = db.query(models.Comment).filter(models.Comment.post_id == p.id).all()
-        out.append(schemas.PostOut(
-            id=p.id, title=p.title, description=p.description, categories=p.categories,
-            age_segment=p.age_segment, community_id=p.community_id, created_at=p.created_at,
-            author_id=p.author_id, author_name=p.author_name, likes_count=likes_count,
-            comments=[schemas.CommentOut.from_orm(c) for c in comments]
-        ))
-    return out
+async def list_posts(request: Request, category: Optional[str] = Query(None),
+                     skip: int = 0, limit: int = 50, cursor: Optional[str] = Query(None),
+                     user_age: Optional[int] = Query(None, ge=0, description="Возраст читателя"),
+                     format: str = Query("json", pattern="^(json|ndjson)$"),
+                     fields: Optional[str] = Query(None, description="Поля через запятую (только format=ndjson)"),
+                     db: AsyncSession = Depends(get_async_db)):
+    """
+    Лента постов. Курсор следующей страницы возвращается в заголовке X-Next-Cursor;
+    skip (offset-режим) оставлен для совместимости. Страница собирается из
+    response_cache, поддерживается If-None-Match.
+
+    user_age — лента возрастной группы читателя (посты с age_restriction <= user_age),
+    читается из материализованной ленты группы (age_feed_entries).
+
+    format=ndjson (или Accept: application/x-ndjson) — потоковая выдача для больших
+    limit с проекцией fields=, курсор — последней строкой (см. app/post_stream.py).
+    """
+    if format == "ndjson" or NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        # Курсор и поля проверяются до начала ответа: после него статус уже не изменить
+        stream_fields = parse_fields(fields)
+        stmt = stream_statement(category, skip, limit, user_age, cursor, stream_fields)
+        return StreamingResponse(stream_posts(stmt, limit, stream_fields), media_type=NDJSON_MEDIA_TYPE)
+    if fields:
+        raise HTTPException(status_code=400, detail="fields= requires format=ndjson")
+
+    key = await response_cache.page_key({
+        "category": category, "skip": None if cursor else skip, "limit": limit,
+        "cursor": cursor, "age_bracket": _age_bracket(user_age) if user_age is not None else None,
+    })
+    page = await response_cache.get_page(key)
+    loaded = None
+    if page is None:
+        loaded = await crud.list_posts(db, category, skip, limit, user_age, cursor)
+        post_ids, next_page = [p.id for p in loaded], next_cursor(loaded, limit)
+        await response_cache.put_page(key, post_ids, next_page)
+    else:
+        post_ids, next_page = page
+
+    bodies = await response_cache.get_posts(post_ids)
+    missing = [i for i in post_ids if i not in bodies]
+    if missing:
+        if loaded is None:
+            loaded = await crud.get_posts_by_ids(db, missing)
+        bodies.update(await store_post_bodies(db, [p for p in loaded if p.id not in bodies]))
+
+    headers = {NEXT_CURSOR_HEADER: next_page} if next_page else {}
+    # Удалённые после кэширования страницы посты просто пропускаются
+    return json_response(request, json_array(bodies[i] for i in post_ids if i in bodies), headers)
+
+@router.get("/search", response_model=List[schemas.PostOut])
+async def search(request: Request, q: str = Query(..., min_length=1, max_length=200),
+                 limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = Query(None),
+                 user_age: Optional[int] = Query(None, ge=0, description="Возраст читателя"),
+                 category: Optional[str] = Query(None),
+                 db: AsyncSession = Depends(get_async_db)):
+    """
+    Полнотекстовый поиск по заголовку и описанию (см. app/search.py): релевантность
+    вместе с quality_score, курсор следующей страницы — в заголовке X-Next-Cursor.
+    """
+    posts, next_page = await search_posts(db, q, limit, user_age, category, cursor)
+    bodies = await response_cache.get_posts([p.id for p in posts])
+    missing = [p for p in posts if p.id not in bodies]
+    if missing:
+        bodies.update(await store_post_bodies(db, missing))
+    headers = {NEXT_CURSOR_HEADER: next_page} if next_page else {}
+    return json_response(request, json_array(bodies[p.id] for p in posts), headers)
 
 @router.get("/{post_id}", response_model=schemas.PostOut)
-def get_post(post_id: int, db: Session = Depends(get_db)):
-    p = crud.get_post(db, post_id)
-    if not p:
-        raise HTTPException(status_code=404, detail="Post not found")
-    likes_count = db.query(models.Like).filter(models.Like.post_id == p.id).count()
-    comments = db.query(models.Comment).filter(models.Comment.post_id == p.id).all()
-    return schemas.PostOut(
-        id=p.id, title=p.title, description=p.description, categories=p.categories,
-        age_segment=p.age_segment, community_id=p.community_id, created_at=p.created_at,
-        author_id=p.author_id, author_name=p.author_name, likes_count=likes_count,
-        comments=[schemas.CommentOut.from_orm(c) for c in comments]
-    )
+async def get_post(post_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    body = await response_cache.get_post(post_id)
+    if body is None:
+        p = await crud.get_post(db, post_id)
+        if not p:
+            raise HTTPException(status_code=404, detail="Post not found")
+        body = (await store_post_bodies(db, [p]))[p.id]
+    return json_response(request, body)
 
 @router.put("/{post_id}", response_model=schemas.PostOut)
-def update_post(post_id: int, upd: schemas.PostUpdate, db: Session = Depends(get_db)):
-    p = crud.get_post(db, post_id)
+async def update_post(post_id: int, upd: schemas.PostUpdate, db: AsyncSession = Depends(get_async_db)):
+    p = await crud.get_post(db, post_id)
     if not p:
         raise HTTPException(status_code=404, detail="Post not found")
-    p = crud.update_post(db, p, upd)
-    likes_count = db.query(models.Like).filter(models.Like.post_id == p.id).count()
-    comments = db.query(models.Comment).filter(models.Comment.post_id == p.id).all()
-    return schemas.PostOut(
-        id=p.id, title=p.title, description=p.description, categories=p.categories,
-        age_segment=p.age_segment, community_id=p.community_id, created_at=p.created_at,
-        author_id=p.author_id, author_name=p.author_name, likes_count=likes_count,
-        comments=[schemas.CommentOut.from_orm(c) for c in comments]
-    )
+    p = await crud.update_post(db, p, upd)
+    return await load_post_out(db, p)
 
 @router.delete("/{post_id}")
-def delete_post(post_id: int, db: Session = Depends(get_db)):
-    p = crud.get_post(db, post_id)
+async def delete_post(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    p = await crud.get_post(db, post_id)
     if not p:
         raise HTTPException(status_code=404, detail="Post not found")
-    crud.delete_post(db, p)
+    await crud.delete_post(db, p)
     return {"status": "deleted"}
 
+@router.post("/{post_id}/rescore", response_model=schemas.PostOut)
+async def rescore_post(post_id: int, db: AsyncSession = Depends(get_async_db)):
+    p = await crud.get_post(db, post_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="Post not found")
+    await crud.enqueue_scoring(db, p)
+    return await load_post_out(db, p)
+
 @router.post("/{post_id}/like")
-def like_toggle(
+async def like_toggle(
     post_id: int,
     phone: str,
     firstname: Optional[str] = None,
     surname: Optional[str] = None,
     lastname: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    p = crud.get_post(db, post_id)
-    if not p:
-        raise HTTPException(status_code=404, detail="Post not found")
-    res = crud.toggle_like(db, p, phone, firstname, surname, lastname)
+    res = await crud.toggle_like(db, post_id, phone, firstname, surname, lastname)
     return res
 
+@router.get("/{post_id}/comments", response_model=List[schemas.CommentOut])
+async def list_comments(post_id: int, response: Response, parent_id: Optional[int] = Query(None),
+                        limit: int = Query(20, ge=1, le=100),
+                        depth: int = Query(COMMENTS_MAX_DEPTH, ge=0, le=COMMENTS_DEPTH_LIMIT),
+                        cursor: Optional[str] = Query(None), db: AsyncSession = Depends(get_async_db)):
+    """
+    Ветка комментариев: limit комментариев уровня parent_id (корневых по умолчанию)
+    в порядке создания и их ответы до глубины depth, плоским списком в порядке
+    обхода дерева (поле depth). Курсор следующей страницы — в заголовке X-Next-Cursor;
+    более глубокие ответы подгружаются запросом с parent_id.
+    """
+    if not await crud.get_post(db, post_id):
+        raise HTTPException(status_code=404, detail="Post not found")
+    comments, next_page = await crud.list_comments(db, post_id, parent_id, limit, depth, cursor)
+    if next_page:
+        response.headers[NEXT_CURSOR_HEADER] = next_page
+    return comments
+
 @router.post("/{post_id}/comments", response_model=schemas.CommentOut)
-def add_comment(post_id: int, comment_in: schemas.CommentCreate, db: Session = Depends(get_db)):
+async def add_comment(post_id: int, comment_in: schemas.CommentCreate, db: AsyncSession = Depends(get_async_db)):
     # ensure post_id matches
     if comment_in.post_id != post_id:
         raise HTTPException(status_code=400, detail="post_id mismatch")
-    c = crud.add_comment(db, comment_in)
+    c = await crud.add_comment(db, comment_in)
     return schemas.CommentOut.from_orm(c)
@@ -1,20 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.schemas import UserCreate, UserOut
-from app.database import get_db
-from app.crud import get_user_or_create
-from app import models
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from app.schemas import LeaderboardEntryOut, UserCreate, UserOut
+from app.database import get_async_db
+from app import crud_async as crud
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.post("/", response_model=UserOut)
-def create_user(u: UserCreate, db: Session = Depends(get_db)):
-    user = get_user_or_create(db, u.phone, u.firstname, u.surname, u.lastname)
+async def create_user(u: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user_or_create(db, u.phone, u.firstname, u.surname, u.lastname, u.age)
+    await db.commit()
     return user
 
+@router.get("/leaderboard", response_model=List[LeaderboardEntryOut])
+async def leaderboard(skip: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=200),
+                      db: AsyncSession = Depends(get_async_db)):
+    """
+    Рейтинг по поинтам из таблицы leaderboard; пересобирается app/points.py
+    после свёртки журнала начислений, поэтому отстаёт не больше чем на его период.
+    """
+    return await crud.get_leaderboard(db, skip, limit)
+
 @router.get("/{user_id}", response_model=UserOut)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user = await crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
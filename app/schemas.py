@@ -1,6 +1,7 @@
-from pydantic import BaseModel, field_validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional
 from datetime import datetime
+from app.models import AGE_RESTRICTIONS
 
 class UserCreate(BaseModel):
     phone: str
@@ -29,6 +30,13 @@ class UserOut(BaseModel):
     class Config:
         from_attributes = True  # Pydantic v2
 
+class LeaderboardEntryOut(BaseModel):
+    rank: int
+    user_id: int
+    name: Optional[str] = None
+    total_points: float
+    updated_at: datetime
+
 class CommentCreate(BaseModel):
     post_id: int
     parent_id: Optional[int] = None
@@ -47,12 +55,13 @@ class CommentOut(BaseModel):
     author_name: str
     text: str
     created_at: datetime
+    depth: int = 0  # уровень вложенности в ответе GET /posts/{id}/comments
     
     class Config:
         from_attributes = True  # Pydantic v2
 
 class PostCreate(BaseModel):
-    title: str
+    title: str = Field(..., max_length=255)  # posts.title VARCHAR(255)
     description: str
     categories: List[str]
     age_segment: Optional[int] = None
@@ -67,12 +76,12 @@ class PostCreate(BaseModel):
     @field_validator('age_restriction')
     @classmethod
     def validate_age_restriction(cls, v):
-        if v not in [0, 6, 12, 16, 18]:
+        if v not in AGE_RESTRICTIONS:
             raise ValueError('Age restriction must be one of: 0, 6, 12, 16, 18')
         return v
 
 class PostUpdate(BaseModel):
-    title: Optional[str] = None
+    title: Optional[str] = Field(None, max_length=255)
     description: Optional[str] = None
     categories: Optional[List[str]] = None
     age_segment: Optional[int] = None
@@ -82,7 +91,7 @@ class PostUpdate(BaseModel):
     @field_validator('age_restriction')
     @classmethod
     def validate_age_restriction(cls, v):
-        if v is not None and v not in [0, 6, 12, 16, 18]:
+        if v is not None and v not in AGE_RESTRICTIONS:
             raise ValueError('Age restriction must be one of: 0, 6, 12, 16, 18')
         return v
 
@@ -96,11 +105,28 @@ class PostOut(BaseModel):
     community_id: Optional[int] = None
     quality_score: Optional[float] = None
     points_awarded: Optional[float] = None
+    scoring_status: str = "done"  # pending, done, failed
     created_at: datetime
     author_id: Optional[int] = None
     author_name: Optional[str] = None
     likes_count: int = 0
-    comments: List[CommentOut] = []
+    comments_count: int = 0
+    # Последние корневые комментарии (COMMENTS_PREVIEW_SIZE); вся ветка — GET /posts/{id}/comments
+    comments_preview: List[CommentOut] = []
     
     class Config:
-        from_attributes = True  # Pydantic v2 (вместо orm_mode)
\ No newline at end of file
+        from_attributes = True  # Pydantic v2 (вместо orm_mode)
+
+class LikeBatchItem(BaseModel):
+    post_id: int
+    phone: str
+    action: Literal["toggle", "like", "unlike"] = "toggle"
+
+class LikeBatchIn(BaseModel):
+    items: List[LikeBatchItem] = Field(..., max_length=500)
+
+class LikeResult(BaseModel):
+    post_id: int
+    action: str  # added, removed, unchanged, error
+    likes_count: Optional[int] = None
+    error: Optional[str] = None
@@ -0,0 +1,160 @@
+"""
+Кэш оценок качества текста.
+
+Оценка Gemma считается с temperature=0, поэтому одинаковый текст всегда
+получает одинаковую оценку. Ключ кэша — sha256 нормализованного текста +
+имя модели + версия системного промпта, так что смена MODEL или промпта
+автоматически делает старые записи недействительными.
+
+Два уровня: LRU в памяти процесса и таблица quality_score_cache в Postgres.
+
+Очистка устаревших записей: python -m app.score_cache
+"""
+import hashlib
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.quality_rating import MODEL, PROMPT_VERSION, rate_text_quality
+
+SCORE_CACHE_MAX_ENTRIES = int(os.getenv("SCORE_CACHE_MAX_ENTRIES", "10000"))
+SCORE_CACHE_TTL_SECONDS = int(os.getenv("SCORE_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class QualityScoreCache:
+    def __init__(self, max_entries: int = SCORE_CACHE_MAX_ENTRIES,
+                 ttl_seconds: int = SCORE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _memory_get(self, key: str) -> Optional[float]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            score, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._lru[key]
+                return None
+            self._lru.move_to_end(key)
+            return score
+
+    def _memory_put(self, key: str, score: float):
+        with self._lock:
+            self._lru[key] = (score, time.monotonic() + self.ttl_seconds)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def get(self, db: Session, text: str) -> Optional[float]:
+        key = text_hash(text)
+        score = self._memory_get(key)
+        if score is not None:
+            self.memory_hits += 1
+            return score
+
+        entry = (
+            db.query(models.QualityScoreCache)
+            .filter(models.QualityScoreCache.text_hash == key)
+            .filter(models.QualityScoreCache.model == MODEL)
+            .filter(models.QualityScoreCache.prompt_version == PROMPT_VERSION)
+            .filter(models.QualityScoreCache.created_at >= datetime.utcnow() - timedelta(seconds=self.ttl_seconds))
+            .first()
+        )
+        if entry is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        self._memory_put(key, entry.score)
+        return entry.score
+
+    def put(self, db: Session, text: str, score: float):
+        """
+        Записывает оценку в оба уровня. Запись в БД идёт в текущей транзакции.
+        """
+        key = text_hash(text)
+        self._memory_put(key, score)
+        stmt = insert(models.QualityScoreCache).values(
+            text_hash=key, model=MODEL, prompt_version=PROMPT_VERSION,
+            score=score, created_at=datetime.utcnow()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["text_hash", "model", "prompt_version"],
+            set_={"score": stmt.excluded.score, "created_at": stmt.excluded.created_at}
+        )
+        db.execute(stmt)
+
+    def rate(self, db: Session, text: str) -> float:
+        """
+        Оценка качества через кэш. QualityScoringError пробрасывается,
+        неудачные оценки не кэшируются.
+        """
+        score = self.get(db, text)
+        if score is not None:
+            return score
+        score = rate_text_quality(text)
+        self.put(db, text, score)
+        return score
+
+    def purge(self, db: Session) -> int:
+        """
+        Удаляет записи старше TTL и записи других моделей/версий промпта.
+        """
+        deleted = (
+            db.query(models.QualityScoreCache)
+            .filter(or_(
+                models.QualityScoreCache.model != MODEL,
+                models.QualityScoreCache.prompt_version != PROMPT_VERSION,
+                models.QualityScoreCache.created_at < datetime.utcnow() - timedelta(seconds=self.ttl_seconds),
+            ))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        return deleted
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._lru),
+            "model": MODEL,
+            "prompt_version": PROMPT_VERSION,
+        }
+
+
+score_cache = QualityScoreCache()
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        deleted = score_cache.purge(db)
+        print(f"Purged {deleted} stale quality score cache entries")
+    finally:
+        db.close()
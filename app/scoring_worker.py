@@ -0,0 +1,341 @@
+"""
+Воркер очереди оценки качества постов.
+
+Посты создаются сразу со scoring_status='pending', а задача в таблице
+scoring_jobs ставится в той же транзакции. Воркер забирает задачи пачками
+(SELECT ... FOR UPDATE SKIP LOCKED, поэтому процессов может быть несколько),
+оценивает тексты через score_cache и в одной транзакции на пост записывает
+quality_score, points_awarded и запись начисления автору в points_ledger
+(в User.total_points её сворачивает app/points.py).
+
+Неудачные попытки повторяются с экспоненциальной задержкой; после
+SCORING_MAX_ATTEMPTS задача и пост помечаются 'failed'. Задача, аренда которой
+(SCORING_LEASE_SECONDS) истекла, тоже считается неудачной попыткой. Пока предохранитель
+клиента LLM открыт (app/inference_client.py), задачи откладываются до его
+пробного вызова без расхода попыток.
+
+Если задан SCORING_METRICS_PORT, на нём отдаются /metrics (Prometheus: этапы
+quality_llm и commit, SQL-запросы, пул соединений, клиент LLM) и
+/metrics/inference (статистика клиента LLM в JSON).
+
+Запуск:            python -m app.scoring_worker
+Повтор неудачных:  python -m app.scoring_worker --requeue-failed
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from sqlalchemy import exists, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from prometheus_client import REGISTRY
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import DB_MAX_OVERFLOW, DB_POOL_SIZE, SessionLocal, engine
+from app.points import ledger_stmt
+from app.inference_client import CircuitOpenError
+from app.observability import PoolCollector, configure_logging, metrics_payload, register_stats, stage
+from app.quality_rating import calculate_points, inference_client, rate_text_quality
+from app.response_cache import response_cache
+from app.score_cache import score_cache
+
+SCORING_BATCH_SIZE = int(os.getenv("SCORING_BATCH_SIZE", "16"))
+SCORING_CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", "4"))
+SCORING_MAX_ATTEMPTS = int(os.getenv("SCORING_MAX_ATTEMPTS", "6"))
+SCORING_BACKOFF_SECONDS = float(os.getenv("SCORING_BACKOFF_SECONDS", "10"))
+SCORING_LEASE_SECONDS = int(os.getenv("SCORING_LEASE_SECONDS", "300"))
+SCORING_POLL_SECONDS = float(os.getenv("SCORING_POLL_SECONDS", "1"))
+SCORING_METRICS_PORT = int(os.getenv("SCORING_METRICS_PORT", "0"))  # 0 — не поднимать
+
+logger = logging.getLogger(__name__)
+
+# Задачи в статусе running с истёкшей арендой (воркер упал или завис на задаче)
+# засчитываются как неудачная попытка: иначе текст, роняющий воркер, повторялся бы
+# бесконечно. После SCORING_MAX_ATTEMPTS задача помечается failed.
+EXPIRE_LEASES_SQL = text("""
+    UPDATE scoring_jobs SET
+        attempts = attempts + 1,
+        status = CASE WHEN attempts + 1 >= :max_attempts THEN 'failed' ELSE 'queued' END,
+        run_after = now() + make_interval(secs => :backoff * 2 ^ attempts),
+        locked_at = NULL, last_error = 'Lease expired', updated_at = now()
+    WHERE id IN (
+        SELECT id FROM scoring_jobs
+        WHERE status = 'running' AND locked_at < now() - make_interval(secs => :lease)
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, post_id, status
+""")
+
+CLAIM_SQL = text("""
+    UPDATE scoring_jobs SET status = 'running', locked_at = now(), updated_at = now()
+    WHERE id IN (
+        SELECT id FROM scoring_jobs
+        WHERE status = 'queued' AND run_after <= now()
+        ORDER BY run_after
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, post_id, attempts
+""")
+
+
+def enqueue_stmts(post_id: int) -> list:
+    """
+    Запросы постановки поста в очередь; общие для sync и async сессий.
+    """
+    stmt = insert(models.ScoringJob).values(post_id=post_id, status="queued", attempts=0)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["post_id"],
+        set_={"status": "queued", "attempts": 0, "run_after": datetime.utcnow(),
+              "locked_at": None, "last_error": None, "updated_at": datetime.utcnow()}
+    )
+    return [
+        stmt,
+        update(models.Post).where(models.Post.id == post_id).values(scoring_status="pending"),
+    ]
+
+
+def enqueue(db: Session, post_id: int):
+    """
+    Ставит пост в очередь на (повторную) оценку в текущей транзакции.
+    """
+    for stmt in enqueue_stmts(post_id):
+        db.execute(stmt)
+
+
+def requeue_failed(db: Session, post_ids: Optional[List[int]] = None) -> int:
+    """
+    Возвращает в очередь задачи со статусом failed (все или по списку постов).
+    """
+    q = db.query(models.ScoringJob).filter(models.ScoringJob.status == "failed")
+    if post_ids:
+        q = q.filter(models.ScoringJob.post_id.in_(post_ids))
+    job_post_ids = [post_id for (post_id,) in q.with_entities(models.ScoringJob.post_id)]
+    for post_id in job_post_ids:
+        enqueue(db, post_id)
+    db.commit()
+    response_cache.invalidate_sync(job_post_ids)
+    return len(job_post_ids)
+
+
+def expire_leases(db: Session) -> int:
+    """
+    Возвращает в очередь (или помечает failed) задачи с истёкшей арендой.
+    """
+    rows = db.execute(EXPIRE_LEASES_SQL, {"max_attempts": SCORING_MAX_ATTEMPTS, "lease": SCORING_LEASE_SECONDS,
+                                          "backoff": SCORING_BACKOFF_SECONDS}).all()
+    failed = [r.post_id for r in rows if r.status == "failed"]
+    copies = []
+    if failed:
+        db.execute(update(models.Post).where(models.Post.id.in_(failed)).values(scoring_status="failed"))
+        for post_id in failed:
+            copies += db.execute(_waiting_copies_stmt(post_id, scoring_status="failed")).scalars().all()
+    db.commit()
+    if failed:
+        response_cache.invalidate_sync([*failed, *copies])
+    for r in rows:
+        logger.warning("quality scoring lease expired", extra={"post_id": r.post_id, "status": r.status})
+    return len(rows)
+
+
+def claim_batch(db: Session, limit: int = SCORING_BATCH_SIZE) -> list:
+    expire_leases(db)
+    rows = db.execute(CLAIM_SQL, {"limit": limit}).all()
+    db.commit()
+    return rows
+
+
+def _score_texts(db: Session, texts: Dict[int, str], pool: ThreadPoolExecutor) -> Dict[int, object]:
+    """
+    Оценки по job_id: число или исключение. Кэш читается в текущем потоке,
+    промахи уходят в LLM параллельно (одинаковые тексты — одним запросом).
+    """
+    results = {}
+    misses = {}
+    for job_id, t in texts.items():
+        cached = score_cache.get(db, t)
+        if cached is not None:
+            results[job_id] = cached
+        else:
+            misses.setdefault(t, []).append(job_id)
+
+    futures = {t: pool.submit(_rate, t) for t in misses}
+    for t, future in futures.items():
+        try:
+            score = future.result()
+            score_cache.put(db, t, score)
+        except Exception as e:
+            score = e
+        for job_id in misses[t]:
+            results[job_id] = score
+    db.commit()
+    return results
+
+
+def _rate(text: str) -> float:
+    with stage("scoring", "quality_llm"):
+        return rate_text_quality(text)
+
+
+def _waiting_copies_stmt(post_id: int, **values):
+    """
+    UPDATE почти-дубликатов поста из той же пачки импорта (app/bulk_import.py):
+    своей задачи у них нет, они ждут результат оригинала.
+    """
+    post = models.Post
+    copies = select(models.PostSignature.post_id).where(models.PostSignature.duplicate_of == post_id)
+    return (
+        update(post)
+        .where(post.id.in_(copies), post.scoring_status == "pending",
+               ~exists().where(models.ScoringJob.post_id == post.id))
+        .values(**values)
+        .returning(post.id)
+    )
+
+
+def _complete(db: Session, job_id: int, post_id: int, score: float):
+    post = db.query(models.Post).filter(models.Post.id == post_id).with_for_update().first()
+    if post is None:
+        return
+    # Почти-дубликат, принятый до оценки оригинала, оценивается, но поинтов не получает
+    duplicate_of = db.query(models.PostSignature.duplicate_of).filter(
+        models.PostSignature.post_id == post_id).scalar()
+    points = 0.0 if duplicate_of is not None else calculate_points(score)
+    # При повторной оценке начисляется только разница с прошлым результатом
+    delta = points - (post.points_awarded or 0.0)
+    post.quality_score = score
+    post.points_awarded = points
+    post.scoring_status = "done"
+    if post.author_id is not None and delta:
+        db.execute(ledger_stmt(post.author_id, delta, "quality", post_id))
+    copies = db.execute(_waiting_copies_stmt(
+        post_id, quality_score=score, points_awarded=0.0, scoring_status="done")).scalars().all()
+    db.execute(
+        update(models.ScoringJob).where(models.ScoringJob.id == job_id)
+        .values(status="done", locked_at=None, last_error=None, updated_at=datetime.utcnow())
+    )
+    with stage("scoring", "commit"):
+        db.commit()
+    response_cache.invalidate_sync([post_id, *copies])
+
+
+def _fail(db: Session, job_id: int, post_id: int, attempts: int, error: Exception):
+    attempts += 1
+    values = {"attempts": attempts, "locked_at": None, "last_error": repr(error),
+              "updated_at": datetime.utcnow()}
+    copies = []
+    if attempts >= SCORING_MAX_ATTEMPTS:
+        values["status"] = "failed"
+        db.execute(update(models.Post).where(models.Post.id == post_id).values(scoring_status="failed"))
+        copies = db.execute(_waiting_copies_stmt(post_id, scoring_status="failed")).scalars().all()
+    else:
+        values["status"] = "queued"
+        values["run_after"] = datetime.utcnow() + timedelta(seconds=SCORING_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    db.execute(update(models.ScoringJob).where(models.ScoringJob.id == job_id).values(**values))
+    db.commit()
+    if values["status"] == "failed":
+        response_cache.invalidate_sync([post_id, *copies])
+    logger.warning("quality scoring failed", extra={"post_id": post_id, "attempt": attempts,
+                                                    "status": values["status"], "error": repr(error)})
+
+
+def _defer(db: Session, job_id: int, error: CircuitOpenError):
+    """
+    LLM недоступен: задача ждёт пробного вызова предохранителя, попытка не тратится.
+    """
+    db.execute(
+        update(models.ScoringJob).where(models.ScoringJob.id == job_id)
+        .values(status="queued", locked_at=None, last_error=repr(error), updated_at=datetime.utcnow(),
+                run_after=datetime.utcnow() + timedelta(seconds=error.retry_after))
+    )
+    db.commit()
+
+
+def process_batch(db: Session, pool: ThreadPoolExecutor) -> int:
+    jobs = claim_batch(db)
+    if not jobs:
+        return 0
+    posts = {
+        p.id: p for p in
+        db.query(models.Post).filter(models.Post.id.in_([j.post_id for j in jobs])).all()
+    }
+    texts = {j.id: f"{posts[j.post_id].title}\n{posts[j.post_id].description}"
+             for j in jobs if j.post_id in posts}
+    scores = _score_texts(db, texts, pool)
+
+    for job in jobs:
+        if job.id not in scores:
+            continue  # пост удалён, задача удалится каскадно
+        score = scores[job.id]
+        if isinstance(score, CircuitOpenError):
+            _defer(db, job.id, score)
+        elif isinstance(score, Exception):
+            _fail(db, job.id, job.post_id, job.attempts, score)
+        else:
+            _complete(db, job.id, job.post_id, score)
+    return len(jobs)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics_payload()
+        elif self.path == "/metrics/inference":
+            body, content_type = json.dumps(inference_client.stats()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int):
+    REGISTRY.register(PoolCollector({"sync": engine}, DB_POOL_SIZE + DB_MAX_OVERFLOW))
+    register_stats("inference", inference_client.stats)
+    register_stats("quality_cache", score_cache.stats)
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+
+def run_forever():
+    if SCORING_METRICS_PORT:
+        serve_metrics(SCORING_METRICS_PORT)
+    with ThreadPoolExecutor(max_workers=SCORING_CONCURRENCY, thread_name_prefix="scoring") as pool:
+        while True:
+            db = SessionLocal()
+            try:
+                processed = process_batch(db, pool)
+            finally:
+                db.close()
+            if not processed:
+                time.sleep(SCORING_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Scoring queue worker")
+    parser.add_argument("--requeue-failed", action="store_true",
+                        help="вернуть неудачные задачи в очередь и выйти")
+    args = parser.parse_args()
+
+    if args.requeue_failed:
+        db = SessionLocal()
+        try:
+            print(f"Requeued {requeue_failed(db)} failed scoring jobs")
+        finally:
+            db.close()
+    else:
+        run_forever()
@@ -0,0 +1,82 @@
+"""
+Полнотекстовый поиск постов (GET /posts/search?q=).
+
+posts.search_vector — хранимый генерируемый tsvector (конфигурация russian,
+заголовок с весом A, описание — B) с GIN-индексом ix_posts_search_vector;
+запрос разбирается websearch_to_tsquery, поэтому поддерживаются "фразы",
+OR и -исключения, а словоформы сводятся к основе.
+
+Порядок выдачи — смесь релевантности и качества:
+    score = (1 - SEARCH_QUALITY_WEIGHT) * ts_rank(search_vector, query, 32)
+          + SEARCH_QUALITY_WEIGHT * coalesce(quality_score, 0) / 100
+(нормализация 32 приводит ts_rank к [0, 1)). Пагинация keyset по (score, id):
+курсор — base64url от JSON [score, id] последнего поста страницы.
+"""
+import base64
+import binascii
+import json
+import os
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Float, cast, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import models
+from app.crud import _age_bracket
+
+SEARCH_CONFIG = "russian"
+SEARCH_QUALITY_WEIGHT = float(os.getenv("SEARCH_QUALITY_WEIGHT", "0.3"))
+
+
+def encode_search_cursor(score: float, post_id: int) -> str:
+    raw = json.dumps([score, post_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, post_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), int(post_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _search_stmt(q: str, limit: int = 20, user_age: Optional[int] = None,
+                 category: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    SELECT (Post, score) страницы поиска. Условие @@ выбирает совпадения по
+    GIN-индексу; ранжируются только они.
+    """
+    query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+    rank = cast(func.ts_rank(models.Post.search_vector, query, 32), Float)
+    quality = func.coalesce(models.Post.quality_score, 0.0) / 100.0
+    score = ((1 - SEARCH_QUALITY_WEIGHT) * rank + SEARCH_QUALITY_WEIGHT * quality).label("score")
+
+    stmt = select(models.Post, score).where(models.Post.search_vector.op("@@")(query))
+    if user_age is not None:
+        bracket = _age_bracket(user_age)
+        if bracket is not None:
+            stmt = stmt.where(models.Post.age_restriction <= bracket)
+    if category:
+        stmt = stmt.where(models.Post.categories.contains([category]))
+    if cursor:
+        after_score, after_id = decode_search_cursor(cursor)
+        stmt = stmt.where(tuple_(score, models.Post.id) < tuple_(after_score, after_id))
+    return stmt.order_by(score.desc(), models.Post.id.desc()).limit(limit)
+
+
+async def search_posts(db: AsyncSession, q: str, limit: int = 20, user_age: Optional[int] = None,
+                       category: Optional[str] = None,
+                       cursor: Optional[str] = None) -> Tuple[List[models.Post], Optional[str]]:
+    """
+    Страница результатов и курсор следующей (None, если страница последняя).
+    """
+    rows = (await db.execute(_search_stmt(q, limit, user_age, category, cursor))).all()
+    posts = [post for post, _ in rows]
+    next_page = None
+    if rows and len(rows) >= limit:
+        last_post, last_score = rows[-1]
+        next_page = encode_search_cursor(last_score, last_post.id)
+    return posts, next_page
@@ -0,0 +1,414 @@
+"""
+Предрассчитанный индекс похожих постов (top-K соседей на пост).
+
+Вес пары постов:
+    colikes(p, q) / sqrt(likes(p) * likes(q))  +  W_CATEGORY * cos(категории p, категории q)
+
+Индекс хранится в каталоге SIMILARITY_INDEX_DIR набором .npy-массивов и
+открывается через np.load(mmap_mode=...), поэтому воркеры разделяют одни и
+те же страницы памяти без копирования:
+
+    post_ids.npy    int64[n]     id постов (отсортированы)
+    like_counts.npy int32[n]     число лайков поста
+    neighbors.npy   int32[n, K]  индексы соседей в post_ids, -1 — пусто
+    colikes.npy     int32[n, K]  число совместных лайков с соседом
+    weights.npy     float32[n, K]
+
+Полная пересборка пишет новую версию в отдельный подкаталог и атомарно
+переключает файл CURRENT. Инкрементальное обновление применяет события из
+like_events (их пишет crud.toggle_like) прямо в текущую версию; оно
+приближённое, накопившийся дрейф убирает периодическая полная пересборка.
+
+    python -m app.similarity_index --rebuild      # полная пересборка
+    python -m app.similarity_index --update       # применить новые лайки
+    python -m app.similarity_index --loop 60 --rebuild-every 3600
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+from app.observability import configure_logging
+
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", "data/similarity_index")
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "50"))
+W_CATEGORY = float(os.getenv("SIMILARITY_W_CATEGORY", "0.2"))
+
+logger = logging.getLogger(__name__)
+
+_ARRAYS = ("post_ids", "like_counts", "neighbors", "colikes", "weights")
+
+
+def _category_cosine(a: Sequence[str], b: Sequence[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(set(a) & set(b)) / np.sqrt(len(set(a)) * len(set(b)))
+
+
+def build_arrays(like_users: np.ndarray, like_posts: np.ndarray, post_ids: np.ndarray,
+                 post_categories: List[Sequence[str]], k: int = SIMILARITY_TOP_K) -> Dict[str, np.ndarray]:
+    """
+    Строит массивы индекса. like_users/like_posts — пары лайков (id пользователя,
+    индекс поста в post_ids), post_categories — категории в порядке post_ids.
+    """
+    # SciPy/scikit-learn нужны только для пересборки, API-процессы их не импортируют
+    from scipy import sparse
+    from sklearn.preprocessing import normalize
+
+    n = len(post_ids)
+    _, user_rows = np.unique(like_users, return_inverse=True)
+    likes = sparse.csr_matrix(
+        (np.ones(len(like_posts), dtype=np.int32), (user_rows, like_posts)),
+        shape=(int(user_rows.max()) + 1 if len(user_rows) else 0, n),
+    )
+    like_counts = np.asarray(likes.sum(axis=0)).ravel().astype(np.int32)
+
+    colikes = (likes.T @ likes).tocsr()
+    colikes.setdiag(0)
+    colikes.eliminate_zeros()
+
+    categories = sorted({c for cats in post_categories for c in cats})
+    category_index = {c: i for i, c in enumerate(categories)}
+    c_rows = [i for i, cats in enumerate(post_categories) for _ in cats]
+    c_cols = [category_index[c] for cats in post_categories for c in cats]
+    post_cat = normalize(sparse.csr_matrix(
+        (np.ones(len(c_rows), dtype=np.float32), (c_rows, c_cols)),
+        shape=(n, max(len(categories), 1)),
+    ), norm="l2", axis=1)
+
+    # Самые популярные посты каждой категории — добор соседей для постов без совместных лайков
+    popular_by_category = {}
+    post_cat_csc = post_cat.tocsc()
+    for c, j in category_index.items():
+        members = post_cat_csc.indices[post_cat_csc.indptr[j]:post_cat_csc.indptr[j + 1]]
+        popular_by_category[c] = members[np.argsort(-like_counts[members], kind="stable")[:k + 1]]
+
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    neighbor_colikes = np.zeros((n, k), dtype=np.int32)
+    weights = np.zeros((n, k), dtype=np.float32)
+
+    for i in range(n):
+        start, end = colikes.indptr[i], colikes.indptr[i + 1]
+        cols = colikes.indices[start:end]
+        co = colikes.data[start:end]
+        if len(cols) < k and post_categories[i]:
+            extra = np.unique(np.concatenate([popular_by_category[c] for c in post_categories[i]]))
+            extra = extra[(extra != i) & ~np.isin(extra, cols)]
+            cols = np.concatenate([cols, extra]).astype(np.int32)
+            co = np.concatenate([co, np.zeros(len(extra), dtype=co.dtype)])
+        if not len(cols):
+            continue
+        denom = np.sqrt(np.maximum(like_counts[i], 1) * np.maximum(like_counts[cols], 1).astype(np.float64))
+        w = co / denom
+        if W_CATEGORY:
+            w = w + W_CATEGORY * np.asarray(post_cat[cols] @ post_cat[i].T.toarray()).ravel()
+        top = np.argsort(-w, kind="stable")[:k]
+        top = top[w[top] > 0]
+        neighbors[i, :len(top)] = cols[top]
+        neighbor_colikes[i, :len(top)] = co[top]
+        weights[i, :len(top)] = w[top]
+
+    return {
+        "post_ids": np.asarray(post_ids, dtype=np.int64),
+        "like_counts": like_counts,
+        "neighbors": neighbors,
+        "colikes": neighbor_colikes,
+        "weights": weights,
+    }
+
+
+def _current_dir(base: str) -> Optional[str]:
+    try:
+        with open(os.path.join(base, "CURRENT")) as f:
+            return os.path.join(base, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+def save_version(arrays: Dict[str, np.ndarray], meta: dict, base: str = SIMILARITY_INDEX_DIR) -> str:
+    """
+    Пишет новую версию индекса и атомарно делает её текущей; старые версии удаляются.
+    """
+    os.makedirs(base, exist_ok=True)
+    version = f"v{int(time.time() * 1000)}"
+    path = os.path.join(base, version)
+    os.makedirs(path)
+    for name in _ARRAYS:
+        np.save(os.path.join(path, f"{name}.npy"), arrays[name])
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    tmp = os.path.join(base, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(version)
+    os.replace(tmp, os.path.join(base, "CURRENT"))
+
+    for old in os.listdir(base):
+        if old.startswith("v") and old != version:
+            shutil.rmtree(os.path.join(base, old), ignore_errors=True)
+    return path
+
+
+class SimilarityIndex:
+    """
+    Читатель индекса. Массивы отображаются в память и подхватывают новую
+    версию после полной пересборки.
+    """
+
+    def __init__(self, base: str = SIMILARITY_INDEX_DIR, writable: bool = False):
+        self.base = base
+        self.writable = writable
+        self.path = None
+        self.arrays = {}
+        self.meta = {}
+
+    def reload(self) -> bool:
+        """
+        Открывает текущую версию (или новую после пересборки). False — индекса ещё нет.
+        """
+        path = _current_dir(self.base)
+        if path is None:
+            return False
+        if path != self.path:
+            mode = "r+" if self.writable else "r"
+            self.arrays = {n: np.load(os.path.join(path, f"{n}.npy"), mmap_mode=mode) for n in _ARRAYS}
+            with open(os.path.join(path, "meta.json")) as f:
+                self.meta = json.load(f)
+            self.path = path
+        return True
+
+    def _index_of(self, post_id: int) -> Optional[int]:
+        # Бинарный поиск по отсортированному post_ids вместо словаря в памяти процесса
+        ids = self.arrays["post_ids"]
+        i = int(np.searchsorted(ids, post_id))
+        return i if i < len(ids) and ids[i] == post_id else None
+
+    def neighbors(self, post_ids: Sequence[int]) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        Соседи для каждого поста: [(post_id, weight), ...] по убыванию веса.
+        Посты, появившиеся после последней пересборки, соседей не имеют.
+        """
+        if not self.reload():
+            return {}
+        ids = self.arrays["post_ids"]
+        result = {}
+        for pid in post_ids:
+            i = self._index_of(pid)
+            if i is None:
+                continue
+            row = self.arrays["neighbors"][i]
+            mask = row >= 0
+            result[pid] = list(zip(ids[row[mask]].tolist(), self.arrays["weights"][i][mask].tolist()))
+        return result
+
+    def apply_like_events(self, events: Sequence[Tuple[int, int, int]],
+                          liked_before: Dict[int, Set[int]],
+                          categories: Dict[int, Sequence[str]]):
+        """
+        Инкрементально учитывает события (user_id, post_id, delta ±1) в порядке id:
+        обновляет число лайков и совместные лайки с постами, которые пользователь
+        лайкнул до этого события, пересчитывает веса затронутых строк и при
+        необходимости вытесняет самого слабого соседа. liked_before — лайки
+        пользователей до первого события (см. liked_before_events). Изменения
+        пишутся в отображённые файлы на месте.
+        """
+        a = self.arrays
+        liked = {user_id: set(posts) for user_id, posts in liked_before.items()}
+        touched = set()
+        for user_id, post_id, delta in events:
+            posts = liked.setdefault(user_id, set())
+            others = posts - {post_id}
+            if delta > 0:
+                posts.add(post_id)
+            else:
+                posts.discard(post_id)
+            i = self._index_of(post_id)
+            if i is None:
+                continue
+            a["like_counts"][i] = max(int(a["like_counts"][i]) + delta, 0)
+            touched.add(i)
+            for other in others:
+                j = self._index_of(other)
+                if j is None:
+                    continue
+                self._bump_pair(i, j, delta, categories)
+                self._bump_pair(j, i, delta, categories)
+                touched.add(j)
+
+        for i in touched:
+            self._reweight_row(i, categories)
+
+    def _bump_pair(self, i: int, j: int, delta: int, categories):
+        a = self.arrays
+        row = a["neighbors"][i]
+        hit = np.nonzero(row == j)[0]
+        if len(hit):
+            a["colikes"][i, hit[0]] = max(int(a["colikes"][i, hit[0]]) + delta, 0)
+            return
+        if delta <= 0:
+            return
+        weight = self._pair_weight(i, j, 1, categories)
+        slot = int(np.argmin(np.where(row >= 0, a["weights"][i], -np.inf)))
+        if row[slot] >= 0 and a["weights"][i, slot] >= weight:
+            return
+        row[slot] = j
+        a["colikes"][i, slot] = 1
+        a["weights"][i, slot] = weight
+
+    def _pair_weight(self, i: int, j: int, colikes: int, categories) -> float:
+        a = self.arrays
+        ids = a["post_ids"]
+        denom = np.sqrt(max(int(a["like_counts"][i]), 1) * max(int(a["like_counts"][j]), 1))
+        cat = _category_cosine(categories.get(int(ids[i]), []), categories.get(int(ids[j]), []))
+        return float(colikes / denom + W_CATEGORY * cat)
+
+    def _reweight_row(self, i: int, categories):
+        a = self.arrays
+        row = a["neighbors"][i]
+        for slot in np.nonzero(row >= 0)[0]:
+            a["weights"][i, slot] = self._pair_weight(i, int(row[slot]), int(a["colikes"][i, slot]), categories)
+        order = np.argsort(-np.where(row >= 0, a["weights"][i], -np.inf), kind="stable")
+        a["neighbors"][i] = row[order]
+        a["colikes"][i] = a["colikes"][i][order]
+        a["weights"][i] = a["weights"][i][order]
+
+    def flush(self, last_event_id: int):
+        for arr in self.arrays.values():
+            arr.flush()
+        self.meta["last_event_id"] = last_event_id
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+
+similarity_index = SimilarityIndex()
+
+
+def liked_before_events(liked_now: Dict[int, Set[int]],
+                        events: Sequence[Tuple[int, int, int]]) -> Dict[int, Set[int]]:
+    """
+    Лайки пользователей до events (user_id, post_id, delta в порядке id) по
+    текущему состоянию likes, в котором все эти события уже учтены.
+    """
+    liked = {user_id: set(posts) for user_id, posts in liked_now.items()}
+    for user_id, post_id, delta in reversed(events):
+        posts = liked.setdefault(user_id, set())
+        if delta > 0:
+            posts.discard(post_id)
+        else:
+            posts.add(post_id)
+    return liked
+
+
+def rebuild(db: Session, base: str = SIMILARITY_INDEX_DIR, k: int = SIMILARITY_TOP_K) -> dict:
+    """
+    Полная пересборка по таблицам likes и posts.
+    """
+    started = time.perf_counter()
+    # Водяной знак берём до чтения лайков, чтобы не потерять события между ними
+    last_event_id = db.execute(select(func.coalesce(func.max(models.LikeEvent.id), 0))).scalar()
+
+    post_rows = db.execute(select(models.Post.id, models.Post.categories).order_by(models.Post.id)).all()
+    post_ids = np.array([r.id for r in post_rows], dtype=np.int64)
+    like_rows = db.execute(select(models.Like.user_id, models.Like.post_id)).all()
+    like_users = np.array([r.user_id for r in like_rows], dtype=np.int64)
+    like_posts = np.searchsorted(post_ids, np.array([r.post_id for r in like_rows], dtype=np.int64))
+
+    arrays = build_arrays(like_users, like_posts, post_ids, [r.categories or [] for r in post_rows], k)
+    meta = {"built_at": time.time(), "last_event_id": int(last_event_id), "k": k,
+            "posts": len(post_ids), "likes": len(like_rows)}
+    save_version(arrays, meta, base)
+
+    # Учтённые в индексе события удаляются, если они не нужны и пересчёту кандидатов:
+    # recommender._dirty_user_ids находит по ним пользователей, только снявших лайки
+    pending_refresh = exists().where(
+        models.FeedCandidates.user_id == models.LikeEvent.user_id,
+        models.FeedCandidates.updated_at < models.LikeEvent.created_at,
+    )
+    db.execute(delete(models.LikeEvent).where(models.LikeEvent.id <= last_event_id, ~pending_refresh))
+    db.commit()
+    meta["seconds"] = round(time.perf_counter() - started, 2)
+    return meta
+
+
+def update(db: Session, base: str = SIMILARITY_INDEX_DIR, batch_size: int = 10000) -> int:
+    """
+    Применяет к текущей версии индекса события like_events новее водяного знака.
+    """
+    index = SimilarityIndex(base, writable=True)
+    if not index.reload():
+        rebuild(db, base)
+        return 0
+    last_id = int(index.meta.get("last_event_id", 0))
+    events = db.execute(
+        select(models.LikeEvent.id, models.LikeEvent.user_id, models.LikeEvent.post_id, models.LikeEvent.delta)
+        .where(models.LikeEvent.id > last_id)
+        .order_by(models.LikeEvent.id)
+        .limit(batch_size)
+    ).all()
+    if not events:
+        return 0
+
+    users = {e.user_id for e in events}
+    liked_now = defaultdict(set)
+    for user_id, post_id in db.execute(
+        select(models.Like.user_id, models.Like.post_id).where(models.Like.user_id.in_(users))
+    ):
+        liked_now[user_id].add(post_id)
+    # likes уже отражает и события пачки, и более поздние: откатываем их все,
+    # чтобы каждое событие сочеталось только с лайками, поставленными до него
+    later = db.execute(
+        select(models.LikeEvent.user_id, models.LikeEvent.post_id, models.LikeEvent.delta)
+        .where(models.LikeEvent.id > events[-1].id, models.LikeEvent.user_id.in_(users))
+        .order_by(models.LikeEvent.id)
+    ).all()
+    batch = [(e.user_id, e.post_id, e.delta) for e in events]
+    liked_before = liked_before_events(liked_now, batch + [tuple(e) for e in later])
+
+    affected = {e.post_id for e in events} | {p for ps in liked_before.values() for p in ps}
+    categories = {
+        pid: cats or [] for pid, cats in db.execute(
+            select(models.Post.id, models.Post.categories).where(models.Post.id.in_(affected))
+        )
+    }
+    index.apply_like_events(batch, liked_before, categories)
+    index.flush(events[-1].id)
+    return len(events)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Post similarity index")
+    parser.add_argument("--rebuild", action="store_true", help="полная пересборка")
+    parser.add_argument("--update", action="store_true", help="применить новые события лайков")
+    parser.add_argument("--loop", type=float, default=0, help="обновлять каждые N секунд")
+    parser.add_argument("--rebuild-every", type=float, default=3600,
+                        help="в режиме --loop: полная пересборка раз в N секунд")
+    args = parser.parse_args()
+
+    last_rebuild = 0.0
+    while True:
+        db = SessionLocal()
+        try:
+            if args.rebuild or (args.loop and time.time() - last_rebuild >= args.rebuild_every):
+                logger.info("rebuilt similarity index", extra={"result": rebuild(db)})
+                last_rebuild = time.time()
+                args.rebuild = False
+            elif args.update or args.loop:
+                logger.info("applied like events to similarity index", extra={"events": update(db)})
+        finally:
+            db.close()
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -1,25 +1,336 @@
-from transformers import pipeline
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Sequence, Tuple
 
-classifier = pipeline("text-classification", model="s-nlp/russian_toxicity_classifier")
+logger = logging.getLogger(__name__)
 
-def is_toxic_by_model(text, threshold=0.6):
+TOXICITY_MODEL = "s-nlp/russian_toxicity_classifier"
+TOXIC_THRESHOLD = 0.6
+MAX_BATCH_SIZE = int(os.getenv("TOXICITY_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("TOXICITY_MAX_WAIT_MS", "10"))
+
+# Бэкенд инференса: torch (pipeline transformers), onnx (экспортированная
+# модель с динамическим int8-квантованием, см. export_onnx) или stub
+# (детерминированная заглушка для бенчмарков, см. StubBackend)
+TOXICITY_BACKEND = os.getenv("TOXICITY_BACKEND", "torch")
+TOXICITY_ONNX_DIR = os.getenv("TOXICITY_ONNX_DIR", "data/toxicity_onnx")
+TOXICITY_ONNX_THREADS = int(os.getenv("TOXICITY_ONNX_THREADS", "0"))
+MAX_LENGTH = 512
+ONNX_MODEL_FILE = "model.int8.onnx"
+
+
+class TorchBackend:
+    """
+    Классификатор через pipeline transformers на PyTorch.
+    """
+    name = "torch"
+
+    def __init__(self, model: str = TOXICITY_MODEL):
+        from transformers import pipeline
+        self._pipeline = pipeline("text-classification", model=model)
+
+    def __call__(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        results = self._pipeline(list(texts), batch_size=len(texts), truncation=True)
+        return [(r['label'], float(r['score'])) for r in results]
+
+
+class OnnxBackend:
+    """
+    Классификатор через ONNX Runtime. Токенизатор и id2label берутся из каталога
+    экспорта, результат совпадает по форме с pipeline: (label, score) лучшего класса.
+    """
+    name = "onnx"
+
+    def __init__(self, model_dir: str = TOXICITY_ONNX_DIR, threads: int = TOXICITY_ONNX_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoTokenizer
+
+        path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found: run python -m app.toxic_analis --export-onnx {model_dir}")
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self._id2label = AutoConfig.from_pretrained(model_dir).id2label
+
+    def __call__(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        import numpy as np
+
+        encoded = self._tokenizer(list(texts), padding=True, truncation=True,
+                                  max_length=MAX_LENGTH, return_tensors="np")
+        feed = {k: v.astype(np.int64) for k, v in encoded.items() if k in self._input_names}
+        logits = self._session.run(None, feed)[0]
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [(self._id2label[int(i)], float(probs[row, i])) for row, i in enumerate(best)]
+
+
+class StubBackend:
+    """
+    Заглушка без модели: текст токсичен, если содержит одно из слов
+    TOXICITY_STUB_WORDS; на батч тратится фиксированные TOXICITY_STUB_DELAY_MS.
+    Нужна, чтобы нагрузочные замеры (benchmarks/suite.py) не зависели от модели.
+    """
+    name = "stub"
+
+    def __init__(self):
+        self._words = [w for w in os.getenv("TOXICITY_STUB_WORDS", "токсичный").lower().split(",") if w]
+        self._delay = float(os.getenv("TOXICITY_STUB_DELAY_MS", "0")) / 1000
+
+    def __call__(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        if self._delay:
+            time.sleep(self._delay)
+        return [("toxic", 0.99) if any(w in t.lower() for w in self._words) else ("neutral", 0.99)
+                for t in texts]
+
+
+BACKENDS = {"torch": TorchBackend, "onnx": OnnxBackend, "stub": StubBackend}
+
+
+def load_backend(name: str = TOXICITY_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown TOXICITY_BACKEND={name!r}, expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+# Модель загружается при первом обращении (или прогревом при старте приложения),
+# а не при импорте: импорт transformers/torch занимает секунды и сотни МБ.
+_classifier = None
+_classifier_lock = threading.Lock()
+model_state = "not_loaded"  # not_loaded, loading, ready, failed
+
+
+def get_classifier():
+    global _classifier, model_state
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                model_state = "loading"
+                try:
+                    _classifier = load_backend()
+                except Exception:
+                    model_state = "failed"
+                    raise
+                model_state = "ready"
+    return _classifier
+
+
+def warm_up():
+    """
+    Загружает модель и прогоняет один текст, чтобы первый запрос не платил за инициализацию.
+    """
+    _classify(["прогрев"])
+
+
+def _classify(texts: Sequence[str]) -> List[Tuple[str, float]]:
+    """
+    Один прогон модели на весь батч. Возвращает пары (label, score).
+    """
+    return get_classifier()(texts)
+
+
+def export_onnx(model_dir: str = TOXICITY_ONNX_DIR, model: str = TOXICITY_MODEL) -> str:
+    """
+    Экспортирует классификатор в ONNX и квантует веса в int8 (динамическое
+    квантование, активации остаются float). Рядом сохраняются токенизатор и конфиг.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model)
+    hf_model = AutoModelForSequenceClassification.from_pretrained(model).eval()
+    tokenizer.save_pretrained(model_dir)
+    hf_model.config.save_pretrained(model_dir)
+
+    sample = tokenizer(["пример текста", "ещё один пример"], padding=True, return_tensors="pt")
+    input_names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            hf_model, tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=["logits"],
+            dynamic_axes=dynamic_axes, opset_version=14,
+        )
+    int8_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    return int8_path
+
+
+def _verdict(label: str, score: float, threshold: float) -> bool:
+    is_toxic = (label == 'toxic') and (score > threshold)
+    logger.debug("toxic check: score=%.2f label=%s is_toxic=%s", score, label, is_toxic)
+    return is_toxic
+
+
+def is_toxic_batch(texts: Sequence[str], threshold: float = TOXIC_THRESHOLD) -> List[bool]:
+    """
+    Проверяет токсичность списка текстов одним прогоном модели.
+    """
+    if not texts:
+        return []
+    return [_verdict(label, score, threshold) for label, score in _classify(texts)]
+
+
+def is_toxic_by_model(text, threshold=TOXIC_THRESHOLD):
     """
     Проверяет токсичность текста.
     Возвращает True только если label='toxic' И score > threshold.
     """
-    result = classifier(text)[0]
-    score = float(result['score'])
-    label = result['label']
-    
-    # Отладочная информация
-    print(f"[DEBUG] Full result: {result}")
-    print(f"[DEBUG] label type: {type(label)}, label value: '{label}'")
-    print(f"[DEBUG] label == 'toxic': {label == 'toxic'}")
-    print(f"[DEBUG] score > threshold: {score > threshold}")
-    logs = 1+1
-    # Определяем токсичность
-    is_toxic = (label == 'toxic') and (score > threshold)
-    
-    print(f"[TOXIC CHECK] score: {score:.2f}, label: {label}, is_toxic: {is_toxic}")
-    
-    return is_toxic
\ No newline at end of file
+    return is_toxic_batch([text], threshold)[0]
+
+
+class ToxicityBatcher:
+    """
+    Микробатчинг запросов к классификатору для async-обработчиков.
+
+    Запросы копятся в очереди, пока не наберётся max_batch_size текстов или не
+    истечёт max_wait_ms с момента первого запроса в батче; затем модель
+    запускается один раз на весь батч в отдельном потоке.
+    """
+
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="toxicity")
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+        self._started_at = time.monotonic()
+        self._batches = 0
+        self._items = 0
+        self._errors = 0
+        self._inference_seconds = 0.0
+        self._latencies = deque(maxlen=1000)
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def warm_up(self):
+        """
+        Прогрев модели на потоке инференса батчера.
+        """
+        await asyncio.get_running_loop().run_in_executor(self._executor, warm_up)
+
+    async def is_toxic(self, text: str, threshold: float = TOXIC_THRESHOLD) -> bool:
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((text, threshold, future, time.perf_counter()))
+        return await future
+
+    async def is_toxic_many(self, texts: Sequence[str], threshold: float = TOXIC_THRESHOLD) -> List[bool]:
+        """
+        Проверка пачки текстов для массового импорта: батчи по max_batch_size идут
+        на тот же поток инференса, минуя очередь, и чередуются с одиночными запросами.
+        """
+        loop = asyncio.get_running_loop()
+        verdicts = []
+        for start in range(0, len(texts), self.max_batch_size):
+            chunk = list(texts[start:start + self.max_batch_size])
+            started = time.perf_counter()
+            try:
+                verdicts.extend(await loop.run_in_executor(self._executor, is_toxic_batch, chunk, threshold))
+            except Exception:
+                self._errors += 1
+                raise
+            self._batches += 1
+            self._items += len(chunk)
+            self._inference_seconds += time.perf_counter() - started
+        return verdicts
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            texts = [item[0] for item in batch]
+            started = time.perf_counter()
+            try:
+                results = await self._loop.run_in_executor(self._executor, _classify, texts)
+            except Exception as e:
+                self._errors += 1
+                logger.exception("toxicity batch of %d failed", len(batch))
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self._batches += 1
+            self._items += len(batch)
+            self._inference_seconds += finished - started
+            for (_, threshold, future, enqueued), (label, score) in zip(batch, results):
+                self._latencies.append(finished - enqueued)
+                if not future.done():
+                    future.set_result(_verdict(label, score, threshold))
+
+    def stats(self) -> dict:
+        """
+        Пропускная способность и задержки (очередь + инференс) по последним запросам.
+        """
+        latencies = sorted(self._latencies)
+
+        def pct(q):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+        uptime = time.monotonic() - self._started_at
+        return {
+            "batches": self._batches,
+            "items": self._items,
+            "errors": self._errors,
+            "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "throughput_per_sec": self._items / uptime if uptime else 0.0,
+            "inference_texts_per_sec": self._items / self._inference_seconds if self._inference_seconds else 0.0,
+            "latency_p50_ms": pct(0.50),
+            "latency_p95_ms": pct(0.95),
+            "latency_p99_ms": pct(0.99),
+        }
+
+
+toxicity_batcher = ToxicityBatcher()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Toxicity classifier utilities")
+    parser.add_argument("--export-onnx", metavar="DIR", nargs="?", const=TOXICITY_ONNX_DIR,
+                        help="экспортировать модель в ONNX с int8-квантованием")
+    args = parser.parse_args()
+    if args.export_onnx:
+        print(f"Exported {export_onnx(args.export_onnx)}")
+    else:
+        parser.print_help()
@@ -0,0 +1,58 @@
+"""
+Кэш телефон → (user_id, age) для горячего пути лайков.
+
+Лайк без полей профиля не должен каждый раз делать upsert пользователя: id по
+телефону не меняется, а возраст нужен только для проверки age_restriction и
+может отставать не больше чем на USER_CACHE_TTL_SECONDS. Кэш локален для
+процесса и обновляется после каждого upsert в этом процессе.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "100000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+
+
+class PhoneUserCache:
+    def __init__(self, max_entries: int = USER_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = USER_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone: str) -> Optional[Tuple[int, Optional[int]]]:
+        with self._lock:
+            entry = self._lru.get(phone)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._lru[phone]
+                self.misses += 1
+                return None
+            self._lru.move_to_end(phone)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, phone: str, user_id: int, age: Optional[int]):
+        with self._lock:
+            self._lru[phone] = ((user_id, age), time.monotonic() + self.ttl_seconds)
+            self._lru.move_to_end(phone)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+phone_user_cache = PhoneUserCache()
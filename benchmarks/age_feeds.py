@@ -0,0 +1,140 @@
+"""
+Лента возрастной группы: материализованная age_feed_entries против фильтра
+age_restriction <= N по таблице posts.
+
+В отдельной транзакции (откатывается в конце) posts заполняется синтетическими
+постами с перекосом в сторону 18+ (как в реальной ленте: у младших групп
+подходящих постов мало), строится age_feed_entries, выполняется ANALYZE. Для
+каждой группы сравниваются EXPLAIN ANALYZE первой страницы и страницы после
+курсора из середины ленты: время выполнения, прочитанные буферы и число строк,
+отброшенных фильтром. --partial-indexes добавляет прежние частичные индексы
+ix_posts_feed_age_N, чтобы сравнить и с ними.
+
+    python -m benchmarks.age_feeds --posts 1000000
+    python -m benchmarks.age_feeds --posts 1000000 --category IT --partial-indexes
+"""
+import argparse
+import json
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import models
+from app.crud import _list_posts_stmt
+from app.database import SessionLocal
+from app.pagination import FEED_ORDER, after_cursor, encode_cursor
+
+
+class ExplainAnalyze(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(ExplainAnalyze, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+# 60% постов 18+, 20% — 16+, 10% — 12+, 6% — 6+, 4% — без ограничения
+SEED_SQL = text("""
+    INSERT INTO posts (title, description, categories, age_restriction, created_at, scoring_status)
+    SELECT 'title ' || g,
+           'description ' || g,
+           jsonb_build_array((ARRAY['IT', 'Спорт', 'Наука', 'Волонтерство', 'Искусство'])[1 + g % 5]),
+           CASE WHEN g % 100 < 60 THEN 18 WHEN g % 100 < 80 THEN 16 WHEN g % 100 < 90 THEN 12
+                WHEN g % 100 < 96 THEN 6 ELSE 0 END,
+           now() - make_interval(secs => g),
+           'done'
+    FROM generate_series(1, :n) AS g
+""")
+
+# То же, что crud._age_feed_insert_stmt, но для всей таблицы без списка id
+FEED_SQL = text(f"""
+    INSERT INTO age_feed_entries (bracket, created_at, post_id)
+    SELECT b.bracket, p.created_at, p.id
+    FROM posts p
+    JOIN unnest(ARRAY{list(models.AGE_FEED_BRACKETS)}::smallint[]) AS b(bracket) ON p.age_restriction <= b.bracket
+""")
+
+
+def filtered_stmt(category, limit, user_age, cursor=None):
+    """
+    Прежний запрос ленты: фильтр по age_restriction на строках posts.
+    """
+    q = select(models.Post).where(models.Post.age_restriction <= user_age)
+    if category:
+        q = q.where(models.Post.categories.contains([category]))
+    if cursor:
+        q = q.where(after_cursor(cursor))
+    return q.order_by(*FEED_ORDER).limit(limit)
+
+
+def _totals(plan: dict) -> dict:
+    totals = {"rows_removed": plan.get("Rows Removed by Filter", 0) + plan.get("Rows Removed by Join Filter", 0)}
+    for child in plan.get("Plans", []):
+        totals["rows_removed"] += _totals(child)["rows_removed"]
+    return totals
+
+
+def explain(db, stmt) -> dict:
+    raw = db.execute(ExplainAnalyze(stmt)).scalar()
+    result = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+    plan = result["Plan"]
+    return {
+        "ms": round(result["Execution Time"], 3),
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        **_totals(plan),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--category", default=None)
+    parser.add_argument("--partial-indexes", action="store_true")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        db.execute(SEED_SQL, {"n": args.posts})
+        db.execute(FEED_SQL)
+        if args.partial_indexes:
+            for age in models.AGE_FEED_BRACKETS:
+                db.execute(text(f"CREATE INDEX ix_bench_feed_age_{age} ON posts (created_at DESC, id DESC) "
+                                f"WHERE age_restriction <= {age}"))
+        db.execute(text("ANALYZE posts"))
+        db.execute(text("ANALYZE age_feed_entries"))
+
+        for bracket in models.AGE_FEED_BRACKETS:
+            # Курсор из середины ленты группы: глубокая страница
+            feed = models.AgeFeedEntry
+            size = db.execute(select(func.count()).where(feed.bracket == bracket)).scalar()
+            middle = db.execute(
+                select(feed.created_at, feed.post_id)
+                .where(feed.bracket == bracket)
+                .order_by(feed.created_at.desc(), feed.post_id.desc())
+                .offset(size // 2)
+                .limit(1)
+            ).first()
+            cursor = encode_cursor(*middle) if middle else None
+            for page, page_cursor in (("first", None), ("middle", cursor)):
+                report = {"bracket": bracket, "page": page, "category": args.category}
+                for name, stmt in (
+                    ("filtered", filtered_stmt(args.category, args.limit, bracket, page_cursor)),
+                    ("materialized", _list_posts_stmt(args.category, 0, args.limit, bracket, page_cursor)),
+                ):
+                    runs = [explain(db, stmt) for _ in range(args.repeat)]
+                    report[name] = min(runs, key=lambda r: r["ms"])
+                print(json.dumps(report, ensure_ascii=False))
+    finally:
+        db.rollback()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Локальный сервер инференса с внедрением задержек и ошибок.
+
+Отвечает на POST /v1/chat/completions как совместимый с OpenAI сервер (так его
+вызывает huggingface_hub.InferenceClient с base_url): оценка — детерминированное
+число 0-100 из хэша последнего сообщения. Неисправности:
+
+    --latency-ms / --jitter-ms   обычная задержка ответа и её равномерный разброс;
+    --slow-rate / --slow-ms      доля «хвостовых» ответов и их задержка;
+    --error-rate / --error-status  доля ответов с ошибкой и её HTTP-код.
+
+POST /admin/faults с JSON тех же полей (latency_ms, slow_rate, ...) меняет их
+на лету, GET /admin/stats — счётчики запросов. Подключение приложения:
+
+    python -m benchmarks.fake_inference_server --port 8081 --slow-rate 0.05 --error-rate 0.1
+    QUALITY_ENDPOINT_URL=http://localhost:8081 python -m app.scoring_worker
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    slow_rate: float = 0.0
+    slow_ms: float = 5000.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+
+def fake_score(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16) % 101
+
+
+class FakeInferenceServer:
+    def __init__(self, port: int = 0, faults: Faults = None, seed: int = 0):
+        self.faults = faults or Faults()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "errors": 0, "slow": 0, "in_flight": 0, "max_in_flight": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def configure(self, **changes):
+        with self._lock:
+            for key, value in changes.items():
+                if not hasattr(self.faults, key):
+                    raise ValueError(f"Unknown fault {key!r}")
+                setattr(self.faults, key, type(getattr(self.faults, key))(value))
+
+    def reset_counters(self):
+        with self._lock:
+            self.counters.update(requests=0, errors=0, slow=0, max_in_flight=self.counters["in_flight"])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-inference", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def _draw(self):
+        """
+        Задержка и исход очередного запроса по текущим настройкам.
+        """
+        with self._lock:
+            f = self.faults
+            slow = self._rng.random() < f.slow_rate
+            delay = f.slow_ms if slow else f.latency_ms + self._rng.uniform(-f.jitter_ms, f.jitter_ms)
+            error = f.error_status if self._rng.random() < f.error_rate else None
+            self.counters["requests"] += 1
+            self.counters["slow"] += slow
+            self.counters["errors"] += error is not None
+            self.counters["in_flight"] += 1
+            self.counters["max_in_flight"] = max(self.counters["max_in_flight"], self.counters["in_flight"])
+        return max(delay, 0.0) / 1000, error
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # клиент бросил попытку по таймауту
+
+            def _body(self) -> dict:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if self.path == "/admin/stats":
+                    with server._lock:
+                        self._reply(200, {**server.counters, "faults": asdict(server.faults)})
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                if self.path == "/admin/faults":
+                    try:
+                        server.configure(**self._body())
+                    except (ValueError, TypeError) as e:
+                        self._reply(400, {"error": str(e)})
+                        return
+                    self._reply(200, asdict(server.faults))
+                    return
+                if not self.path.endswith("/chat/completions"):
+                    self._reply(404, {"error": "not found"})
+                    return
+
+                payload = self._body()
+                delay, error = server._draw()
+                try:
+                    time.sleep(delay)
+                finally:
+                    # До ответа: клиент, получивший его, не должен видеть запрос незавершённым
+                    with server._lock:
+                        server.counters["in_flight"] -= 1
+                if error is not None:
+                    self._reply(error, {"error": "injected failure", "error_type": "fake"})
+                    return
+                messages = payload.get("messages") or [{"content": ""}]
+                content = str(fake_score(messages[-1].get("content") or ""))
+                self._reply(200, {
+                    "id": f"fake-{time.monotonic_ns()}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": payload.get("model", "fake"),
+                    "system_fingerprint": "fake",
+                    "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 1, "total_tokens": 1},
+                })
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--seed", type=int, default=0)
+    for field, default in asdict(Faults()).items():
+        parser.add_argument("--" + field.replace("_", "-"), type=type(default), default=default)
+    args = parser.parse_args()
+    faults = Faults(**{field: getattr(args, field) for field in asdict(Faults())})
+    server = FakeInferenceServer(args.port, faults, args.seed)
+    print(f"Fake inference server on {server.url}: {asdict(faults)}")
+    server.serve_forever()
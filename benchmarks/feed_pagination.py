@@ -0,0 +1,76 @@
+"""
+Сравнение offset- и cursor-пагинации ленты на глубоких страницах.
+
+Для каждой страницы из --pages измеряется задержка GET /posts/ в двух
+режимах: ?skip=(page-1)*limit и ?cursor=<курсор той же страницы>.
+Курсор нужной страницы берётся напрямую из БД, поэтому скрипту нужен
+DATABASE_URL той же базы, с которой работает сервер.
+
+    python -m benchmarks.feed_pagination --url http://localhost:8000 --pages 1,100,10000
+"""
+import argparse
+import json
+import statistics
+import time
+
+import requests
+
+from app import models
+from app.database import SessionLocal
+from app.pagination import FEED_ORDER, encode_cursor
+
+
+def cursor_for_page(db, page: int, limit: int):
+    if page <= 1:
+        return None
+    row = (
+        db.query(models.Post.created_at, models.Post.id)
+        .order_by(*FEED_ORDER)
+        .offset((page - 1) * limit - 1)
+        .limit(1)
+        .first()
+    )
+    return encode_cursor(row.created_at, row.id) if row else None
+
+
+def measure(session, url: str, params: dict, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        resp = session.get(url, params=params)
+        resp.raise_for_status()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--pages", default="1,10,100,1000,10000")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    url = f"{args.url}/posts/"
+    db = SessionLocal()
+    session = requests.Session()
+    try:
+        for page in [int(p) for p in args.pages.split(",")]:
+            cursor = cursor_for_page(db, page, args.limit)
+            if page > 1 and cursor is None:
+                print(json.dumps({"page": page, "skipped": "not enough posts"}))
+                continue
+            cursor_params = {"limit": args.limit}
+            if cursor:
+                cursor_params["cursor"] = cursor
+            print(json.dumps({
+                "page": page,
+                "offset_ms": measure(session, url, {"limit": args.limit, "skip": (page - 1) * args.limit}, args.repeat),
+                "cursor_ms": measure(session, url, cursor_params, args.repeat),
+            }))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
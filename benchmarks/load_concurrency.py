@@ -0,0 +1,77 @@
+"""
+Нагрузочный бенчмарк API: запросы в секунду и задержки при разном числе
+одновременных соединений.
+
+Запуск (сервер уже поднят):
+    python benchmarks/load_concurrency.py --url http://localhost:8000/posts/?limit=20
+
+Для сравнения sync и async стека запустите скрипт против двух ревизий
+приложения с одинаковыми данными и одинаковым числом воркеров uvicorn.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import aiohttp
+
+
+async def _worker(session, url, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as resp:
+                await resp.read()
+                if resp.status >= 400:
+                    errors.append(resp.status)
+                    continue
+        except aiohttp.ClientError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_level(url: str, concurrency: int, duration: float) -> dict:
+    latencies, errors = [], []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*[
+            _worker(session, url, deadline, latencies, errors) for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(q):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000/posts/?limit=20")
+    parser.add_argument("--concurrency", default="50,200,1000",
+                        help="уровни параллелизма через запятую")
+    parser.add_argument("--duration", type=float, default=20.0, help="секунд на уровень")
+    args = parser.parse_args()
+
+    for level in [int(c) for c in args.concurrency.split(",")]:
+        print(json.dumps(await run_level(args.url, level, args.duration)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+"""
+Подбор параметров MinHash-LSH и задержка поиска почти-дубликатов.
+
+--tune: синтетический корпус постов-«кандидатов» из общих шаблонов. Положительные
+пары — копия с небольшими правками (замена 1-3 слов, дописанная фраза, другой
+регистр и пунктуация, удалённое предложение); отрицательные — другой пост по тому
+же шаблону (жёсткий случай: общий каркас, другие детали). Для сочетаний размера
+шингла, числа перестановок, полос и порога печатаются полнота, доля ложных
+срабатываний и среднее число кандидатов на запрос.
+
+--latency: индекс в памяти на --posts сигнатур (по умолчанию 1M): время
+загрузки, объём, p50/p99 поиска кандидатов и время вычисления сигнатуры.
+
+    python -m benchmarks.near_duplicates --tune
+    python -m benchmarks.near_duplicates --latency --posts 1000000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app import near_duplicates as nd
+
+ROLES = ["стажёра-аналитика", "junior python-разработчика", "дизайнера интерфейсов", "волонтёров на марафон",
+         "тестировщика", "SMM-менеджера", "ассистента преподавателя", "data engineer", "фронтенд-разработчика"]
+TEAMS = ["в команду цифровых сервисов города", "в отдел аналитики данных", "в студенческий стартап",
+         "в музей современного искусства", "в центр поддержки молодёжи", "в лабораторию машинного обучения"]
+SKILLS = ["Python", "SQL", "pandas", "Figma", "Git", "Docker", "английский язык", "Excel", "JavaScript",
+          "коммуникабельность", "ответственность", "опыт работы с детьми", "FastAPI", "PostgreSQL"]
+PERKS = ["гибкий график", "удалённая работа", "наставник", "оплачиваемая стажировка", "сертификат",
+         "обучение за счёт компании", "возможность трудоустройства", "дружная команда", "бесплатное питание"]
+ENDINGS = ["Откликайтесь до конца месяца.", "Пишите в личные сообщения.", "Ждём ваших резюме!",
+           "Собеседование онлайн.", "Приходите на день открытых дверей в субботу."]
+SYNONYMS = {"гибкий": "свободный", "команду": "коллектив", "опыт": "навыки", "Ждём": "Ожидаем",
+            "работа": "занятость", "обучение": "образование", "ответственность": "пунктуальность"}
+
+
+def base_post(rng: random.Random) -> str:
+    skills = ", ".join(rng.sample(SKILLS, 4))
+    perks = ", ".join(rng.sample(PERKS, 3))
+    return (f"Ищем {rng.choice(ROLES)} {rng.choice(TEAMS)}. Что нужно: {skills}. "
+            f"Задачи: участие в проекте с первого дня, {rng.randint(10, 40)} часов в неделю, "
+            f"отчёт руководителю каждую {rng.choice(['пятницу', 'неделю', 'среду'])}. "
+            f"Мы предлагаем: {perks}. {rng.choice(ENDINGS)}")
+
+
+def light_edit(text: str, rng: random.Random) -> str:
+    words = text.split()
+    kind = rng.choice(["synonyms", "append", "case", "drop_sentence", "mixed"])
+    if kind in ("synonyms", "mixed"):
+        for i, w in enumerate(words):
+            if w in SYNONYMS and rng.random() < 0.7:
+                words[i] = SYNONYMS[w]
+        for _ in range(rng.randint(1, 2)):
+            words[rng.randrange(len(words))] = rng.choice(["очень", "срочно", "новый", "2025"])
+    if kind in ("append", "mixed"):
+        words += rng.choice(["Репост приветствуется!", "Подробности по ссылке в профиле.", "Места ограничены."]).split()
+    if kind == "case":
+        words = [w.upper() if rng.random() < 0.2 else w.replace(".", "!") for w in words]
+    text = " ".join(words)
+    if kind == "drop_sentence":
+        sentences = text.split(". ")
+        sentences.pop(rng.randrange(len(sentences)))
+        text = ". ".join(sentences)
+    return text
+
+
+def corpus(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    bases = [base_post(rng) for _ in range(size)]
+    positives = [(b, light_edit(b, rng)) for b in bases]
+    negatives = [(bases[i], bases[(i + 1) % size]) for i in range(size)]
+    return positives, negatives
+
+
+def tune(size: int):
+    positives, negatives = corpus(size)
+    configs = [(2, 64, 16), (3, 64, 16), (2, 64, 8), (2, 64, 32), (2, 128, 32), (3, 128, 32), (2, 128, 16)]
+    for shingle, num_perm, bands in configs:
+        def pair_stats(pairs):
+            out = []
+            for a, b in pairs:
+                sa, sb = nd.signature(a, num_perm, shingle), nd.signature(b, num_perm, shingle)
+                candidate = bool(np.any(nd.band_keys(sa, bands) == nd.band_keys(sb, bands)))
+                out.append((candidate, nd.similarity(sa, sb)))
+            return out
+
+        pos, neg = pair_stats(positives), pair_stats(negatives)
+        for threshold in (0.5, 0.6, 0.7, 0.8, 0.9):
+            print(json.dumps({
+                "shingle": shingle, "num_perm": num_perm, "bands": bands, "rows": num_perm // bands,
+                "threshold": threshold,
+                "recall": round(sum(c and s >= threshold for c, s in pos) / len(pos), 4),
+                "false_positive_rate": round(sum(c and s >= threshold for c, s in neg) / len(neg), 4),
+                "lsh_candidate_rate_neg": round(sum(c for c, _ in neg) / len(neg), 4),
+                "median_similarity_pos": round(statistics.median(s for _, s in pos), 3),
+                "median_similarity_neg": round(statistics.median(s for _, s in neg), 3),
+            }))
+
+
+def latency(posts: int, queries: int):
+    rng = np.random.default_rng(0)
+    sigs = rng.integers(0, 2 ** 32, size=(posts, nd.DEDUP_NUM_PERM), dtype=np.uint64).astype(np.uint32)
+    index = nd.LshIndex()
+    started = time.perf_counter()
+    index.load_bulk(np.arange(1, posts + 1), nd.band_keys(sigs))
+    load_seconds = time.perf_counter() - started
+
+    # Половина запросов — уже проиндексированные сигнатуры (есть кандидат), половина — новые
+    fresh = rng.integers(0, 2 ** 32, size=(queries // 2, nd.DEDUP_NUM_PERM), dtype=np.uint64).astype(np.uint32)
+    probes = np.concatenate([sigs[rng.integers(0, posts, size=queries - len(fresh))], fresh])
+    timings = []
+    for sig in probes:
+        started = time.perf_counter()
+        index.candidates(nd.band_keys(sig))
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    text = base_post(random.Random(1))
+    started = time.perf_counter()
+    for _ in range(1000):
+        nd.signature(text)
+    signature_ms = (time.perf_counter() - started)
+
+    print(json.dumps({
+        "posts": posts, "num_perm": nd.DEDUP_NUM_PERM, "bands": nd.DEDUP_BANDS,
+        "load_seconds": round(load_seconds, 2),
+        "index_mb": round(index.stats()["index_bytes"] / 2 ** 20, 1),
+        "lookup_p50_ms": round(timings[len(timings) // 2], 4),
+        "lookup_p99_ms": round(timings[int(len(timings) * 0.99)], 4),
+        "signature_ms": round(signature_ms, 4),
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tune", action="store_true")
+    parser.add_argument("--latency", action="store_true")
+    parser.add_argument("--corpus", type=int, default=2000)
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=10000)
+    args = parser.parse_args()
+    if args.tune:
+        tune(args.corpus)
+    if args.latency:
+        latency(args.posts, args.queries)
@@ -0,0 +1,105 @@
+"""
+Сравнение JSON-выдачи ленты (ORM → PostOut → jsonable_encoder, как при
+response_model) и потоковой NDJSON-выдачи (yield_per + orjson) по времени и
+пиковой памяти Python (tracemalloc) при limit=50/500/5000.
+
+Посты засеваются в БД из DATABASE_URL под уникальной категорией и удаляются
+после замера; база должна быть смигрирована (alembic upgrade head).
+
+    python -m benchmarks.post_stream
+    python -m benchmarks.post_stream --limits 50,500,5000 --repeat 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete, insert
+
+from app import crud_async, models
+from app.database import AsyncSessionLocal, SessionLocal
+from app.feed import load_post_outs
+from app.post_stream import parse_fields, stream_posts, stream_statement
+
+WORDS = "проект хакатон python данные аналитика команда опыт стажировка backend sql модель".split()
+
+
+def seed(category: str, count: int):
+    rng = random.Random(42)
+    rows = [{
+        "title": f"Пост {i}",
+        "description": " ".join(rng.choice(WORDS) for _ in range(150)),
+        "categories": [category],
+        "age_restriction": 0,
+        "scoring_status": "done",
+        "quality_score": rng.uniform(0, 100),
+    } for i in range(count)]
+    with SessionLocal() as db:
+        db.execute(insert(models.Post), rows)
+        db.commit()
+
+
+def cleanup(category: str):
+    with SessionLocal() as db:
+        db.execute(delete(models.Post).where(models.Post.categories.contains([category])))
+        db.commit()
+
+
+async def json_path(category: str, limit: int) -> int:
+    async with AsyncSessionLocal() as db:
+        posts = await crud_async.list_posts(db, category, 0, limit)
+        outs = await load_post_outs(db, posts)
+        return len(json.dumps(jsonable_encoder(outs)).encode())
+
+
+async def ndjson_path(category: str, limit: int, fields: str = None) -> int:
+    size = 0
+    stream_fields = parse_fields(fields)
+    stmt = stream_statement(category, 0, limit, fields=stream_fields)
+    async for chunk in stream_posts(stmt, limit, stream_fields):
+        size += len(chunk)
+    return size
+
+
+async def measure(fn, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"median_ms": round(statistics.median(timings), 2), "peak_kb": round(peak / 1024, 1), "bytes": size}
+
+
+async def main(limits, repeat: int):
+    category = f"bench-stream-{uuid.uuid4().hex[:8]}"
+    seed(category, max(limits))
+    try:
+        for limit in limits:
+            print(json.dumps({
+                "limit": limit,
+                "json": await measure(lambda: json_path(category, limit), repeat),
+                "ndjson": await measure(lambda: ndjson_path(category, limit), repeat),
+                "ndjson_no_description": await measure(
+                    lambda: ndjson_path(category, limit, "id,title,categories,quality_score,created_at,likes_count"),
+                    repeat),
+            }))
+    finally:
+        cleanup(category)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON vs streaming NDJSON feed serialization")
+    parser.add_argument("--limits", default="50,500,5000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main([int(x) for x in args.limits.split(",")], args.repeat))
@@ -0,0 +1,130 @@
+"""
+Полнотекстовый поиск постов на синтетической таблице (по умолчанию 1M постов).
+
+В отдельной транзакции (откатывается в конце) posts заполняется постами из
+случайных русских слов в разных словоформах; слово «хакатон» встречается в
+каждом 10000-м посте, остальные — часто. После ANALYZE для запросов разной
+селективности замеряется EXPLAIN ANALYZE первой страницы и страницы после
+курсора app.search._search_stmt, с возрастным фильтром и без, и проверяется,
+что совпадения выбираются по GIN-индексу ix_posts_search_vector. Для сравнения
+замеряется прежний способ — ILIKE по description. Код выхода 1, если индекс
+не используется.
+
+    python -m benchmarks.search --posts 1000000
+"""
+import argparse
+import json
+import sys
+
+from sqlalchemy import or_, select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import models
+from app.database import SessionLocal
+from app.search import _search_stmt, encode_search_cursor
+
+
+class ExplainAnalyze(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(ExplainAnalyze, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+SEED_SQL = text("""
+    INSERT INTO posts (title, description, categories, age_restriction, quality_score, created_at, scoring_status)
+    SELECT (ARRAY['Стажировка', 'Волонтёрство', 'Проект', 'Команда', 'Митап'])[1 + g % 5] || ' ' || g,
+           array_to_string(ARRAY(
+               SELECT (ARRAY['стажировка', 'стажировки', 'стажировку', 'разработчик', 'разработчики',
+                             'данные', 'данных', 'команда', 'команды', 'проект', 'проекты', 'аналитика',
+                             'волонтёры', 'школьники', 'студенты', 'город', 'музей', 'спорт', 'наука',
+                             'программирование'])[1 + floor(random() * 20)::int]
+               FROM generate_series(1, 40) WHERE g = g
+           ), ' ') || CASE WHEN g % 10000 = 0 THEN ' хакатон' ELSE '' END,
+           jsonb_build_array((ARRAY['IT', 'Спорт', 'Наука', 'Волонтерство', 'Искусство'])[1 + g % 5]),
+           (ARRAY[0, 6, 12, 16, 18])[1 + g % 5],
+           random() * 100,
+           now() - make_interval(secs => g),
+           'done'
+    FROM generate_series(1, :n) AS g
+""")
+
+# (описание, q, user_age)
+CASES = [
+    ("rare word", "хакатон", None),
+    ("rare word, age 12", "хакатоны", 13),
+    ("common word", "стажировки", None),
+    ("two words", "музей школьники", None),
+    ("phrase", '"программирование данных"', 6),
+    ("or / exclude", "музей or спорт -наука", None),
+]
+
+
+def _index_names(plan: dict) -> set:
+    names = {plan["Index Name"]} if "Index Name" in plan else set()
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+def explain(db, stmt) -> dict:
+    raw = db.execute(ExplainAnalyze(stmt)).scalar()
+    result = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+    plan = result["Plan"]
+    return {
+        "ms": round(result["Execution Time"], 2),
+        "buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "indexes": sorted(_index_names(plan)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    failed = 0
+    try:
+        db.execute(SEED_SQL, {"n": args.posts})
+        db.execute(text("ANALYZE posts"))
+
+        for name, q, user_age in CASES:
+            first = _search_stmt(q, args.limit, user_age)
+            rows = db.execute(first).all()
+            report = {"case": name, "q": q, "user_age": user_age, "matches_on_page": len(rows)}
+            pages = [("first", first)]
+            if len(rows) >= args.limit:
+                post, score = rows[-1]
+                pages.append(("second", _search_stmt(q, args.limit, user_age,
+                                                     cursor=encode_search_cursor(score, post.id))))
+            for page, stmt in pages:
+                runs = [explain(db, stmt) for _ in range(args.repeat)]
+                report[page] = min(runs, key=lambda r: r["ms"])
+            ok = "ix_posts_search_vector" in report["first"]["indexes"]
+            failed += not ok
+            print(json.dumps(report, ensure_ascii=False))
+
+        # Без индекса: подстрока в описании, как при фильтрации на клиенте
+        baseline = (select(models.Post)
+                    .where(or_(models.Post.title.ilike("%хакатон%"), models.Post.description.ilike("%хакатон%")))
+                    .order_by(models.Post.quality_score.desc().nulls_last(), models.Post.id.desc())
+                    .limit(args.limit))
+        print(json.dumps({"case": "ILIKE baseline", "q": "%хакатон%", "first": explain(db, baseline)},
+                         ensure_ascii=False))
+    finally:
+        db.rollback()
+        db.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Наполнение Postgres для нагрузочных замеров (benchmarks/suite.py).
+
+Пользователи, посты, лайки и комментарии пишутся через COPY ... FROM STDIN
+пачками по --chunk строк, затем одним проходом SQL пересчитываются
+likes_count/comments_count, заполняются ленты возрастных групп
+(age_feed_entries) и значения последовательностей, выполняется ANALYZE.
+
+Данные детерминированы --seed. Телефон и возраст пользователя i — функции
+user_phone(i) и user_age(i), их же использует генератор запросов; посты
+получают id 1..--posts и scoring_status='done'. Колонки и таблицы, которых нет
+в схеме проверяемой ревизии, пропускаются (сравнение ревизий в suite.py).
+
+    python -m benchmarks.seed --users 100000 --posts 200000 --likes 1000000 --comments 300000 --truncate
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from app.database import engine
+from app.models import AGE_FEED_BRACKETS, AGE_RESTRICTIONS
+
+BASE_TIME = datetime(2025, 1, 1)
+CATEGORIES = ["IT", "Спорт", "Наука", "Волонтерство", "Искусство", "Образование", "Карьера",
+              "Музыка", "Кино", "Путешествия", "Экология", "Предпринимательство"]
+FIRSTNAMES = ["Анна", "Иван", "Мария", "Пётр", "Елена", "Дмитрий", "Ольга", "Алексей", "Софья", "Никита"]
+LASTNAMES = ["Иванов", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Новиков", "Морозова"]
+WORDS = ["стажировка", "проект", "команда", "разработчик", "данные", "аналитика", "хакатон", "волонтёры",
+         "школьники", "студенты", "город", "музей", "спорт", "наука", "программирование", "конкурс",
+         "наставник", "фестиваль", "лаборатория", "олимпиада", "исследование", "дизайн", "экскурсия"]
+# Таблицы без внешних ключей на users/posts, которые не очищает TRUNCATE ... CASCADE
+EXTRA_TABLES = ["like_events", "quality_score_cache"]
+
+
+def user_phone(i: int) -> str:
+    return f"+7999{i:07d}"
+
+
+def user_age(i: int) -> int:
+    return 14 + (i * 7) % 47
+
+
+def post_age_restriction(i: int) -> int:
+    return AGE_RESTRICTIONS[(i * 13) % len(AGE_RESTRICTIONS)]
+
+
+def user_name(i: int) -> tuple:
+    return FIRSTNAMES[i % len(FIRSTNAMES)], LASTNAMES[(i // len(FIRSTNAMES)) % len(LASTNAMES)]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def _popular_post(rng: random.Random, posts: int) -> int:
+    # Свежие посты (большие id) популярнее
+    return posts - int(posts * rng.random() ** 2)
+
+
+def users_rows(n: int):
+    columns = ["id", "phone", "firstname", "lastname", "age", "total_points", "created_at"]
+
+    def rows():
+        for i in range(1, n + 1):
+            first, last = user_name(i)
+            yield i, user_phone(i), first, last, user_age(i), 0.0, BASE_TIME
+    return columns, rows()
+
+
+def posts_rows(n: int, users: int, seed: int):
+    columns = ["id", "title", "description", "categories", "age_segment", "age_restriction", "quality_score",
+               "points_awarded", "scoring_status", "created_at", "author_id", "author_name"]
+
+    def rows():
+        rng = random.Random(seed)
+        for i in range(1, n + 1):
+            author = rng.randint(1, users)
+            score = round(rng.random() * 100, 1)
+            categories = rng.sample(CATEGORIES, rng.randint(1, 3))
+            yield (i, _text(rng, 4), _text(rng, rng.randint(20, 80)), json.dumps(categories, ensure_ascii=False),
+                   rng.choice((14, 18, 25)), post_age_restriction(i), score, round(score / 10, 2), "done",
+                   BASE_TIME + timedelta(seconds=37 * i), author, " ".join(user_name(author)))
+    return columns, rows()
+
+
+def likes_rows(n: int, users: int, posts: int, seed: int):
+    columns = ["id", "user_id", "post_id", "created_at"]
+
+    def rows():
+        rng = random.Random(seed + 1)
+        seen = set()
+        attempts = 0
+        while len(seen) < n and attempts < 4 * n:
+            attempts += 1
+            user_id, post_id = rng.randint(1, users), _popular_post(rng, posts)
+            if (user_id, post_id) in seen or post_age_restriction(post_id) > user_age(user_id):
+                continue
+            seen.add((user_id, post_id))
+            yield len(seen), user_id, post_id, BASE_TIME + timedelta(seconds=37 * post_id + rng.randint(0, 86400))
+    return columns, rows()
+
+
+def comments_rows(n: int, users: int, posts: int, seed: int):
+    columns = ["id", "post_id", "parent_id", "author_id", "author_name", "text", "created_at"]
+
+    def rows():
+        rng = random.Random(seed + 2)
+        last_comment = {}
+        i = 0
+        while i < n:
+            user_id, post_id = rng.randint(1, users), _popular_post(rng, posts)
+            if post_age_restriction(post_id) > user_age(user_id):
+                continue
+            i += 1
+            # Треть комментариев — ответы на предыдущий комментарий к тому же посту
+            parent = last_comment.get(post_id) if rng.random() < 0.33 else None
+            last_comment[post_id] = i
+            yield (i, post_id, parent, user_id, " ".join(user_name(user_id)), _text(rng, rng.randint(3, 30)),
+                   BASE_TIME + timedelta(seconds=37 * post_id + i))
+    return columns, rows()
+
+
+def _schema(cur) -> dict:
+    cur.execute("SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = 'public'")
+    tables = {}
+    for table, column in cur.fetchall():
+        tables.setdefault(table, set()).add(column)
+    return tables
+
+
+def copy_rows(cur, table: str, columns: list, rows, existing: set, chunk: int) -> int:
+    keep = [i for i, c in enumerate(columns) if c in existing]
+    sql = f"COPY {table} ({', '.join(columns[i] for i in keep)}) FROM STDIN WITH (FORMAT csv)"
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    count = 0
+
+    def flush():
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+        buf.seek(0)
+        buf.truncate()
+
+    for row in rows:
+        writer.writerow([row[i] for i in keep])
+        count += 1
+        if count % chunk == 0:
+            flush()
+    if count % chunk:
+        flush()
+    return count
+
+
+def seed(users: int, posts: int, likes: int, comments: int, seed_value: int = 42,
+         truncate: bool = False, chunk: int = 50000) -> dict:
+    conn = engine.raw_connection()
+    report = {"users": users, "posts": posts, "likes": likes, "comments": comments, "seed": seed_value}
+    try:
+        cur = conn.cursor()
+        tables = _schema(cur)
+        if truncate:
+            extra = [t for t in EXTRA_TABLES if t in tables]
+            cur.execute(f"TRUNCATE {', '.join(['users', 'posts'] + extra)} RESTART IDENTITY CASCADE")
+
+        started = time.perf_counter()
+        for table, (columns, rows) in (
+            ("users", users_rows(users)),
+            ("posts", posts_rows(posts, users, seed_value)),
+            ("likes", likes_rows(likes, users, posts, seed_value)),
+            ("comments", comments_rows(comments, users, posts, seed_value)),
+        ):
+            report[table] = copy_rows(cur, table, columns, rows, tables[table], chunk)
+        report["copy_seconds"] = round(time.perf_counter() - started, 2)
+
+        started = time.perf_counter()
+        if "likes_count" in tables["posts"]:
+            cur.execute("""
+                UPDATE posts p SET likes_count = c.n
+                FROM (SELECT post_id, count(*) AS n FROM likes GROUP BY post_id) c WHERE p.id = c.post_id
+            """)
+            cur.execute("""
+                UPDATE posts p SET comments_count = c.n
+                FROM (SELECT post_id, count(*) AS n FROM comments GROUP BY post_id) c WHERE p.id = c.post_id
+            """)
+        if "age_feed_entries" in tables:
+            cur.execute(f"""
+                INSERT INTO age_feed_entries (bracket, created_at, post_id)
+                SELECT b.bracket, p.created_at, p.id
+                FROM posts p
+                JOIN unnest(ARRAY{list(AGE_FEED_BRACKETS)}::smallint[]) AS b(bracket) ON p.age_restriction <= b.bracket
+            """)
+        for table in ("users", "posts", "likes", "comments"):
+            cur.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"GREATEST((SELECT max(id) FROM {table}), 1))")
+        conn.commit()
+        report["derive_seconds"] = round(time.perf_counter() - started, 2)
+
+        # ANALYZE вне транзакции, чтобы планировщик сразу видел новые объёмы
+        conn.autocommit = True
+        cur.execute("ANALYZE")
+    finally:
+        conn.close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--likes", type=int, default=200000)
+    parser.add_argument("--comments", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk", type=int, default=50000)
+    parser.add_argument("--truncate", action="store_true", help="очистить таблицы перед заполнением")
+    args = parser.parse_args()
+    if args.users < 1 or args.posts < 1:
+        sys.exit("--users and --posts must be positive")
+    print(json.dumps(seed(args.users, args.posts, args.likes, args.comments, args.seed, args.truncate, args.chunk)))
@@ -0,0 +1,78 @@
+"""
+Время и память полной пересборки индекса похожих постов на синтетических данных.
+
+Лайки распределены по Ципфу (популярные посты получают большую часть лайков),
+у каждого поста 1–3 категории из --categories синтетических.
+
+    python -m benchmarks.similarity_index --likes 1000000 --posts 50000 --users 100000
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+from app.similarity_index import SimilarityIndex, build_arrays, save_version
+
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--likes", type=int, default=1_000_000)
+    parser.add_argument("--posts", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    all_categories = [f"category_{i}" for i in range(args.categories)]
+    post_ids = np.arange(1, args.posts + 1, dtype=np.int64)
+    post_categories = [
+        list(rng.choice(all_categories, size=rng.integers(1, 4), replace=False))
+        for _ in range(args.posts)
+    ]
+    # С запасом, чтобы после удаления повторных пар осталось ~--likes уникальных лайков
+    draws = int(args.likes * 1.6)
+    like_users = rng.integers(1, args.users + 1, size=draws)
+    like_posts = np.minimum(rng.zipf(1.3, size=draws) - 1, args.posts - 1)
+    pairs = np.unique(np.stack([like_users, like_posts], axis=1), axis=0)
+    pairs = pairs[rng.permutation(len(pairs))[:args.likes]]
+    rss_before = _rss_mb()
+
+    started = time.perf_counter()
+    arrays = build_arrays(pairs[:, 0], pairs[:, 1], post_ids, post_categories, args.k)
+    build_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as base:
+        path = save_version(arrays, {"last_event_id": 0}, base)
+        disk_mb = sum(os.path.getsize(os.path.join(path, n)) for n in os.listdir(path)) / 2 ** 20
+
+        index = SimilarityIndex(base)
+        sample = rng.choice(post_ids, size=10_000).tolist()
+        started = time.perf_counter()
+        index.neighbors(sample)
+        lookup_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+    print(json.dumps({
+        "likes": int(len(pairs)),
+        "posts": args.posts,
+        "users": args.users,
+        "k": args.k,
+        "rebuild_seconds": round(build_seconds, 2),
+        "peak_rss_mb": round(_rss_mb(), 1),
+        "rebuild_rss_delta_mb": round(_rss_mb() - rss_before, 1),
+        "index_disk_mb": round(disk_mb, 1),
+        "neighbors_lookup_us": round(lookup_us, 2),
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Бенчмарк времени старта API.
+
+Измеряет в отдельных процессах:
+- время импорта app.main и RSS процесса после импорта;
+- самые тяжёлые модули по `python -X importtime`;
+- время от запуска uvicorn до первого ответа /health/live и до 200 от /health/ready
+  (включает прогрев модели токсичности).
+
+Запуск из корня репозитория (для /health/ready нужна доступная БД):
+    python -m benchmarks.startup_time
+    python -m benchmarks.startup_time --skip-server
+
+Для сравнения запустите скрипт на двух ревизиях с одинаковым окружением.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+IMPORT_PROBE = """
+import json, resource, time
+started = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - started
+rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({"import_seconds": elapsed, "max_rss_mb": rss_mb}))
+"""
+
+
+def measure_import() -> dict:
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], check=True,
+                         capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    return {k: round(v, 3) for k, v in result.items()}
+
+
+def heaviest_imports(top: int) -> list:
+    """
+    Модули с наибольшим накопленным временем импорта (микросекунды).
+    """
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"],
+                         check=True, capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:top]]
+
+
+def _wait_for(url: str, started: float, timeout: float, expect_ok: bool):
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if not expect_ok or resp.status == 200:
+                    return round(time.perf_counter() - started, 3)
+        except urllib.error.HTTPError:
+            pass
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def measure_server(port: int, timeout: float) -> dict:
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        live = _wait_for(f"{base}/health/live", started, timeout, expect_ok=True)
+        ready = _wait_for(f"{base}/health/ready", started, timeout, expect_ok=True) if live else None
+        return {"live_seconds": live, "ready_seconds": ready}
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API startup time")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=300, help="ожидание готовности, секунды")
+    parser.add_argument("--top", type=int, default=10, help="сколько тяжёлых импортов показать")
+    parser.add_argument("--skip-server", action="store_true", help="только импорт, без uvicorn")
+    args = parser.parse_args()
+
+    report = {"import": measure_import(), "heaviest_imports": heaviest_imports(args.top)}
+    if not args.skip_server:
+        report["server"] = measure_server(args.port, args.timeout)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,335 @@
+"""
+Воспроизводимый нагрузочный набор для API.
+
+run — сценарии против поднятого сервера при фиксированном --concurrency, каждый
+      --duration секунд после --warmup секунд прогрева (не учитывается):
+
+    list_posts           GET /posts/?limit=20
+    list_posts_category  GET /posts/?limit=20&category=<по кругу из seed.CATEGORIES>
+    get_post             GET /posts/{id}
+    like                 POST /posts/{id}/like?phone=<совершеннолетний из seed>
+    comment              POST /posts/{id}/comments
+    create_post          POST /posts/ (пишущие сценарии идут последними)
+
+   Параметры запросов детерминированы --seed (свой генератор на каждое
+   соединение) и объёмами из benchmarks/seed.py. Результат — JSON: p50/p95/p99 в
+   мс, пропускная способность (запросов/с), число ошибок по сценарию и meta
+   (ревизия, параметры). Сервер для сопоставимых цифр запускается с заглушками
+   моделей: TOXICITY_BACKEND=stub и QUALITY_ENDPOINT_URL на
+   benchmarks/fake_inference_server.py без задержек (так делает режим revs).
+
+compare — сравнение двух результатов: регрессия, если p50/p95/p99 выросли или
+      пропускная способность упала больше чем на --threshold (доля), либо доля
+      ошибок выросла больше чем на 1 п.п. Код выхода 1 при регрессии.
+
+revs — сравнение двух git-ревизий на выделенной БД (--database-url, схема
+      пересоздаётся!): для каждой ревизии git worktree, alembic upgrade head,
+      benchmarks.seed текущего дерева, uvicorn с заглушками, run; затем compare.
+
+    python -m benchmarks.seed --users 10000 --posts 50000 --likes 200000 --comments 50000 --truncate
+    python -m benchmarks.suite run --url http://localhost:8000 --out results/head.json
+    python -m benchmarks.suite compare results/base.json results/head.json
+    python -m benchmarks.suite revs main HEAD --database-url postgresql+psycopg2://bench@localhost/bench
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import aiohttp
+
+from benchmarks.seed import CATEGORIES, user_age, user_phone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["list_posts", "list_posts_category", "get_post", "like", "comment", "create_post"]
+LATENCY_METRICS = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def _adult(rng: random.Random, users: int) -> int:
+    while True:
+        i = rng.randint(1, users)
+        if user_age(i) >= 18:
+            return i
+
+
+def build_request(name: str, rng: random.Random, users: int, posts: int, counter: int):
+    """
+    (метод, путь, параметры, JSON-тело) очередного запроса сценария.
+    """
+    post_id = rng.randint(1, posts)
+    if name == "list_posts":
+        return "GET", "/posts/", {"limit": "20"}, None
+    if name == "list_posts_category":
+        return "GET", "/posts/", {"limit": "20", "category": CATEGORIES[counter % len(CATEGORIES)]}, None
+    if name == "get_post":
+        return "GET", f"/posts/{post_id}", None, None
+    if name == "like":
+        return "POST", f"/posts/{post_id}/like", {"phone": user_phone(_adult(rng, users))}, None
+    if name == "comment":
+        return "POST", f"/posts/{post_id}/comments", None, {
+            "post_id": post_id, "author_phone": user_phone(_adult(rng, users)),
+            "text": f"Комментарий нагрузочного теста {counter}",
+        }
+    if name == "create_post":
+        author = _adult(rng, users)
+        return "POST", "/posts/", None, {
+            "title": f"Нагрузочный пост {counter}",
+            "description": f"Ищем участников в проект {rng.randint(1, 10 ** 9)}: аналитика, данные, команда.",
+            "categories": [rng.choice(CATEGORIES)],
+            "age_restriction": 0,
+            "author_phone": user_phone(author),
+        }
+    raise ValueError(f"Unknown scenario {name!r}")
+
+
+async def _connection(session, base_url, name, rng, users, posts, deadline, record, latencies, errors):
+    counter = 0
+    while time.perf_counter() < deadline:
+        method, path, params, body = build_request(name, rng, users, posts, counter)
+        counter += 1
+        started = time.perf_counter()
+        try:
+            async with session.request(method, base_url + path, params=params, json=body) as resp:
+                await resp.read()
+                ok = resp.status < 400
+        except aiohttp.ClientError:
+            ok = False
+        if not record:
+            continue
+        if ok:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(1)
+
+
+async def run_scenario(base_url: str, name: str, concurrency: int, duration: float, warmup: float,
+                       users: int, posts: int, seed: int) -> dict:
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        latencies, errors = [], []
+        elapsed = 0.0
+        for record, seconds in ((False, warmup), (True, duration)):
+            if seconds <= 0:
+                continue
+            deadline = time.perf_counter() + seconds
+            started = time.perf_counter()
+            await asyncio.gather(*[
+                _connection(session, base_url, name, random.Random(seed * 1000 + i + (0 if record else 500)),
+                            users, posts, deadline, record, latencies, errors)
+                for i in range(concurrency)
+            ])
+            elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def pct(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2) if latencies else None
+
+    total = len(latencies) + len(errors)
+    return {
+        "requests": total,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / total, 4) if total else 0.0,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+    }
+
+
+def git_revision(path: str = ROOT) -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args, revision: str = None) -> dict:
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {sorted(unknown)}")
+    report = {
+        "meta": {
+            "revision": revision or git_revision(),
+            "url": args.url, "concurrency": args.concurrency, "duration": args.duration,
+            "warmup": args.warmup, "users": args.users, "posts": args.posts, "seed": args.seed,
+            "python": platform.python_version(), "started_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "scenarios": {},
+    }
+    for name in scenarios:
+        result = asyncio.run(run_scenario(args.url.rstrip("/"), name, args.concurrency, args.duration,
+                                          args.warmup, args.users, args.posts, args.seed))
+        report["scenarios"][name] = result
+        print(json.dumps({"scenario": name, **result}), file=sys.stderr)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare(base: dict, candidate: dict, threshold: float) -> list:
+    """
+    Строки сравнения по сценариям; regression=True — хуже порога.
+    """
+    rows = []
+    for name, new in candidate["scenarios"].items():
+        old = base["scenarios"].get(name)
+        if old is None:
+            continue
+        row = {"scenario": name, "regressions": []}
+        for metric in LATENCY_METRICS + ["throughput_rps"]:
+            if not old.get(metric) or new.get(metric) is None:
+                continue
+            change = new[metric] / old[metric] - 1
+            row[metric] = {"base": old[metric], "candidate": new[metric], "change": round(change, 4)}
+            worse = change > threshold if metric in LATENCY_METRICS else change < -threshold
+            if worse:
+                row["regressions"].append(metric)
+        if new["error_rate"] - old["error_rate"] > 0.01:
+            row["regressions"].append("error_rate")
+        row["error_rate"] = {"base": old["error_rate"], "candidate": new["error_rate"]}
+        row["regression"] = bool(row["regressions"])
+        rows.append(row)
+    return rows
+
+
+def _print_comparison(base: dict, candidate: dict, threshold: float) -> int:
+    rows = compare(base, candidate, threshold)
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+    regressed = [r["scenario"] for r in rows if r["regression"]]
+    print(json.dumps({"base": base["meta"]["revision"], "candidate": candidate["meta"]["revision"],
+                      "threshold": threshold, "regressed": regressed}))
+    return 1 if regressed else 0
+
+
+def _wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/health/ready", timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def _reset_schema(database_url: str):
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(database_url)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    engine.dispose()
+
+
+def run_revision(rev: str, args, workdir: str, inference_url: str) -> dict:
+    """
+    Ревизия rev в отдельном worktree на заново созданной схеме с одинаковыми данными.
+    """
+    path = os.path.join(workdir, rev.replace("/", "_"))
+    subprocess.run(["git", "worktree", "add", "--detach", path, rev], cwd=ROOT, check=True)
+    env = dict(os.environ, DATABASE_URL=args.database_url, TOXICITY_BACKEND="stub",
+               QUALITY_ENDPOINT_URL=inference_url, LOG_LEVEL="WARNING", PYTHONPATH=path)
+    env.pop("ASYNC_DATABASE_URL", None)
+    server = None
+    try:
+        _reset_schema(args.database_url)
+        subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=path, env=env, check=True)
+        subprocess.run([sys.executable, "-m", "benchmarks.seed", "--users", str(args.users),
+                        "--posts", str(args.posts), "--likes", str(args.likes), "--comments", str(args.comments),
+                        "--seed", str(args.seed)],
+                       cwd=ROOT, env=dict(env, PYTHONPATH=ROOT), check=True)
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+                                   "--port", str(args.port), "--log-level", "warning"], cwd=path, env=env)
+        args.url = f"http://127.0.0.1:{args.port}"
+        _wait_ready(args.url, args.startup_timeout)
+        return run(args, revision=git_revision(path))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        subprocess.run(["git", "worktree", "remove", "--force", path], cwd=ROOT, check=False)
+
+
+def revs(args) -> int:
+    from benchmarks.fake_inference_server import FakeInferenceServer, Faults
+
+    inference = FakeInferenceServer(faults=Faults(latency_ms=0, jitter_ms=0)).start()
+    workdir = tempfile.mkdtemp(prefix="bench-revs-")
+    os.makedirs(args.out_dir, exist_ok=True)
+    try:
+        results = []
+        for rev in (args.base, args.candidate):
+            args.out = os.path.join(args.out_dir, f"{rev.replace('/', '_')}.json")
+            results.append(run_revision(rev, args, workdir, inference.url))
+    finally:
+        inference.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return _print_comparison(results[0], results[1], args.threshold)
+
+
+def _load_args(parser):
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="секунд замера на сценарий")
+    parser.add_argument("--warmup", type=float, default=3.0, help="секунд прогрева на сценарий")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=10000, help="как при benchmarks.seed")
+    parser.add_argument("--posts", type=int, default=50000, help="как при benchmarks.seed")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="сценарии против поднятого сервера")
+    p_run.add_argument("--url", default="http://localhost:8000")
+    p_run.add_argument("--out", help="файл результата JSON")
+    _load_args(p_run)
+
+    p_cmp = sub.add_parser("compare", help="сравнить два результата")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("candidate")
+    p_cmp.add_argument("--threshold", type=float, default=0.10)
+
+    p_revs = sub.add_parser("revs", help="прогнать и сравнить две git-ревизии")
+    p_revs.add_argument("base")
+    p_revs.add_argument("candidate")
+    p_revs.add_argument("--database-url", required=True, help="выделенная БД: схема public пересоздаётся")
+    p_revs.add_argument("--likes", type=int, default=200000)
+    p_revs.add_argument("--comments", type=int, default=50000)
+    p_revs.add_argument("--port", type=int, default=8800)
+    p_revs.add_argument("--startup-timeout", type=float, default=120.0)
+    p_revs.add_argument("--out-dir", default="bench-results")
+    p_revs.add_argument("--threshold", type=float, default=0.10)
+    _load_args(p_revs)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        print(json.dumps(run(args), indent=2))
+    elif args.command == "compare":
+        with open(args.base) as f_base, open(args.candidate) as f_candidate:
+            sys.exit(_print_comparison(json.load(f_base), json.load(f_candidate), args.threshold))
+    else:
+        sys.exit(revs(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Бэкенды классификатора токсичности: производительность torch vs ONNX.
+
+Каждый бэкенд в отдельном процессе (чтобы RSS не смешивался): тексты/сек при
+батчах 1/8/32 на корпусе benchmarks/data/toxicity_corpus.txt и пиковая память
+после загрузки и после прогона. Паритет ONNX с torch на том же корпусе
+проверяет tests/test_toxicity_parity.py.
+
+Запуск (сначала python -m app.toxic_analis --export-onnx):
+    python -m benchmarks.toxicity_backends
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import List
+
+from app.toxic_analis import load_backend
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "toxicity_corpus.txt")
+BATCH_SIZES = (1, 8, 32)
+
+
+def load_corpus(path: str = CORPUS) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def _max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_backend(name: str, texts: List[str], min_seconds: float) -> dict:
+    started = time.perf_counter()
+    backend = load_backend(name)
+    backend(texts[:1])
+    result = {"backend": name, "load_seconds": round(time.perf_counter() - started, 2),
+              "rss_after_load_mb": round(_max_rss_mb(), 1), "batches": {}}
+
+    for batch_size in BATCH_SIZES:
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        processed = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < min_seconds:
+            for batch in batches:
+                backend(batch)
+                processed += len(batch)
+        elapsed = time.perf_counter() - started
+        result["batches"][batch_size] = {"texts_per_sec": round(processed / elapsed, 1)}
+
+    result["peak_rss_mb"] = round(_max_rss_mb(), 1)
+    return result
+
+
+def bench(backends: List[str], min_seconds: float) -> list:
+    reports = []
+    for name in backends:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.toxicity_backends", "--worker", name,
+             "--min-seconds", str(min_seconds)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        reports.append(json.loads(out.strip().splitlines()[-1]))
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Toxicity backend benchmark")
+    parser.add_argument("--backends", default="torch,onnx")
+    parser.add_argument("--min-seconds", type=float, default=5.0, help="длительность прогона на размер батча")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    texts = load_corpus(args.corpus)
+    if args.worker:
+        print(json.dumps(bench_backend(args.worker, texts, args.min_seconds)))
+        sys.exit(0)
+    print(json.dumps(bench(args.backends.split(","), args.min_seconds), ensure_ascii=False, indent=2))
@@ -0,0 +1,76 @@
+"""
+Проверка гонки первых запросов с одним телефоном.
+
+Для каждого раунда берётся новый телефон, и --parallel запросов отправляются
+одновременно: POST /users/, лайк и комментарий к одному посту. До перехода на
+INSERT ... ON CONFLICT часть из них падала с 500 на уникальном ограничении phone.
+Ожидается: ни одного 5xx, у всех ответов /users/ один и тот же id.
+
+Запуск (сервер поднят, миграции применены, есть хотя бы один пост):
+    python -m benchmarks.user_upsert_race --url http://localhost:8000 --post-id 1
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+
+import aiohttp
+
+
+async def _round(session, base: str, post_id: int, parallel: int) -> dict:
+    phone = "+7" + str(uuid.uuid4().int)[:10]
+    user_requests = [
+        session.post(f"{base}/users/", json={"phone": phone, "firstname": f"Race{i}"})
+        for i in range(parallel)
+    ]
+    like_requests = [
+        session.post(f"{base}/posts/{post_id}/like", params={"phone": phone})
+        for _ in range(parallel)
+    ]
+    comment_requests = [
+        session.post(f"{base}/posts/{post_id}/comments",
+                     json={"post_id": post_id, "author_phone": phone, "text": f"race {i}"})
+        for i in range(parallel)
+    ]
+
+    async def fetch(request):
+        async with request as resp:
+            body = await resp.text()
+            return resp.status, body
+
+    responses = await asyncio.gather(*[fetch(r) for r in user_requests + like_requests + comment_requests])
+    statuses = [status for status, _ in responses]
+    user_ids = {json.loads(body)["id"] for status, body in responses[:parallel] if status == 200}
+    return {
+        "server_errors": sum(1 for s in statuses if s >= 500),
+        "distinct_user_ids": len(user_ids),
+    }
+
+
+async def main(base: str, post_id: int, parallel: int, rounds: int) -> dict:
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=parallel * 3)) as session:
+        started = time.perf_counter()
+        results = [await _round(session, base, post_id, parallel) for _ in range(rounds)]
+    return {
+        "rounds": rounds,
+        "parallel": parallel,
+        "server_errors": sum(r["server_errors"] for r in results),
+        "rounds_with_duplicate_users": sum(1 for r in results if r["distinct_user_ids"] != 1),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel first-request race check for user upsert")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--post-id", type=int, required=True)
+    parser.add_argument("--parallel", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    report = asyncio.run(main(args.url.rstrip("/"), args.post_id, args.parallel, args.rounds))
+    print(json.dumps(report, indent=2))
+    if report["server_errors"] or report["rounds_with_duplicate_users"]:
+        sys.exit(1)
@@ -0,0 +1,86 @@
+"""
+Почти-дубликаты внутри одной пачки массового импорта (app/bulk_import.py).
+"""
+import asyncio
+import json
+
+from sqlalchemy import select
+
+from app import models
+from app.bulk_import import NDJSON_MEDIA_TYPE, import_posts
+from app.near_duplicates import batch_duplicates, post_text, signature
+from app.scoring_worker import _complete
+from app.toxic_analis import toxicity_batcher
+
+BASE = ("Ищем стажёра-аналитика в отдел аналитики данных. Что нужно: Python, SQL, pandas, Git. "
+        "Задачи: участие в проекте с первого дня, двадцать часов в неделю, отчёт руководителю каждую "
+        "пятницу. Мы предлагаем: гибкий график, наставник, сертификат. Откликайтесь до конца месяца.")
+OTHER = ("Городской музей приглашает волонтёров на фестиваль науки: встреча гостей, экскурсии для "
+         "школьников, помощь на мастер-классах. Обучение перед началом, форма и обед за наш счёт.")
+TOXIC = "Ты токсичный человек и все твои проекты никому не нужны, даже не пытайся сюда писать."
+
+
+def _copy(text: str, i: int) -> str:
+    words = text.split()
+    words[(7 * i) % len(words)] = f"слово{i}"
+    return " ".join(words)
+
+
+def test_batch_duplicates_point_to_first_copy():
+    texts = [BASE, OTHER, _copy(BASE, 1), _copy(OTHER, 2), _copy(BASE, 3)]
+    sigs = [signature(post_text("Стажировка", t)) for t in texts]
+    assert batch_duplicates(sigs) == [None, None, 0, 1, 0]
+
+
+async def _import(sessions, items, **kwargs):
+    async def body():
+        yield "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in items).encode()
+
+    async with sessions() as session:
+        lines = [json.loads(line) async for line in import_posts(session, body(), NDJSON_MEDIA_TYPE, **kwargs)]
+    return lines[:-1], lines[-1]["summary"]
+
+
+def test_copies_in_one_batch_skip_moderation_and_scoring(db, async_sessions):
+    copies = 30
+    items = [{"title": "Стажировка", "description": BASE, "categories": ["IT"]}]
+    items += [{"title": "Стажировка", "description": _copy(BASE, i), "categories": ["IT"]} for i in range(copies)]
+    items += [{"title": "Фестиваль", "description": OTHER, "categories": ["Наука"]},
+              {"title": "Спам", "description": TOXIC, "categories": ["IT"]},
+              {"title": "Спам", "description": _copy(TOXIC, 1), "categories": ["IT"]}]
+    checked = toxicity_batcher._items
+
+    results, summary = asyncio.run(_import(async_sessions, items))
+
+    assert summary == {"created": copies + 2, "rejected": 2, "invalid": 0}
+    # Модель видит только первые экземпляры
+    assert toxicity_batcher._items - checked == 3
+    original = results[0]["id"]
+    assert all(r["duplicate_of"] == original for r in results[1:copies + 1])
+    assert [r["status"] for r in results[-2:]] == ["rejected", "rejected"]
+    jobs = db.execute(select(models.ScoringJob.id, models.ScoringJob.post_id).order_by(models.ScoringJob.id)).all()
+    assert [post_id for _, post_id in jobs] == [original, results[copies + 1]["id"]]
+
+    # Оценка оригинала переходит к копиям без поинтов
+    _complete(db, jobs[0].id, original, 80.0)
+    posts = db.execute(
+        select(models.Post.scoring_status, models.Post.quality_score, models.Post.points_awarded)
+        .where(models.Post.id.in_([r["id"] for r in results[1:copies + 1]]))
+    ).all()
+    assert set(posts) == {("done", 80.0, 0.0)}
+
+
+def test_database_error_still_ends_with_summary(db, async_sessions):
+    items = [{"title": "Стажировка", "description": BASE, "categories": ["IT"]},
+             {"title": "Т" * 256, "description": OTHER, "categories": ["IT"]},
+             # users.firstname — VARCHAR(255): INSERT второй пачки падает в БД
+             {"title": "Фестиваль", "description": OTHER, "categories": ["Наука"],
+              "author_phone": "+70000000001", "author_firstname": "И" * 256}]
+
+    results, summary = asyncio.run(_import(async_sessions, items, batch_size=2))
+
+    # Слишком длинный заголовок отклоняется валидацией, не роняя пачку
+    assert [r["status"] for r in results] == ["created", "invalid"]
+    assert summary["created"] == 1 and summary["invalid"] == 1
+    assert summary["error"].startswith("Database error")
+    assert db.query(models.Post).count() == 1
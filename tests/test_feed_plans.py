@@ -0,0 +1,104 @@
+"""
+Запросы ленты на заполненной таблице используют свои индексы (EXPLAIN).
+"""
+import json
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import models
+from app.crud import _list_posts_stmt
+
+POSTS = 100000
+
+SEED_SQL = text("""
+    INSERT INTO posts (title, description, categories, age_restriction, created_at, scoring_status)
+    SELECT 'title ' || g,
+           'description ' || g,
+           jsonb_build_array((ARRAY['IT', 'Спорт', 'Наука', 'Волонтерство', 'Искусство'])[1 + g % 5],
+                             'cat_' || (g % 500)),
+           (ARRAY[0, 6, 12, 16, 18])[1 + g % 5],
+           now() - make_interval(secs => g),
+           'done'
+    FROM generate_series(1, :n) AS g
+""")
+
+FEED_SQL = text("""
+    INSERT INTO age_feed_entries (bracket, created_at, post_id)
+    SELECT b.bracket, p.created_at, p.id
+    FROM posts p
+    JOIN unnest(ARRAY[0, 6, 12, 16]::smallint[]) AS b(bracket) ON p.age_restriction <= b.bracket
+""")
+
+ACTIVITY_SQL = text("""
+    INSERT INTO users (phone, age) VALUES ('+70000000001', 30);
+    INSERT INTO likes (user_id, post_id, created_at)
+    SELECT 1, g, now() FROM generate_series(1, :n) AS g;
+    INSERT INTO comments (post_id, author_id, author_name, text, created_at)
+    SELECT 1 + g % :n, 1, 'Анна', 'text', now() - make_interval(secs => g) FROM generate_series(1, :n) AS g;
+""")
+
+# (запрос, индекс, который должен быть в плане)
+CASES = {
+    "feed": (_list_posts_stmt(limit=20), "ix_posts_created_at_id"),
+    "rare category": (_list_posts_stmt(category="cat_7", limit=20), "ix_posts_categories_gin"),
+    "age 12": (_list_posts_stmt(user_age=13, limit=20), "age_feed_entries_pkey"),
+    "age 6": (_list_posts_stmt(user_age=6, limit=20), "age_feed_entries_pkey"),
+    "likes of post": (select(models.Like.user_id).where(models.Like.post_id == 42), "ix_likes_post_id"),
+    "root comments": (
+        select(models.Comment.id)
+        .where(models.Comment.post_id == 42, models.Comment.parent_id.is_(None))
+        .order_by(models.Comment.created_at, models.Comment.id).limit(20),
+        "ix_comments_roots",
+    ),
+}
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _index_names(plan: dict) -> set:
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+@pytest.fixture(scope="module")
+def seeded(database_url, truncate_tables):
+    # Заполнение одно на все случаи модуля; очистка — как в фикстуре db
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        db.execute(SEED_SQL, {"n": POSTS})
+        db.execute(FEED_SQL)
+        db.execute(ACTIVITY_SQL, {"n": POSTS})
+        db.commit()
+        for table in ("posts", "age_feed_entries", "likes", "comments"):
+            db.execute(text(f"ANALYZE {table}"))
+        yield db
+    finally:
+        db.close()
+        truncate_tables()
+
+
+@pytest.mark.parametrize("case", list(CASES))
+def test_feed_queries_use_indexes(seeded, case):
+    statement, expected = CASES[case]
+    raw = seeded.execute(Explain(statement)).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    assert expected in _index_names(plan), plan
@@ -0,0 +1,65 @@
+"""
+Сборка страницы ленты (app/feed.py) не должна делать запросов на каждый пост.
+"""
+import asyncio
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import crud_async as crud, models
+from app.feed import COMMENTS_PREVIEW_SIZE, load_post_outs
+
+POSTS = 60
+COMMENTS_PER_POST = 4
+
+
+def _seed(db):
+    author = models.User(phone="+70000000001", firstname="Анна", age=30)
+    db.add(author)
+    db.flush()
+    posts = [
+        models.Post(title=f"Пост {i}", description="Описание", categories=["IT"], author_id=author.id,
+                    author_name="Анна", comments_count=COMMENTS_PER_POST)
+        for i in range(POSTS)
+    ]
+    db.add_all(posts)
+    db.flush()
+    db.add_all([
+        models.Comment(post_id=p.id, author_id=author.id, author_name="Анна", text=f"Комментарий {j}")
+        for p in posts for j in range(COMMENTS_PER_POST)
+    ])
+    db.commit()
+
+
+@contextmanager
+def _count_queries(engine):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+async def _load_page(sessions, limit):
+    async with sessions() as session:
+        with _count_queries(session.bind.sync_engine) as statements:
+            posts = await crud.list_posts(session, limit=limit)
+            page = await load_post_outs(session, posts)
+    return page, len(statements)
+
+
+def test_feed_page_query_count_does_not_grow_with_page_size(db, async_sessions):
+    _seed(db)
+    counts = {}
+    for limit in (1, 10, POSTS):
+        page, counts[limit] = asyncio.run(_load_page(async_sessions, limit))
+        assert len(page) == limit
+        assert all(len(p.comments_preview) == min(COMMENTS_PER_POST, COMMENTS_PREVIEW_SIZE) for p in page)
+    assert len(set(counts.values())) == 1, counts
+    # Страница постов и одна выборка превью комментариев
+    assert counts[POSTS] == 2
@@ -0,0 +1,153 @@
+"""
+Устойчивость клиента LLM (app/inference_client.py) на локальном сервере с
+внедрением неисправностей (benchmarks/fake_inference_server.py): настоящий
+InferenceClient через QUALITY_ENDPOINT_URL, нагрузка в несколько потоков, как
+SCORING_CONCURRENCY воркера.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("huggingface_hub")
+
+from app import quality_rating  # noqa: E402
+from app.inference_client import CircuitBreaker, CircuitOpenError, ResilientInferenceClient  # noqa: E402
+from benchmarks.fake_inference_server import FakeInferenceServer, Faults, fake_score  # noqa: E402
+
+MAX_CONCURRENCY = 8
+DEADLINE = 1.0
+HEALTHY = {"latency_ms": 30.0, "jitter_ms": 10.0, "slow_rate": 0.0, "error_rate": 0.0}
+
+TEXTS = [f"Кандидат {i}: проекты на Python, хакатон {i % 37}" for i in range(400)]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def run_load(texts, threads):
+    """
+    (текст, оценка или исключение, секунды) на каждый вызов.
+    """
+    def one(t):
+        started = time.monotonic()
+        try:
+            result = quality_rating.rate_text_quality(t)
+        except Exception as e:
+            result = e
+        return t, result, time.monotonic() - started
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one, texts))
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = FakeInferenceServer(faults=Faults(**HEALTHY)).start()
+    # Первый запрос процесса (ленивые импорты huggingface_hub) — вне дедлайна нагрузки
+    quality_rating.InferenceClient(base_url=server.url, timeout=10).chat_completion(
+        model=quality_rating.MODEL, messages=[{"role": "user", "content": "прогрев"}])
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_client(server, monkeypatch):
+    """
+    Подменяет клиент quality_rating новым ResilientInferenceClient; попытки
+    записывают, на сколько они пережили дедлайн вызова.
+    """
+    monkeypatch.setattr(quality_rating, "QUALITY_ENDPOINT_URL", server.url)
+    starts, overshoots = [], []
+
+    def call(messages, timeout):
+        started = time.monotonic()
+        starts.append(started)
+        try:
+            return quality_rating._chat_completion(messages, timeout)
+        finally:
+            overshoots.append(time.monotonic() - (started + timeout))
+
+    def make(faults=None, hedge_after=0.2, breaker_failures=5, reset_seconds=1.0):
+        server.configure(**{**HEALTHY, **(faults or {})})
+        server.reset_counters()
+        client = ResilientInferenceClient(
+            call, max_concurrency=MAX_CONCURRENCY, deadline_seconds=DEADLINE, hedge_after_seconds=hedge_after,
+            max_attempts=3, breaker=CircuitBreaker(breaker_failures, reset_seconds))
+        client.starts, client.overshoots = starts, overshoots
+        monkeypatch.setattr(quality_rating, "inference_client", client)
+        return client
+
+    return make
+
+
+def test_healthy_scores_within_concurrency_limit(make_client):
+    client = make_client()
+    results = run_load(TEXTS[:200], 2 * MAX_CONCURRENCY)
+
+    assert [(t, r) for t, r, _ in results if r != fake_score(f'Текст кандидата:\n"{t}"')] == []
+    assert client.max_in_flight <= MAX_CONCURRENCY
+
+
+def test_hedging_halves_slow_tail(make_client):
+    slow_tail = {"slow_rate": 0.05, "slow_ms": 1000.0}
+    make_client(slow_tail, hedge_after=0)
+    unhedged = run_load(TEXTS[:200], 4)
+    client = make_client(slow_tail)
+    hedged = run_load(TEXTS[:200], 4)
+
+    assert all(not isinstance(r, Exception) for _, r, _ in hedged)
+    # Брошенная медленная попытка сразу отдаёт слот, дубли остальных его не ждут
+    assert percentile([s for _, _, s in hedged], 0.99) < 0.5 * percentile([s for _, _, s in unhedged], 0.99)
+    assert client.hedge_wins > 0
+    assert client.max_in_flight <= MAX_CONCURRENCY
+
+
+def test_retries_absorb_errors(make_client):
+    client = make_client({"error_rate": 0.2}, hedge_after=0)
+    results = run_load(TEXTS[:200], 4)
+
+    assert sum(not isinstance(r, Exception) for _, r, _ in results) >= 0.97 * len(results)
+    assert client.breaker.state == "closed"
+
+
+def test_hang_ends_every_attempt_by_deadline(make_client):
+    # Сервер не отвечает; волны вызовов идут одна за другой, каждый с хеджированием
+    client = make_client({"slow_rate": 1.0, "slow_ms": 5000.0}, breaker_failures=10 ** 6)
+    threads = MAX_CONCURRENCY // 2
+    results = run_load(TEXTS[:3 * threads], threads)
+
+    assert all(isinstance(r, quality_rating.QualityScoringError) for _, r, _ in results)
+    assert max(s for _, _, s in results) < DEADLINE + 0.3
+    # Слоты попыток предыдущей волны свободны к началу следующей
+    assert client.saturated == 0
+    assert client.hedges > 0 and client.in_flight == 0
+    waited = time.monotonic()
+    while len(client.overshoots) < len(client.starts) and time.monotonic() - waited < 2 * DEADLINE:
+        time.sleep(0.05)
+    # HTTP-таймаут попытки — время до дедлайна вызова, а не от её собственного начала
+    assert len(client.overshoots) == len(client.starts) > 0
+    assert max(client.overshoots) < 0.2
+
+
+def test_outage_fails_fast_then_recovers(make_client, server):
+    threads = 4 * MAX_CONCURRENCY
+    client = make_client({"error_rate": 1.0}, reset_seconds=60)
+    results = run_load(TEXTS, threads)
+
+    rejected = [s for _, r, s in results if isinstance(r, CircuitOpenError)]
+    assert client.breaker.state == "open"
+    # Вызовы, начатые до открытия предохранителя, доходят до сервера (не больше потоков + порог)
+    assert len(rejected) >= len(results) - threads - 5
+    assert percentile(rejected, 0.99) < 0.005
+    assert server.counters["requests"] <= 3 * (threads + 5)
+
+    server.configure(**HEALTHY)
+    client.breaker.reset_seconds = 0.3
+    time.sleep(0.4)
+    results = run_load(TEXTS[:50], 1)
+
+    assert all(not isinstance(r, Exception) for _, r, _ in results)
+    assert client.breaker.state == "closed"
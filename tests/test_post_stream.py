@@ -0,0 +1,29 @@
+"""
+Ошибки параметров NDJSON-ленты возвращаются статусом до начала потока.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Без контекстного менеджера lifespan (прогрев модели, индекс дубликатов) не запускается
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("params", [
+    {"format": "ndjson", "cursor": "!!!bad"},
+    {"format": "ndjson", "fields": "id,nope"},
+    {"cursor": "!!!bad"},
+])
+def test_invalid_stream_params_return_400(client, params):
+    response = client.get("/posts/", params=params)
+    assert response.status_code == 400
+    assert "detail" in response.json()
+
+
+def test_invalid_cursor_with_ndjson_accept_returns_400(client):
+    response = client.get("/posts/", params={"cursor": "!!!bad"}, headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 400
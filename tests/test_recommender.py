@@ -0,0 +1,35 @@
+"""
+Пересчёт кандидатов персональной ленты (app/recommender.py).
+"""
+from app import crud, models
+from app.recommender import _dirty_user_ids, refresh_candidates
+from app.similarity_index import SimilarityIndex, rebuild
+
+A, B = 10, 20
+
+
+def test_unliking_everything_empties_candidates(db, tmp_path):
+    db.add_all([models.Post(id=p, title="Пост", description="Описание", categories=["IT"]) for p in (A, B)])
+    db.commit()
+    posts = {p: db.get(models.Post, p) for p in (A, B)}
+    crud.toggle_like(db, posts[A], "+70000000001")
+    crud.toggle_like(db, posts[A], "+70000000002")
+    crud.toggle_like(db, posts[B], "+70000000002")
+    user_id = crud.get_user_or_create(db, "+70000000001").id
+    rebuild(db, str(tmp_path))
+    index = SimilarityIndex(str(tmp_path))
+
+    refresh_candidates(db, index=index)
+    assert db.get(models.FeedCandidates, user_id).post_ids == [B]
+
+    crud.toggle_like(db, posts[A], "+70000000001")
+    assert user_id in _dirty_user_ids(db)
+    refresh_candidates(db, index=index)
+
+    db.expire_all()
+    row = db.get(models.FeedCandidates, user_id)
+    assert (row.post_ids, row.scores) == ([], [])
+    assert user_id not in _dirty_user_ids(db)
+    # Событие снятия лайка учтено пересчётом и удаляется следующей пересборкой
+    rebuild(db, str(tmp_path))
+    assert db.query(models.LikeEvent).filter_by(user_id=user_id).count() == 0
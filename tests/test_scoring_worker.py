@@ -0,0 +1,33 @@
+"""
+Задачи очереди оценки с истёкшей арендой (app/scoring_worker.py).
+"""
+from datetime import timedelta
+
+from sqlalchemy import func, update
+
+from app import models
+from app.scoring_worker import SCORING_LEASE_SECONDS, SCORING_MAX_ATTEMPTS, claim_batch
+
+
+def _running_job(db, post_id: int, attempts: int):
+    db.add(models.Post(id=post_id, title="Пост", description="Описание", categories=["IT"]))
+    db.flush()
+    db.add(models.ScoringJob(post_id=post_id, status="running", attempts=attempts))
+    db.flush()
+    # Воркер, взявший задачу, упал до истечения аренды
+    db.execute(update(models.ScoringJob).where(models.ScoringJob.post_id == post_id)
+               .values(locked_at=func.now() - timedelta(seconds=SCORING_LEASE_SECONDS + 60)))
+    db.commit()
+
+
+def test_expired_lease_counts_as_attempt(db):
+    _running_job(db, 1, attempts=0)
+    _running_job(db, 2, attempts=SCORING_MAX_ATTEMPTS - 1)
+
+    # Возвращённая задача ждёт задержки повтора, исчерпавшая попытки — failed
+    assert claim_batch(db) == []
+    db.expire_all()
+    jobs = {j.post_id: (j.status, j.attempts) for j in db.query(models.ScoringJob)}
+    assert jobs == {1: ("queued", 1), 2: ("failed", SCORING_MAX_ATTEMPTS)}
+    assert db.get(models.Post, 2).scoring_status == "failed"
+    assert db.get(models.Post, 1).scoring_status == "pending"
@@ -0,0 +1,70 @@
+"""
+Инкрементальное обновление индекса похожих постов (app/similarity_index.py).
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app import models
+from app.similarity_index import SimilarityIndex, build_arrays, liked_before_events, rebuild, save_version
+
+USER = 7
+A, B, C = 10, 20, 30
+CATEGORIES = {A: ["IT"], B: ["Спорт"], C: ["Наука"]}
+
+
+def _index(tmp_path) -> SimilarityIndex:
+    post_ids = np.array([A, B, C], dtype=np.int64)
+    arrays = build_arrays(np.array([], dtype=np.int64), np.array([], dtype=np.int64), post_ids,
+                          [CATEGORIES[p] for p in post_ids], k=2)
+    save_version(arrays, {"last_event_id": 0}, str(tmp_path))
+    index = SimilarityIndex(str(tmp_path), writable=True)
+    assert index.reload()
+    return index
+
+
+def _colikes(index: SimilarityIndex, post_id: int, other: int) -> int:
+    i, j = index._index_of(post_id), index._index_of(other)
+    hit = np.nonzero(index.arrays["neighbors"][i] == j)[0]
+    return int(index.arrays["colikes"][i, hit[0]]) if len(hit) else 0
+
+
+def _apply(index, liked_now, events):
+    index.apply_like_events(events, liked_before_events(liked_now, events), CATEGORIES)
+
+
+def test_two_likes_in_one_batch_count_one_colike(tmp_path):
+    index = _index(tmp_path)
+    # likes уже содержит оба лайка пачки
+    _apply(index, {USER: {A, B}}, [(USER, A, 1), (USER, B, 1)])
+    assert _colikes(index, A, B) == 1
+    assert _colikes(index, B, A) == 1
+    assert index.arrays["like_counts"].tolist() == [1, 1, 0]
+
+
+def test_like_then_unlike_in_one_batch_leaves_no_colike(tmp_path):
+    index = _index(tmp_path)
+    _apply(index, {USER: {A, B}}, [(USER, A, 1), (USER, B, 1)])
+    _apply(index, {USER: {A}}, [(USER, C, 1), (USER, C, -1), (USER, B, -1)])
+    assert _colikes(index, A, B) == 0
+    assert _colikes(index, A, C) == 0
+    assert index.arrays["like_counts"].tolist() == [1, 0, 0]
+
+
+def test_rebuild_keeps_events_needed_by_candidate_refresh(db, tmp_path):
+    refreshed_at = datetime(2025, 1, 1, 12)
+    db.add_all([models.User(id=1, phone="+70000000001"), models.User(id=2, phone="+70000000002")])
+    db.add_all([models.Post(id=p, title="Пост", description="Описание", categories=cats)
+                for p, cats in CATEGORIES.items()])
+    db.flush()
+    db.add_all([
+        models.FeedCandidates(user_id=1, post_ids=[], scores=[], updated_at=refreshed_at),
+        models.LikeEvent(id=1, user_id=1, post_id=A, delta=-1, created_at=refreshed_at - timedelta(minutes=1)),
+        models.LikeEvent(id=2, user_id=1, post_id=B, delta=-1, created_at=refreshed_at + timedelta(minutes=1)),
+        models.LikeEvent(id=3, user_id=2, post_id=A, delta=-1, created_at=refreshed_at),
+    ])
+    db.commit()
+
+    rebuild(db, str(tmp_path))
+    # Событие после последнего пересчёта кандидатов пользователя 1 остаётся
+    assert [e.id for e in db.query(models.LikeEvent).order_by(models.LikeEvent.id)] == [2]
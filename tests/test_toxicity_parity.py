@@ -0,0 +1,44 @@
+"""
+Паритет ONNX-бэкенда классификатора токсичности с torch на корпусе
+benchmarks/data/toxicity_corpus.txt. Пропускается без экспорта
+(python -m app.toxic_analis --export-onnx) или без доступной модели.
+"""
+import os
+
+import pytest
+
+from app.toxic_analis import ONNX_MODEL_FILE, TOXIC_THRESHOLD, TOXICITY_ONNX_DIR, load_backend
+from benchmarks.toxicity_backends import load_corpus
+
+TOLERANCE = 0.05
+
+
+def _p_toxic(label: str, score: float) -> float:
+    # У модели два класса, поэтому вероятность toxic восстанавливается по лучшему
+    return score if label == "toxic" else 1.0 - score
+
+
+@pytest.fixture(scope="module")
+def backends():
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    if not os.path.exists(os.path.join(TOXICITY_ONNX_DIR, ONNX_MODEL_FILE)):
+        pytest.skip(f"no ONNX export in {TOXICITY_ONNX_DIR}")
+    try:
+        return load_backend("torch"), load_backend("onnx")
+    except OSError as e:
+        pytest.skip(f"toxicity model is not available: {e}")
+
+
+def test_onnx_matches_torch_on_corpus(backends):
+    torch_backend, onnx_backend = backends
+    texts = load_corpus()
+    mismatches = []
+    for text, (ref_label, ref_score), (label, score) in zip(texts, torch_backend(texts), onnx_backend(texts)):
+        ref_p, p = _p_toxic(ref_label, ref_score), _p_toxic(label, score)
+        # Вердикт может разойтись только у текстов, чья вероятность в пределах допуска от порога
+        near_threshold = abs(ref_p - TOXIC_THRESHOLD) <= TOLERANCE
+        if abs(ref_p - p) > TOLERANCE or ((ref_p > TOXIC_THRESHOLD) != (p > TOXIC_THRESHOLD) and not near_threshold):
+            mismatches.append((text, round(ref_p, 4), round(p, 4)))
+    assert not mismatches
@@ -0,0 +1,54 @@
+"""
+Параллельные первые запросы с одним телефоном создают ровно одного пользователя.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+from app import crud, crud_async, models
+from app.database import SessionLocal
+
+PARALLEL = 20
+PHONE = "+70000000042"
+
+
+def _users_with_phone(db) -> int:
+    return db.execute(select(func.count()).select_from(models.User).where(models.User.phone == PHONE)).scalar()
+
+
+async def _first_request(sessions, i: int) -> int:
+    async with sessions() as session:
+        # Половина запросов с полями профиля (UPDATE-ветка), половина — без (путь лайка)
+        if i % 2:
+            user_id, _ = await crud_async.resolve_user(session, PHONE, firstname=f"Имя{i}", age=20)
+        else:
+            user_id, _ = await crud_async.resolve_user(session, PHONE)
+        await session.commit()
+        return user_id
+
+
+async def _race(sessions):
+    return await asyncio.gather(*[_first_request(sessions, i) for i in range(PARALLEL)])
+
+
+def test_parallel_async_first_requests_create_one_user(db, async_sessions):
+    ids = asyncio.run(_race(async_sessions))
+    assert len(set(ids)) == 1
+    assert _users_with_phone(db) == 1
+
+
+def test_parallel_sync_first_requests_create_one_user(db):
+    def first_request(i):
+        session = SessionLocal()
+        try:
+            user = crud.get_user_or_create(session, PHONE, firstname=f"Имя{i}" if i % 2 else None)
+            session.commit()
+            return user.id
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(PARALLEL) as pool:
+        ids = list(pool.map(first_request, range(PARALLEL)))
+    assert len(set(ids)) == 1
+    assert _users_with_phone(db) == 1